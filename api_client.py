@@ -0,0 +1,188 @@
+# api_client.py
+from decimal import Decimal
+import json
+from urllib.error import HTTPError, URLError
+from urllib.parse import quote, urlencode
+from urllib.request import Request, urlopen
+
+from config import API_TOKEN, API_URL, CONN_DB, HISTORY_LIMIT, ITER_SIZE
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class ApiError(Exception):
+    """Ошибка, которую вернул сервис api_server."""
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class RemoteDatabase:
+    """
+    Клиент api_server с тем же интерфейсом, что у db.Database, в той части,
+    которую используют вкладки, кэш и очередь отправки. Подключения к
+    PostgreSQL держит сервис, клиент только выполняет HTTP-запросы.
+    """
+    def __init__(self, api_url, timeout=30, token=API_TOKEN):
+        self.api_url = api_url.rstrip('/')
+        self.timeout = timeout
+        self.token = token
+        self.connected = False
+
+    def _request(self, method, path, params=None, body=None):
+        url = self.api_url + path
+        if params:
+            url += "?" + urlencode({k: v for k, v in params.items() if v is not None})
+        data = json.dumps(body, ensure_ascii=False, default=str).encode('utf-8') if body is not None else None
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        request = Request(url, data=data, method=method, headers=headers)
+        try:
+            with urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except HTTPError as e:
+            try:
+                message = json.loads(e.read()).get("error", e.reason)
+            except ValueError:
+                message = e.reason
+            raise ApiError(e.code, message) from None
+        except URLError as e:
+            self.connected = False
+            raise ConnectionError(f"Сервис API недоступен: {e.reason}") from None
+
+    @staticmethod
+    def _table_path(table, suffix=""):
+        return f"/tables/{quote(table, safe='')}{suffix}"
+
+    def connect(self):
+        self._request("GET", "/health")
+        self.connected = True
+        logger.info(f"API подключено: {self.api_url}")
+
+    def is_connected(self):
+        return self.connected
+
+    def close(self):
+        self.connected = False
+
+    def insert_support_data(self, table, data):
+        self._request("POST", self._table_path(table, "/rows"), body={"data": data})
+
+    def insert_support_batch(self, items):
+        self._request("POST", "/batch", body={"items": [list(item) for item in items]})
+
+    def select_rows(self, table, fields, where=None, order_by="id", descending=False, after=None, limit=None,
+                    include_archive=False):
+        params = {
+            "fields": ",".join(fields),
+            "order_by": order_by,
+            "desc": int(descending),
+            "limit": limit,
+            "include_archive": int(include_archive),
+        }
+        for field, value in (where or {}).items():
+            if field != "status":
+                raise ValueError(f"API поддерживает отбор только по status, а не {field}")
+            params["status"] = value
+        if after is not None:
+            params["after_key"], params["after_id"] = after
+        result = self._request("GET", self._table_path(table, "/rows"), params)
+        cursor = result["cursor"]
+        return [tuple(row) for row in result["rows"]], tuple(cursor) if cursor else None
+
+    def iter_rows(self, table, fields, where=None, itersize=ITER_SIZE):
+        """Строки таблицы по порядку id, как Database.iter_rows (страницами по itersize)."""
+        page_fields = list(fields) if "id" in fields else list(fields) + ["id"]
+        after = None
+        while True:
+            rows, after = self.select_rows(table, page_fields, where=where, after=after, limit=itersize)
+            for row in rows:
+                yield row[:len(fields)]
+            if after is None:
+                break
+
+    def copy_columns(self, table, fields, where=None, include_archive=False):
+        """Колонки листа, как Database.copy_columns (через API приходят строками JSON)."""
+        rows, _ = self.select_rows(table, fields, where=where, include_archive=include_archive)
+        columns = {field: [] for field in fields}
+        for field, values in zip(fields, zip(*rows)):
+            columns[field] = ["" if v is None else str(v) for v in values]
+        return columns
+
+    def search_rows(self, table, fields, text, limit=1000, include_archive=False):
+        result = self._request("GET", self._table_path(table, "/search"), {
+            "fields": ",".join(fields), "q": text, "limit": limit, "include_archive": int(include_archive)
+        })
+        return [tuple(row) for row in result["rows"]]
+
+    def customer_history(self, fields, user_id=None, addresses=(), include_archive=False, limit=HISTORY_LIMIT):
+        params = [("fields", ",".join(fields)), ("include_archive", int(include_archive)), ("limit", limit)]
+        params += [("user_id", user_id)] if user_id else []
+        params += [("address", a) for a in addresses if a]
+        result = self._request("GET", "/history?" + urlencode(params))
+        return [tuple(row) for row in result["rows"]]
+
+    def apply_refunds(self, updates, operator=None):
+        return self._request("POST", "/refunds", body={
+            "updates": [list(u) for u in updates], "operator": operator
+        })["updated"]
+
+    def table_signature(self, tables):
+        signature = self._request("GET", "/signature", {"tables": ",".join(tables)})["signature"]
+        return tuple(tuple(item) for item in signature) if signature else None
+
+    def update_record(self, table_name, record_id, updated_data, claimed_by=None, raise_errors=False,
+                      include_archive=False, operator=None):
+        try:
+            result = self._request("PATCH", self._table_path(table_name, f"/rows/{record_id}"), body={
+                "data": updated_data, "claimed_by": claimed_by, "include_archive": include_archive,
+                "operator": operator
+            })
+        except ApiError as e:
+            logger.error(f"Ошибка при обновлении записи {record_id}: {e}")
+            if raise_errors:
+                raise
+            return False
+        return result["updated"]
+
+    def delete_record(self, table_name, record_id, include_archive=False):
+        result = self._request("DELETE", self._table_path(table_name, f"/rows/{record_id}"),
+                               {"include_archive": int(include_archive)})
+        return bool(result["deleted"])
+
+    def claim_pending(self, table, fields, operator, count, lease_minutes):
+        return [tuple(row) for row in self._request("POST", self._table_path(table, "/claim"), body={
+            "fields": fields, "operator": operator, "count": count, "lease_minutes": lease_minutes
+        })["rows"]]
+
+    def claimed_rows(self, table, fields, operator):
+        result = self._request("GET", self._table_path(table, "/claimed"), {
+            "fields": ",".join(fields), "operator": operator
+        })
+        return [tuple(row) for row in result["rows"]]
+
+    def priority_pending(self, table, fields, limit, after=None, ids=None):
+        params = {"fields": ",".join(fields), "limit": limit}
+        if after is not None:
+            if after[0] is not None:
+                params["after_key"] = after[0]
+            params["after_id"] = after[1]
+        if ids is not None:
+            params["ids"] = ",".join(map(str, ids))
+        result = self._request("GET", self._table_path(table, "/priority"), params)
+        # Ключи приходят строками (Decimal в JSON) — точные значения для курсора after
+        keys = [None if key is None else Decimal(key) for key in result["keys"]]
+        return [tuple(row) for row in result["rows"]], keys
+
+    def release_claims(self, table, operator=None):
+        return self._request("POST", self._table_path(table, "/release"), body={"operator": operator})["released"]
+
+
+def make_database(dsn=CONN_DB):
+    """База данных приложения: клиент API, если задан API_URL, иначе прямое подключение."""
+    if API_URL:
+        return RemoteDatabase(API_URL)
+    from db import Database
+    return Database(dsn)
@@ -0,0 +1,448 @@
+# api_server.py
+"""
+HTTP API поверх db.Database для вкладок приложения.
+
+Один сервис держит общий пул подключений к PostgreSQL и кэширует ответы
+на чтение на API_CACHE_TTL секунд, поэтому многие клиенты не открывают
+собственные подключения. Клиентская сторона — api_client.RemoteDatabase.
+
+Запуск:
+    python api_server.py [--host 127.0.0.1] [--port 8080] [--dsn "..."] [--token ...]
+
+Каждый запрос должен содержать заголовок Authorization: Bearer <API_TOKEN>.
+Без токена сервис принимает подключения только на loopback-адресе.
+
+Маршруты (JSON, таблица — имя из SHEET_TO_TABLE, экранированное в URL):
+    GET    /health
+    GET    /signature?tables=a,b
+    GET    /tables/{table}/rows?fields=&order_by=&desc=&limit=&after_key=&after_id=&include_archive=&status=
+    GET    /tables/{table}/search?fields=&q=&limit=&include_archive=
+    GET    /tables/{table}/pending?fields=
+    GET    /tables/{table}/claimed?fields=&operator=
+    GET    /tables/{table}/priority?fields=&limit=&after_key=&after_id=&ids=
+    GET    /history?fields=&user_id=&address=...&include_archive=&limit=
+    POST   /tables/{table}/rows            {"data": {...}}
+    POST   /batch                          {"items": [[table, request_key, data], ...]}
+    PATCH  /tables/{table}/rows/{id}       {"data": {...}, "operator": "", "claimed_by": null, "include_archive": false}
+    DELETE /tables/{table}/rows/{id}?include_archive=
+    POST   /tables/{table}/claim           {"fields": [...], "operator": "", "count": 10, "lease_minutes": 30}
+    POST   /tables/{table}/release         {"operator": null}
+    POST   /refunds                        {"updates": [[table, id, return_hash], ...], "operator": null}
+"""
+import argparse
+import asyncio
+import hmac
+import ipaddress
+import json
+import re
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import psycopg2
+from psycopg2.pool import PoolError, ThreadedConnectionPool
+
+from config import (API_CACHE_MAX_ENTRIES, API_CACHE_TTL, API_HOST, API_POOL_MAX, API_POOL_MIN, API_PORT,
+                    API_TOKEN, ARCHIVE_SUFFIX, CONN_DB, ENG_FIELDS_MEMO, FIELDS_TS_ENG, HISTORY_LIMIT, PRIORITY_TOP_N,
+                    SHEET_TO_TABLE, STATUS_PENDING)
+from db import Database
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+KNOWN_TABLES = set(SHEET_TO_TABLE.values())
+KNOWN_FIELDS = set(FIELDS_TS_ENG) | set(ENG_FIELDS_MEMO) | {"request_key", "claimed_by", "claimed_until"}
+MAX_BODY = 16 * 1024 * 1024
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found", 405: "Method Not Allowed",
+               409: "Conflict", 413: "Payload Too Large", 422: "Unprocessable Entity", 500: "Internal Server Error",
+               503: "Service Unavailable"}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class ResponseCache:
+    """
+    Кэш ответов на GET-запросы с коротким временем жизни и сбросом по таблице.
+    Размер ограничен max_entries (LRU). Просроченные записи удаляются при put,
+    а не только при повторном чтении того же ключа: из головы очереди каждый
+    раз и полным проходом не чаще раза в ttl.
+    """
+    def __init__(self, ttl, max_entries=API_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._next_sweep = 0.0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            return entry[1]
+        self._entries.pop(key, None)
+        return None
+
+    def put(self, key, table, value):
+        now = time.monotonic()
+        self._entries[key] = (now + self.ttl, value, table)
+        self._entries.move_to_end(key)
+        self._purge(now)
+
+    def _purge(self, now):
+        if now >= self._next_sweep:
+            # Прочитанные записи переносятся в хвост, поэтому просроченные
+            # могут оказаться и за свежими
+            for key in [k for k, entry in self._entries.items() if entry[0] <= now]:
+                del self._entries[key]
+            self._next_sweep = now + self.ttl
+        # В голове — давно не читавшиеся записи: просроченные и сверх лимита
+        while self._entries:
+            oldest = next(iter(self._entries.values()))
+            if oldest[0] > now and len(self._entries) <= self.max_entries:
+                break
+            self._entries.popitem(last=False)
+
+    def invalidate(self, table):
+        for key in [k for k, entry in self._entries.items() if entry[2] == table]:
+            del self._entries[key]
+
+
+def check_table(table):
+    if table not in KNOWN_TABLES:
+        raise ApiError(404, f"Неизвестная таблица: {table}")
+    return table
+
+
+def check_fields(fields):
+    unknown = [f for f in fields if f not in KNOWN_FIELDS]
+    if unknown:
+        raise ApiError(400, f"Неизвестные поля: {', '.join(unknown)}")
+    return fields
+
+
+def query_fields(query):
+    value = query.get("fields", [""])[0]
+    return check_fields([f for f in value.split(",") if f] or list(FIELDS_TS_ENG))
+
+
+def query_flag(query, name):
+    return query.get(name, ["0"])[0].lower() in ("1", "true", "yes")
+
+
+def is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class ApiServer:
+    """
+    Асинхронный HTTP-сервер. Запросы к БД выполняются в пуле потоков на
+    подключениях из ThreadedConnectionPool, цикл asyncio не блокируется.
+    Если задан token, запросы без него отклоняются (401).
+    """
+    def __init__(self, dsn=CONN_DB, pool_min=API_POOL_MIN, pool_max=API_POOL_MAX, cache_ttl=API_CACHE_TTL,
+                 token=API_TOKEN):
+        self.dsn = dsn
+        self.token = token
+        self.pool = ThreadedConnectionPool(pool_min, pool_max, dsn)
+        self.executor = ThreadPoolExecutor(max_workers=pool_max, thread_name_prefix="api-db")
+        self.cache = ResponseCache(cache_ttl)
+        self.routes = [
+            ("GET", re.compile(r"^/health$"), self.health),
+            ("GET", re.compile(r"^/signature$"), self.signature),
+            ("GET", re.compile(r"^/history$"), self.history),
+            ("GET", re.compile(r"^/tables/([^/]+)/rows$"), self.list_rows),
+            ("GET", re.compile(r"^/tables/([^/]+)/search$"), self.search),
+            ("GET", re.compile(r"^/tables/([^/]+)/pending$"), self.pending),
+            ("GET", re.compile(r"^/tables/([^/]+)/claimed$"), self.claimed),
+            ("GET", re.compile(r"^/tables/([^/]+)/priority$"), self.priority),
+            ("POST", re.compile(r"^/tables/([^/]+)/rows$"), self.insert),
+            ("POST", re.compile(r"^/batch$"), self.insert_batch),
+            ("PATCH", re.compile(r"^/tables/([^/]+)/rows/(\d+)$"), self.update),
+            ("DELETE", re.compile(r"^/tables/([^/]+)/rows/(\d+)$"), self.delete),
+            ("POST", re.compile(r"^/tables/([^/]+)/claim$"), self.claim),
+            ("POST", re.compile(r"^/tables/([^/]+)/release$"), self.release),
+            ("POST", re.compile(r"^/refunds$"), self.apply_refunds),
+        ]
+
+    def _with_db(self, func):
+        """Выполняет func(db) на подключении из пула (вызывается в потоке исполнителя)."""
+        conn = self.pool.getconn()
+        db = Database(self.dsn)
+        db.conn = conn
+        try:
+            return func(db)
+        finally:
+            if not conn.closed:
+                conn.rollback()
+            self.pool.putconn(conn, close=bool(conn.closed))
+
+    async def run_db(self, func):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._with_db, func)
+
+    async def cached(self, key, table, func):
+        result = self.cache.get(key)
+        if result is None:
+            result = await self.run_db(func)
+            self.cache.put(key, table, result)
+        return result
+
+    # --- обработчики ---
+
+    async def health(self, query, body):
+        return {"status": "ok"}
+
+    async def signature(self, query, body):
+        tables = [t for t in query.get("tables", [""])[0].split(",") if t]
+        for table in tables:
+            if table.removesuffix(ARCHIVE_SUFFIX) not in KNOWN_TABLES:
+                raise ApiError(404, f"Неизвестная таблица: {table}")
+        return {"signature": await self.run_db(lambda db: db.table_signature(tables))}
+
+    async def history(self, query, body):
+        fields = query_fields(query)
+        user_id = query.get("user_id", [""])[0]
+        addresses = query.get("address", [])
+        include_archive = query_flag(query, "include_archive")
+        limit = int(query.get("limit", [HISTORY_LIMIT])[0])
+        return {"rows": await self.run_db(lambda db: db.customer_history(
+            fields, user_id, addresses, include_archive, limit
+        ))}
+
+    async def list_rows(self, query, body, table, key=None):
+        table = check_table(table)
+        fields = query_fields(query)
+        order_by = check_fields([query.get("order_by", ["id"])[0]])[0]
+        limit = int(query["limit"][0]) if "limit" in query else None
+        # Отсутствующий after_key — курсор в группе строк с NULL в ключе сортировки
+        after = (query.get("after_key", [None])[0], int(query["after_id"][0])) if "after_id" in query else None
+        where = {"status": query["status"][0]} if "status" in query else None
+        include_archive = query_flag(query, "include_archive")
+        rows, cursor = await self.cached(key, table, lambda db: db.select_rows(
+            table, fields, where=where, order_by=order_by, descending=query_flag(query, "desc"),
+            after=after, limit=limit, include_archive=include_archive
+        ))
+        return {"rows": rows, "cursor": cursor}
+
+    async def search(self, query, body, table, key=None):
+        table = check_table(table)
+        fields = query_fields(query)
+        text = query.get("q", [""])[0]
+        limit = int(query.get("limit", ["1000"])[0])
+        rows = await self.cached(key, table, lambda db: db.search_rows(
+            table, fields, text, limit, include_archive=query_flag(query, "include_archive")
+        ))
+        return {"rows": rows}
+
+    async def pending(self, query, body, table, key=None):
+        table = check_table(table)
+        fields = query_fields(query)
+        rows, _ = await self.cached(key, table, lambda db: db.select_rows(table, fields, where={"status": STATUS_PENDING}))
+        return {"rows": rows}
+
+    async def priority(self, query, body, table, key=None):
+        table = check_table(table)
+        fields = query_fields(query)
+        limit = int(query.get("limit", [str(PRIORITY_TOP_N)])[0])
+        # Отсутствующий after_key — курсор в группе заявок без ключа приоритета
+        after = (query.get("after_key", [None])[0], int(query["after_id"][0])) if "after_id" in query else None
+        ids = [int(i) for i in query["ids"][0].split(",") if i] if "ids" in query else None
+        rows, keys = await self.cached(key, table, lambda db: db.priority_pending(
+            table, fields, limit, after=after, ids=ids
+        ))
+        return {"rows": rows, "keys": keys}
+
+    async def claimed(self, query, body, table, key=None):
+        table = check_table(table)
+        fields = query_fields(query)
+        operator = query.get("operator", [""])[0]
+        return {"rows": await self.run_db(lambda db: db.claimed_rows(table, fields, operator))}
+
+    async def insert(self, query, body, table):
+        table = check_table(table)
+        await self.run_db(lambda db: db.insert_support_data(table, body["data"]))
+        self.cache.invalidate(table)
+        return {"inserted": 1}
+
+    async def insert_batch(self, query, body):
+        items = [(check_table(t), key, data) for t, key, data in body["items"]]
+        await self.run_db(lambda db: db.insert_support_batch(items))
+        for table in {t for t, _, _ in items}:
+            self.cache.invalidate(table)
+        return {"inserted": len(items)}
+
+    async def update(self, query, body, table, record_id):
+        table = check_table(table)
+        data = body["data"]
+        check_fields(list(data))
+        if not body.get("operator") and not body.get("claimed_by"):
+            # Без имени трейдера нельзя проверить аренду заявки
+            raise ApiError(400, "Не указан operator или claimed_by")
+        updated = await self.run_db(lambda db: db.update_record(
+            table, int(record_id), data, claimed_by=body.get("claimed_by"), raise_errors=True,
+            include_archive=bool(body.get("include_archive")), operator=body.get("operator")
+        ))
+        self.cache.invalidate(table)
+        return {"updated": bool(updated)}
+
+    async def delete(self, query, body, table, record_id):
+        table = check_table(table)
+        deleted = await self.run_db(lambda db: db.delete_record(
+            table, int(record_id), include_archive=query_flag(query, "include_archive")
+        ))
+        self.cache.invalidate(table)
+        return {"deleted": int(deleted)}
+
+    async def claim(self, query, body, table):
+        table = check_table(table)
+        fields = check_fields(body.get("fields") or list(FIELDS_TS_ENG))
+        rows = await self.run_db(lambda db: db.claim_pending(
+            table, fields, body["operator"], int(body.get("count", 10)), int(body.get("lease_minutes", 30))
+        ))
+        self.cache.invalidate(table)
+        return {"rows": rows}
+
+    async def release(self, query, body, table):
+        table = check_table(table)
+        released = await self.run_db(lambda db: db.release_claims(table, body.get("operator")))
+        self.cache.invalidate(table)
+        return {"released": released}
+
+    async def apply_refunds(self, query, body):
+        updates = [(check_table(t), int(i), h) for t, i, h in body["updates"]]
+        updated = await self.run_db(lambda db: db.apply_refunds(updates, operator=body.get("operator")))
+        for table in {t for t, _, _ in updates}:
+            self.cache.invalidate(table)
+        return {"updated": updated}
+
+    # --- HTTP ---
+
+    async def dispatch(self, method, target, body):
+        parts = urlsplit(target)
+        path = parts.path
+        query = parse_qs(parts.query)
+        for route_method, pattern, handler in self.routes:
+            match = pattern.match(path)
+            if not match or route_method != method:
+                continue
+            args = [unquote(a) for a in match.groups()]
+            if method == "GET" and args:
+                # Ключ кэша — полный запрос; таблица — для сброса при изменениях
+                return await handler(query, body, *args, key=target)
+            return await handler(query, body, *args)
+        if any(pattern.match(path) for _, pattern, _ in self.routes):
+            raise ApiError(405, f"Метод {method} не поддерживается для {path}")
+        raise ApiError(404, f"Не найдено: {path}")
+
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length', 0))
+                status, payload = 200, None
+                try:
+                    if length > MAX_BODY:
+                        raise ApiError(413, "Слишком большой запрос")
+                    raw = await reader.readexactly(length) if length else b''
+                    if not self.authorized(headers):
+                        raise ApiError(401, "Требуется токен доступа")
+                    body = json.loads(raw) if raw else {}
+                    start = time.perf_counter()
+                    payload = await self.dispatch(method, target, body)
+                    logger.debug(f"{method} {target}", extra={
+                        "operation": "api", "duration_ms": round((time.perf_counter() - start) * 1000, 2)
+                    })
+                except ApiError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except (KeyError, ValueError, TypeError) as e:
+                    status, payload = 400, {"error": f"Некорректный запрос: {e}"}
+                except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+                    # БД отклонила данные запроса: повтор без исправления не поможет
+                    status, payload = 422, {"error": str(e)}
+                except (psycopg2.OperationalError, psycopg2.InterfaceError, PoolError) as e:
+                    # Связь с БД: клиент повторит запрос позже, данные не виноваты
+                    logger.warning(f"БД недоступна при обработке {method} {target}: {e}")
+                    status, payload = 503, {"error": str(e)}
+                except Exception as e:
+                    logger.exception(f"Ошибка обработки {method} {target}")
+                    status, payload = 500, {"error": str(e)}
+
+                data = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                writer.write(
+                    f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+                    f"Content-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def authorized(self, headers):
+        if not self.token:
+            return True
+        return hmac.compare_digest(headers.get('authorization', '').encode(), f"Bearer {self.token}".encode())
+
+    async def serve(self, host=API_HOST, port=API_PORT):
+        if not self.token and not is_loopback(host):
+            raise ValueError(f"Без API_TOKEN сервис можно запустить только на loopback-адресе, а не {host}")
+        server = await asyncio.start_server(self.handle_client, host, port)
+        logger.info(f"API запущен на http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.pool.closeall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP API поверх базы возвратов")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("--dsn", default=CONN_DB)
+    parser.add_argument("--token", default=API_TOKEN, help="токен доступа (по умолчанию SUPPORT_APP_API_TOKEN)")
+    args = parser.parse_args()
+    if not args.token and not is_loopback(args.host):
+        parser.error("без --token (SUPPORT_APP_API_TOKEN) сервис запускается только на 127.0.0.1/localhost")
+
+    server = ApiServer(args.dsn, token=args.token)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+# archive.py
+"""
+Перенос сделанных возвратов в архивные таблицы.
+
+Запуск:
+    python archive.py [--days 90] [--batch 1000] [--sheet "TON"]
+
+Каждая пачка переносится отдельной транзакцией (DELETE ... RETURNING +
+INSERT), поэтому прерванный запуск можно просто повторить.
+"""
+import argparse
+import time
+
+from psycopg2 import sql
+
+from config import (ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE, CONN_DB,
+                    SHEET_TO_TABLE, STATUS_DONE)
+from db import Database, archive_table_name
+from logger import get_logger, log_operation
+
+logger = get_logger(__name__)
+
+
+def table_columns(db, table):
+    """Возвращает список колонок таблицы в порядке их объявления."""
+    with db.conn.cursor() as cur:
+        cur.execute(
+            "SELECT column_name FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND table_name = %s ORDER BY ordinal_position",
+            (table,)
+        )
+        columns = [row[0] for row in cur.fetchall()]
+    db.conn.commit()
+    return columns
+
+
+def ensure_archive_table(db, table):
+    """
+    Создает архивную таблицу по образцу основной и добавляет в нее колонки,
+    появившиеся в основной таблице позже.
+
+    Returns:
+        list: Колонки основной таблицы.
+    """
+    archive = archive_table_name(table)
+    with db.conn.cursor() as cur:
+        cur.execute(sql.SQL("CREATE TABLE IF NOT EXISTS {} (LIKE {} INCLUDING INDEXES)").format(
+            sql.Identifier(archive), sql.Identifier(table)
+        ))
+    db.conn.commit()
+    columns = table_columns(db, table)
+    missing = [col for col in columns if col not in table_columns(db, archive)]
+    if missing:
+        with db.conn.cursor() as cur:
+            # format_type сохраняет модификаторы типа (varchar(255), numeric(12,2))
+            cur.execute(
+                "SELECT attname, format_type(atttypid, atttypmod) FROM pg_attribute "
+                "WHERE attrelid = %s::regclass AND attname = ANY(%s) AND attnum > 0 AND NOT attisdropped "
+                "ORDER BY attnum",
+                (sql.Identifier(table).as_string(cur), missing)
+            )
+            for column, data_type in cur.fetchall():
+                cur.execute(sql.SQL("ALTER TABLE {} ADD COLUMN IF NOT EXISTS {} {}").format(
+                    sql.Identifier(archive), sql.Identifier(column), sql.SQL(data_type)
+                ))
+        db.conn.commit()
+    return columns
+
+
+def archive_table(db, table, days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Переносит сделанные возвраты старше days дней из table в архив.
+
+    Args:
+        db (Database): Подключенная база данных.
+        table (str): Основная таблица.
+        days (int): Минимальный возраст заявки в днях.
+        batch_size (int): Размер пачки (одна транзакция).
+
+    Returns:
+        int: Количество перенесенных строк.
+    """
+    columns = ensure_archive_table(db, table)
+    column_list = sql.SQL(', ').join(map(sql.Identifier, columns))
+    query = sql.SQL("""
+        WITH moved AS (
+            DELETE FROM {table} WHERE id IN (
+                SELECT id FROM {table}
+                WHERE status = %s AND refund_date(date) < current_date - %s
+                ORDER BY id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING {columns}
+        )
+        INSERT INTO {archive} ({columns}) SELECT {columns} FROM moved
+    """).format(table=sql.Identifier(table), archive=sql.Identifier(archive_table_name(table)), columns=column_list)
+
+    total = 0
+    while True:
+        try:
+            with log_operation(logger, "archive_batch", table=table) as context:
+                with db.conn.cursor() as cur:
+                    cur.execute(query, (STATUS_DONE, days, batch_size))
+                    moved = cur.rowcount
+                db.conn.commit()
+                context["rows"] = moved
+        except Exception:
+            db.conn.rollback()
+            raise
+        total += moved
+        if moved < batch_size:
+            break
+        # Короткая пауза, чтобы не держать нагрузку на рабочие таблицы
+        time.sleep(0.05)
+    logger.info(f"Перенесено в архив {table}: {total}", extra={"table": table, "rows": total})
+    return total
+
+
+def prune_table_changes(db):
+    """
+    Сокращает журнал изменений table_changes до последней строки по каждой
+    таблице. Версия таблиц (Database.table_signature) при этом меняется один
+    раз, и кэши листов перезагружаются.
+
+    Returns:
+        int: Количество удаленных строк журнала.
+    """
+    try:
+        with log_operation(logger, "prune_table_changes") as context:
+            with db.conn.cursor() as cur:
+                cur.execute(
+                    "DELETE FROM table_changes c WHERE id < "
+                    "(SELECT max(id) FROM table_changes WHERE table_name = c.table_name)"
+                )
+                context["rows"] = cur.rowcount
+            db.conn.commit()
+    except Exception:
+        db.conn.rollback()
+        raise
+    return context["rows"]
+
+
+def archive_all(db, days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE, sheets=None):
+    """Архивирует все (или выбранные) листы. Возвращает словарь таблица -> количество."""
+    result = {}
+    for sheet, table in SHEET_TO_TABLE.items():
+        if sheets and sheet not in sheets:
+            continue
+        result[table] = archive_table(db, table, days, batch_size)
+    prune_table_changes(db)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Перенос сделанных возвратов в архив")
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS, help="возраст заявки в днях")
+    parser.add_argument("--batch", type=int, default=ARCHIVE_BATCH_SIZE, help="размер пачки")
+    parser.add_argument("--sheet", action="append", help="лист (можно указать несколько раз)")
+    args = parser.parse_args()
+
+    db = Database(CONN_DB)
+    db.connect()
+    try:
+        for table, count in archive_all(db, args.days, args.batch, args.sheet).items():
+            print(f"{table}: {count}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+# batch_entry.py
+import csv
+import io
+import tkinter as tk
+import uuid
+from tkinter import ttk, messagebox
+
+from config import (DISABLED_FIELDS, FIELDS, REQUIRED_FIELDS, SHEET_TO_TABLE,
+                    STATUS_PENDING, TOKEN_MAPPING)
+from logger import get_logger
+from validation import validate_form
+
+logger = get_logger(__name__)
+
+MEMO_SHEETS = ["USDT (TON)", "TON"]
+
+
+def input_columns(sheet):
+    """
+    Колонки, которые оператор вставляет из буфера для листа: поля формы
+    без заблокированных и без токена (он определяется листом).
+    """
+    columns = [f for f in FIELDS if f not in DISABLED_FIELDS and f not in ("Токен", "Мемо")]
+    if sheet in MEMO_SHEETS:
+        columns.append("Мемо")
+    return columns
+
+
+def parse_clipboard(text, columns):
+    """
+    Разбирает содержимое буфера обмена в строки по колонкам.
+
+    Табличные данные (из таблиц/Excel) разделены табуляцией, строка на запись.
+    Без табуляции каждая строка текста — одно значение: записи разделяются
+    пустой строкой, а если пустых строк нет — берутся подряд по числу колонок.
+
+    Args:
+        text (str): Текст из буфера.
+        columns (list): Ожидаемые колонки.
+
+    Returns:
+        list: Списки значений длиной len(columns).
+    """
+    text = text.replace('\r\n', '\n').replace('\r', '\n').strip('\n')
+    if not text.strip():
+        return []
+
+    if '\t' in text:
+        records = [[cell.strip() for cell in row] for row in csv.reader(io.StringIO(text), delimiter='\t')]
+        records = [row for row in records if any(row)]
+        # Пропускаем строку заголовков, если ее скопировали вместе с данными
+        if records and [c.lower() for c in records[0][:len(columns)]] == [c.lower() for c in columns[:len(records[0])]]:
+            records = records[1:]
+    else:
+        lines = [line.strip() for line in text.split('\n')]
+        if '' in lines:
+            records, current = [], []
+            for line in lines + ['']:
+                if line:
+                    current.append(line)
+                elif current:
+                    records.append(current)
+                    current = []
+        else:
+            size = len(columns)
+            records = [lines[i:i + size] for i in range(0, len(lines), size)]
+
+    return [(row + [''] * len(columns))[:len(columns)] for row in records]
+
+
+def validate_row(values, columns, sheet=None):
+    """
+    Проверяет строку на заполненность обязательных полей, а если задан
+    лист — формат адресов и хэшей для его сети.
+
+    Returns:
+        dict: Колонка -> текст ошибки (пустой, если строка корректна).
+    """
+    errors = {}
+    for column, value in zip(columns, values):
+        if column in REQUIRED_FIELDS and not value:
+            errors[column] = "не заполнено"
+    if sheet is not None:
+        errors.update(validate_form(sheet, dict(zip(columns, values))))
+    return errors
+
+
+def build_record(values, columns, sheet):
+    """
+    Собирает данные заявки в том же виде, что и SupportForm.submit_data:
+    ключи в порядке FIELDS (и "Мемо" для TON-листов).
+    """
+    row = dict(zip(columns, values))
+    data = {}
+    for field in FIELDS:
+        if field == "Мемо":
+            continue
+        data[field] = row.get(field, "")
+    data["Токен"] = TOKEN_MAPPING.get(sheet, "")
+    data["ХЭШ ВОЗВРАТА"] = ""
+    data["Возврат сделан (+)"] = ""
+    data["Статус"] = STATUS_PENDING
+    if sheet in MEMO_SHEETS:
+        data["Мемо"] = row.get("Мемо", "")
+    return data
+
+
+class BatchEntryWindow:
+    """
+    Окно пакетного ввода: вставка нескольких заявок из буфера обмена,
+    предпросмотр с проверкой полей и вставка корректных строк одним запросом.
+
+    Атрибуты:
+        db (Database): Объект базы данных.
+        sheet (str): Лист, в таблицу которого добавляются заявки.
+        columns (list): Колонки разбора.
+        rows (list): Разобранные строки.
+        errors (list): Ошибки по каждой строке (словарь колонка -> текст).
+        keys (list): Ключи идемпотентности строк. Создаются при разборе и
+            сохраняются до успешной вставки, поэтому повторное нажатие после
+            ошибки связи не создает дубликатов уже записанных заявок.
+    """
+    def __init__(self, parent, db, sheet):
+        """
+        Args:
+            parent (tk.Widget): Родительский виджет.
+            db (Database): Объект базы данных.
+            sheet (str): Выбранный лист.
+        """
+        self.db = db
+        self.sheet = sheet
+        self.columns = input_columns(sheet)
+        self.rows = []
+        self.errors = []
+        self.keys = []
+
+        self.window = tk.Toplevel(parent)
+        self.window.title(f"Пакетный ввод — {sheet}")
+        self.window.geometry("1100x600")
+
+        ttk.Label(self.window, text="Колонки: " + " | ".join(self.columns)).pack(anchor='w', padx=10, pady=5)
+
+        self.text = tk.Text(self.window, height=8)
+        self.text.pack(fill='x', padx=10)
+
+        btn_frame = ttk.Frame(self.window)
+        btn_frame.pack(fill='x', padx=10, pady=5)
+        ttk.Button(btn_frame, text="Вставить из буфера", command=self.paste_clipboard).pack(side='left', padx=5)
+        ttk.Button(btn_frame, text="Разобрать", command=self.parse).pack(side='left', padx=5)
+        self.btn_insert = ttk.Button(btn_frame, text="Добавить корректные строки", command=self.insert_valid, state='disabled')
+        self.btn_insert.pack(side='left', padx=5)
+        self.summary_var = tk.StringVar()
+        ttk.Label(btn_frame, textvariable=self.summary_var).pack(side='left', padx=15)
+
+        preview_columns = ["№"] + self.columns + ["Ошибки"]
+        self.tree = ttk.Treeview(self.window, columns=preview_columns, show='headings')
+        for col in preview_columns:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=50 if col == "№" else 110)
+        self.tree.tag_configure('invalid', background='#f8d7da')
+        self.tree.pack(fill='both', expand=True, padx=10, pady=5)
+
+        v_scrollbar = ttk.Scrollbar(self.tree, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=v_scrollbar.set)
+        v_scrollbar.pack(side='right', fill='y')
+
+    def paste_clipboard(self):
+        """Вставляет содержимое буфера обмена в поле и сразу разбирает его."""
+        try:
+            content = self.window.clipboard_get()
+        except tk.TclError:
+            messagebox.showwarning("Буфер обмена", "Буфер обмена пуст", parent=self.window)
+            return
+        self.text.delete("1.0", tk.END)
+        self.text.insert("1.0", content)
+        self.parse()
+
+    def parse(self):
+        """Разбирает текст и заполняет таблицу предпросмотра."""
+        rows = parse_clipboard(self.text.get("1.0", tk.END), self.columns)
+        # Новые ключи — только для новой пачки: тот же текст, разобранный
+        # повторно, остается той же ожидающей пачкой
+        if rows != self.rows:
+            self.keys = [uuid.uuid4().hex for _ in rows]
+        self.rows = rows
+        self.errors = [validate_row(row, self.columns, self.sheet) for row in self.rows]
+
+        self.tree.delete(*self.tree.get_children())
+        for i, (row, errors) in enumerate(zip(self.rows, self.errors), start=1):
+            # Ячейки с ошибкой помечаются, чтобы их было видно в строке
+            cells = [f"⚠ {value}" if col in errors else value for col, value in zip(self.columns, row)]
+            error_text = "; ".join(f"{col}: {msg}" for col, msg in errors.items())
+            self.tree.insert('', 'end', values=[i] + cells + [error_text], tags=('invalid',) if errors else ())
+
+        valid = sum(1 for errors in self.errors if not errors)
+        self.summary_var.set(f"Строк: {len(self.rows)}, корректных: {valid}, с ошибками: {len(self.rows) - valid}")
+        self.btn_insert.configure(state='normal' if valid else 'disabled')
+
+    def insert_valid(self):
+        """Добавляет корректные строки в таблицу листа одной транзакцией."""
+        table_name = SHEET_TO_TABLE.get(self.sheet)
+        if not table_name:
+            messagebox.showerror("Ошибка", f"Таблица для листа '{self.sheet}' не найдена", parent=self.window)
+            return
+        items = [
+            (table_name, key, build_record(row, self.columns, self.sheet))
+            for row, key, errors in zip(self.rows, self.keys, self.errors) if not errors
+        ]
+        try:
+            if not self.db.is_connected():
+                self.db.connect()
+            self.db.insert_support_batch(items)
+        except Exception as e:
+            messagebox.showerror("Ошибка", str(e), parent=self.window)
+            logger.exception("Ошибка пакетной вставки")
+            return
+        skipped = len(self.rows) - len(items)
+        messagebox.showinfo("Успех", f"Добавлено строк: {len(items)}" + (f", пропущено с ошибками: {skipped}" if skipped else ""),
+                            parent=self.window)
+        self.window.destroy()
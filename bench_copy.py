@@ -0,0 +1,145 @@
+# bench_copy.py
+"""
+Сравнение загрузки листа целиком: SELECT + fetchall + RowStore.from_rows
+против COPY TO STDOUT + Database.copy_columns + RowStore.from_columns.
+
+Создает временную таблицу по образцу таблицы листа, заполняет ее на сервере
+(generate_series) и измеряет для обоих путей время чтения, время построения
+RowStore и пик памяти Python. Путь загрузки кэша выбирается
+config.CACHE_LOAD_VIA_COPY.
+
+Запуск (только против локальной/тестовой БД, схема из create_table.txt;
+рабочая БД из config.CONN_DB отклоняется):
+    python bench_copy.py --dsn "dbname=test user=... host=localhost" --rows 1000000 --repeat 3
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+from psycopg2 import sql
+
+from config import SHEET_TO_TABLE
+from dataset_cache import sheet_fields
+from db import Database
+from loadtest import nonproduction_dsn
+from logger import logger as app_logger
+from row_store import RowStore
+
+BENCH_TABLE = "bench_copy_rows"
+
+
+def create_table(db, sheet, rows):
+    """Создает и заполняет таблицу замера по образцу таблицы листа."""
+    source = SHEET_TO_TABLE[sheet]
+    with db.conn.cursor() as cur:
+        cur.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier(BENCH_TABLE)))
+        cur.execute(sql.SQL("CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS)").format(
+            sql.Identifier(BENCH_TABLE), sql.Identifier(source)
+        ))
+        columns = ["id", "fio", "number", "date", "user_id", "application_amount", "token", "receipt_amount",
+                   "hash", "sender_address", "return_address", "return_hash", "return_done", "return_reason", "status"]
+        values = [
+            "g", "'Клиент ' || g", "(g::bigint * 7919)::text", "to_char(date '2024-01-01' + g % 365, 'DD.MM.YYYY')",
+            "(g % 50000)::text", "((g % 1000) || ',' || (g % 100))", "'USDT (TRX)'", "((g % 1000) || '.5')",
+            "md5(g::text) || md5((g + 1)::text)", "'T' || left(md5((g + 2)::text), 33)",
+            "'T' || left(md5((g + 3)::text), 33)", "CASE WHEN g % 3 = 0 THEN md5(g::text) END",
+            "CASE WHEN g % 3 = 0 THEN '+' END", "'Причина ' || (g % 5)",
+            "CASE WHEN g % 3 = 0 THEN 'Возврат сделан' ELSE 'Возврат не сделан' END",
+        ]
+        if "memo" in sheet_fields(sheet):
+            columns.append("memo")
+            values.append("(g % 100000)::text")
+        cur.execute(sql.SQL("INSERT INTO {} ({}) SELECT {} FROM generate_series(1, %s) AS g").format(
+            sql.Identifier(BENCH_TABLE),
+            sql.SQL(", ").join(map(sql.Identifier, columns)),
+            # В выражениях остаток от деления: % экранируется для параметра %s
+            sql.SQL(", ".join(values).replace("%", "%%"))
+        ), (rows,))
+        cur.execute(sql.SQL("ALTER TABLE {} ADD PRIMARY KEY (id)").format(sql.Identifier(BENCH_TABLE)))
+        cur.execute(sql.SQL("ANALYZE {}").format(sql.Identifier(BENCH_TABLE)))
+    db.conn.commit()
+
+
+def read_fetchall(db, fields):
+    """Путь select_rows: SELECT ... ORDER BY id + fetchall."""
+    query = sql.SQL("SELECT {} FROM {} ORDER BY id").format(
+        sql.SQL(', ').join(map(sql.Identifier, fields)), sql.Identifier(BENCH_TABLE)
+    )
+    with db.conn.cursor() as cur:
+        cur.execute(query)
+        rows = cur.fetchall()
+    db.conn.commit()
+    return rows
+
+
+def read_copy(db, fields):
+    return db.copy_columns(BENCH_TABLE, fields)
+
+
+# Путь -> (чтение из БД, построение RowStore)
+PATHS = {
+    "fetchall": (read_fetchall, RowStore.from_rows),
+    "copy": (read_copy, RowStore.from_columns),
+}
+
+
+def measure(read, build, db, fields, repeat):
+    """
+    Лучший из repeat запусков (время чтения и построения RowStore этого
+    запуска) и пик памяти Python отдельным запуском.
+    """
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        data = read(db, fields)
+        read_done = time.perf_counter()
+        store = build(fields, data)
+        end = time.perf_counter()
+        run = {"rows": len(store), "read_s": read_done - start, "build_s": end - read_done, "best_s": end - start}
+        if best is None or run["best_s"] < best["best_s"]:
+            best = run
+        del data, store
+    gc.collect()
+    tracemalloc.start()
+    build(fields, read(db, fields))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    result = {key: round(value, 3) if key != "rows" else value for key, value in best.items()}
+    result["peak_mb"] = round(peak / 1024 / 1024, 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение fetchall и COPY при загрузке листа")
+    parser.add_argument("--dsn", required=True, type=nonproduction_dsn, help="строка подключения к тестовой БД (не CONN_DB)")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--sheet", default="USDT (TRC-20)", help="лист, по образцу которого создается таблица")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--keep", action="store_true", help="не удалять таблицу замера")
+    args = parser.parse_args()
+
+    app_logger.setLevel("WARNING")
+    fields = sheet_fields(args.sheet)
+    db = Database(args.dsn)
+    db.connect()
+    try:
+        create_table(db, args.sheet, args.rows)
+        results = {name: measure(read, build, db, fields, args.repeat) for name, (read, build) in PATHS.items()}
+        if not args.keep:
+            with db.conn.cursor() as cur:
+                cur.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(BENCH_TABLE)))
+            db.conn.commit()
+    finally:
+        db.close()
+
+    print(f"{'путь':<10}{'строк':>10}{'чтение, с':>12}{'RowStore, с':>13}{'всего, с':>11}{'пик, МБ':>10}")
+    for name, r in results.items():
+        print(f"{name:<10}{r['rows']:>10}{r['read_s']:>12}{r['build_s']:>13}{r['best_s']:>11}{r['peak_mb']:>10}")
+    speedup = results["fetchall"]["best_s"] / max(results["copy"]["best_s"], 1e-9)
+    print(f"Отношение времени fetchall / copy: {speedup:.2f}")
+
+
+if __name__ == "__main__":
+    main()
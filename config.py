@@ -1,7 +1,71 @@
 # support_app/config.py
+import getpass
+import os
 
 CONN_DB = "dbname=db user=admin password=admin host=10.10.10.126 port=5432"
 
+# HTTP API (api_server.py). Если API_URL задан, вкладки работают через сервис
+# вместо прямого подключения к БД, например "http://10.10.10.126:8080".
+API_URL = None
+API_HOST = "127.0.0.1"
+API_PORT = 8080
+API_POOL_MIN = 2
+API_POOL_MAX = 20
+# Время жизни кэша ответов на чтение, сек
+API_CACHE_TTL = 2.0
+# Наибольшее число ответов в кэше, сверх него вытесняются давно не читавшиеся
+API_CACHE_MAX_ENTRIES = 1000
+# Общий токен доступа к API (заголовок Authorization: Bearer). Без токена
+# сервис запускается только на loopback-адресе.
+API_TOKEN = os.environ.get("SUPPORT_APP_API_TOKEN")
+
+# Каталог приложения: относительные пути (logs/) считаются от него, а не от текущего каталога
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Логирование: JSON Lines с ротацией, уровни можно переопределить по модулям
+LOG_FILE = os.path.join(APP_DIR, "logs", "support_app.jsonl")
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+LOG_LEVEL = "INFO"
+LOG_LEVELS = {
+    # "db": "DEBUG",
+}
+
+# Диагностика запросов (query_diagnostics.py): запросы дольше DIAG_SLOW_MS
+# с вероятностью DIAG_SAMPLE_RATE повторяются с EXPLAIN и пишутся в DIAG_LOG_FILE.
+# Включается здесь или переменной окружения SUPPORT_APP_DIAG=1.
+DIAG_ENABLED = False
+DIAG_SLOW_MS = 200
+DIAG_SAMPLE_RATE = 0.2
+DIAG_LOG_FILE = os.path.join(APP_DIR, "logs", "slow_queries.jsonl")
+# Колонки фильтров вкладок: Seq Scan по ним означает отсутствующий индекс
+DIAG_WATCH_COLUMNS = ["status", "hash", "sender_address", "return_address", "user_id"]
+
+# Закрепление заявок за трейдером («взять следующие N»)
+OPERATOR_NAME = getpass.getuser()
+CLAIM_BATCH_SIZE = 10
+CLAIM_LEASE_MINUTES = 30
+
+# Очередь невыполненных возвратов по приоритету (priority.py). Веса возраста
+# и суммы задаются только функцией refund_priority() в create_table.txt.
+PRIORITY_TOP_N = 200
+# Срок выполнения возврата (SLA) и за сколько дней до него подсвечивать заявку
+SLA_DAYS = 3
+SLA_WARNING_DAYS = 1
+
+# История клиента (history.py): максимум строк и время жизни кэша результатов, сек
+HISTORY_LIMIT = 500
+HISTORY_CACHE_TTL = 60
+
+# Объем памяти под кэш загруженных листов (dataset_cache.py), МБ
+CACHE_BUDGET_MB = 512
+# Загрузка листа в кэш через COPY (Database.copy_columns) вместо SELECT + fetchall.
+# Замер bench_copy.py: чтение COPY медленнее, построение RowStore из колонок быстрее;
+# итог см. в readme. False — прежний путь select_rows.
+CACHE_LOAD_VIA_COPY = True
+# Строк за один запрос при построчном переборе таблицы (Database.iter_rows)
+ITER_SIZE = 5000
+
 # Связь листов и таблиц базы данных
 SHEET_TO_TABLE = {
     "BTC - Bitcoin": "support_data_btc_-_bitcoin",
@@ -33,6 +97,17 @@ LIST_TOKEN = [
     "USDT (TON)", "USDC (ERC-20)"
 ]
 
+# Статусы возврата
+STATUS_PENDING = "Возврат не сделан"
+STATUS_DONE = "Возврат сделан"
+
+# Архив: сделанные возвраты старше ARCHIVE_AFTER_DAYS дней переносятся
+# в таблицы "<таблица>_archive" пачками по ARCHIVE_BATCH_SIZE строк.
+# Дата заявки хранится текстом и разбирается функцией refund_date() в БД.
+ARCHIVE_SUFFIX = "_archive"
+ARCHIVE_AFTER_DAYS = 90
+ARCHIVE_BATCH_SIZE = 1000
+
 # Поля формы
 FIELDS = [
     "ФИО", "Номер", "Дата", "ID Клиента", "Сумма заявки", "Токен",
@@ -52,6 +127,9 @@ ENG_FIELDS_MEMO = (
     "return_hash", "return_done", "return_reason", "status", "memo"
 )
 
+# Текстовые поля с суммами: сортируются как числа (функция refund_amount в БД)
+NUMERIC_FIELDS = ["application_amount", "receipt_amount"]
+
 # Обязательные поля
 REQUIRED_FIELDS = [
     "ФИО", "Номер", "Дата", "ID Клиента", "Токен", "Сумма поступления",
@@ -0,0 +1,152 @@
+# dataset_cache.py
+import threading
+import time
+from collections import OrderedDict
+
+from api_client import make_database
+from config import CACHE_BUDGET_MB, CACHE_LOAD_VIA_COPY, FIELDS_TS_ENG, LIST_TOKEN, SHEET_TO_TABLE, STATUS_PENDING
+from db import archive_table_name
+from logger import get_logger, log_operation
+from row_store import RowStore
+
+logger = get_logger(__name__)
+
+MEMO_SHEETS = ["USDT (TON)", "TON"]
+
+
+def sheet_fields(sheet):
+    """Поля таблицы листа в порядке колонок вкладок (с memo для TON-листов)."""
+    fields = list(FIELDS_TS_ENG)
+    if sheet in MEMO_SHEETS:
+        fields.append("memo")
+    return fields
+
+
+class CacheEntry:
+    def __init__(self, store, signature):
+        self.store = store
+        self.signature = signature
+        self.nbytes = store.nbytes
+        self.loaded_at = time.time()
+
+
+class DatasetCache:
+    """
+    Общий кэш загруженных листов (RowStore) с LRU-вытеснением по объему памяти.
+
+    Ключ — таблица, набор колонок, условия и флаг архива. При повторном
+    обращении данные перепроверяются дешевым запросом к журналу изменений
+    (Database.table_signature): если закоммиченные данные не изменились, лист
+    заново не загружается.
+
+    Атрибуты:
+        budget_bytes (int): Допустимый объем памяти под данные.
+    """
+    def __init__(self, budget_bytes=CACHE_BUDGET_MB * 1024 * 1024):
+        self.budget_bytes = budget_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self._prefetch_thread = None
+
+    @staticmethod
+    def make_key(table, fields, where=None, include_archive=False):
+        return (table, tuple(fields), tuple(sorted((where or {}).items())), include_archive)
+
+    def total_bytes(self):
+        with self._lock:
+            return sum(entry.nbytes for entry in self._entries.values())
+
+    def get(self, db, table, fields, where=None, include_archive=False, force=False):
+        """
+        Возвращает данные из кэша или загружает их из БД.
+
+        Args:
+            db (Database): Подключенная база данных.
+            table (str): Таблица листа.
+            fields (list): Колонки.
+            where (dict): Условия равенства.
+            include_archive (bool): Включать архивную таблицу.
+            force (bool): Загрузить заново без проверки кэша.
+
+        Returns:
+            RowStore: Данные листа.
+        """
+        key = self.make_key(table, fields, where, include_archive)
+        signature = db.table_signature(self._tables(table, include_archive))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not force and signature is not None and entry.signature == signature:
+                self._entries.move_to_end(key)
+                logger.debug(f"Кэш: {table} без изменений", extra={"table": table})
+                return entry.store
+
+        with log_operation(logger, "cache_load", table=table) as context:
+            if CACHE_LOAD_VIA_COPY:
+                columns = db.copy_columns(table, fields, where=where, include_archive=include_archive)
+                store = RowStore.from_columns(fields, columns)
+            else:
+                rows, _ = db.select_rows(table, fields, where=where, include_archive=include_archive)
+                store = RowStore.from_rows(fields, rows)
+            context["rows"] = len(store)
+        self.put(key, store, signature)
+        return store
+
+    def put(self, key, store, signature):
+        """Кладет данные в кэш и вытесняет давно не использованные листы сверх бюджета."""
+        with self._lock:
+            self._entries[key] = CacheEntry(store, signature)
+            self._entries.move_to_end(key)
+            while len(self._entries) > 1 and self.total_bytes() > self.budget_bytes:
+                evicted, _ = self._entries.popitem(last=False)
+                logger.debug(f"Кэш: вытеснен {evicted[0]}", extra={"table": evicted[0]})
+
+    def invalidate(self, table):
+        """Удаляет из кэша все данные таблицы (после локальных изменений)."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == table]:
+                del self._entries[key]
+
+    def _tables(self, table, include_archive):
+        return [table, archive_table_name(table)] if include_archive else [table]
+
+    def prefetch(self, dsn, sheets=None, delay=2.0):
+        """
+        Загружает листы в фоне отдельным подключением: сначала данные вкладки
+        поиска, затем очереди трейдеров. Останавливается, как только кэш
+        заполнен, чтобы не вытеснять уже загруженные листы.
+
+        Args:
+            dsn (str): Строка подключения.
+            sheets (list): Порядок листов (по умолчанию LIST_TOKEN).
+            delay (float): Пауза перед началом, чтобы не мешать запуску.
+        """
+        if self._prefetch_thread and self._prefetch_thread.is_alive():
+            return
+        sheets = sheets or LIST_TOKEN
+        requests = [(sheet, None) for sheet in sheets] + [(sheet, {"status": STATUS_PENDING}) for sheet in sheets]
+
+        def worker():
+            time.sleep(delay)
+            db = make_database(dsn)
+            try:
+                db.connect()
+                for sheet, where in requests:
+                    table = SHEET_TO_TABLE[sheet]
+                    key = self.make_key(table, sheet_fields(sheet), where)
+                    with self._lock:
+                        if key in self._entries:
+                            continue
+                    before = self.total_bytes()
+                    store = self.get(db, table, sheet_fields(sheet), where=where)
+                    if before + store.nbytes > self.budget_bytes:
+                        break
+            except Exception:
+                logger.exception("Ошибка фоновой загрузки листов")
+            finally:
+                db.close()
+
+        self._prefetch_thread = threading.Thread(target=worker, name="cache-prefetch", daemon=True)
+        self._prefetch_thread.start()
+
+
+shared_cache = DatasetCache()
@@ -1,13 +1,151 @@
 # db.py
+import logging
+import re
+import time
+from decimal import Decimal
 import psycopg2
 from psycopg2 import sql
-from config import ENG_FIELDS, ENG_FIELDS_MEMO
-from logger import logger
+from psycopg2.extensions import encodings
+from psycopg2.extras import execute_values
+from config import (ARCHIVE_SUFFIX, ENG_FIELDS, ENG_FIELDS_MEMO, HISTORY_LIMIT, ITER_SIZE, NUMERIC_FIELDS,
+                    SHEET_TO_TABLE, STATUS_DONE, STATUS_PENDING)
+from logger import get_logger, log_operation
+from query_diagnostics import get_diagnostics
+
+logger = get_logger(__name__)
+
+# Сколько байт COPY накапливать перед разбором очередной пачки строк
+COPY_CHUNK_SIZE = 8 * 1024 * 1024
+COPY_ESCAPES = {"b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t", "v": "\v", "\\": "\\"}
+COPY_ESCAPE_RE = re.compile(r"\\(.)")
+
+
+def archive_table_name(table):
+    """Имя архивной таблицы для основной таблицы листа."""
+    return table + ARCHIVE_SUFFIX
+
+
+def sort_expression(field):
+    """
+    Выражение ORDER BY для поля. Суммы хранятся текстом, поэтому сортируются
+    через refund_amount() — по этому же выражению построены индексы.
+    """
+    if field in NUMERIC_FIELDS:
+        return sql.SQL("refund_amount({})").format(sql.Identifier(field))
+    return sql.Identifier(field)
+
+
+def keyset_condition(order_expr, descending, key, last_id):
+    """
+    Условие keyset-пагинации «после строки (key, last_id)» для порядка
+    ORDER BY выражение ASC NULLS LAST / DESC NULLS FIRST, id.
+
+    Сравнение кортежей не выполняется для NULL, поэтому строки с NULL
+    в ключе сортировки обрабатываются отдельной веткой.
+
+    Returns:
+        tuple: (sql.Composable условие, список параметров)
+    """
+    comparison = sql.SQL("<") if descending else sql.SQL(">")
+    if isinstance(key, Decimal) and not key.is_finite():
+        # psycopg2 передает любое бесконечное Decimal как 'NaN'::numeric
+        key = str(key)
+    if key is None:
+        # Курсор внутри группы NULL: дальше идут строки этой группы с большим
+        # (меньшим) id, а при DESC — еще и все строки с ключом
+        condition = sql.SQL("({0} IS NULL AND id {1} %s)").format(order_expr, comparison)
+        if descending:
+            condition = sql.SQL("({} OR {} IS NOT NULL)").format(condition, order_expr)
+        return condition, [last_id]
+    condition = sql.SQL("({}, id) {} (%s, %s)").format(order_expr, comparison)
+    if not descending:
+        # При ASC группа NULL идет после всех строк с ключом
+        condition = sql.SQL("({} OR {} IS NULL)").format(condition, order_expr)
+    return condition, [key, last_id]
+
+
+def select_source(table, fields, include_archive=False):
+    """
+    Источник FROM для выборки: таблица листа или объединение с архивной
+    таблицей (только с нужными колонками).
+    """
+    if not include_archive:
+        return sql.Identifier(table)
+    source_list = sql.SQL(', ').join(map(sql.Identifier, fields))
+    return sql.SQL("(SELECT {0} FROM {1} UNION ALL SELECT {0} FROM {2}) AS {1}").format(
+        source_list, sql.Identifier(table), sql.Identifier(archive_table_name(table))
+    )
+
+
+class CopyColumnSink:
+    """
+    Приемник для COPY ... TO STDOUT (текстовый формат), раскладывающий данные
+    сразу по колонкам.
+
+    psycopg2 передает в write строки COPY; они копятся в буфере и разбираются
+    пачками по chunk_size байт: переводы строк заменяются табуляцией, пачка
+    делится split и колонка j берется срезом cells[j::k] — без кортежа
+    на каждую строку. NULL (\\N) заменяется пустой строкой на уровне всей
+    пачки; экранирование COPY (\\t, \\n, \\\\ ...) снимается только у значений
+    с обратной косой чертой.
+
+    Атрибуты:
+        fields (list): Колонки в порядке SELECT.
+        columns (dict): Поле -> список значений.
+    """
+    def __init__(self, fields, encoding="utf-8", chunk_size=COPY_CHUNK_SIZE):
+        self.fields = list(fields)
+        self.columns = {field: [] for field in self.fields}
+        self.encoding = encoding
+        self.chunk_size = chunk_size
+        self._parts = []
+        self._buffered = 0
+
+    def write(self, data):
+        self._parts.append(data)
+        self._buffered += len(data)
+        if self._buffered >= self.chunk_size:
+            self._flush(final=False)
+
+    def finish(self):
+        """Разбирает остаток буфера и возвращает колонки."""
+        self._flush(final=True)
+        return self.columns
+
+    def _flush(self, final):
+        data = b"".join(self._parts)
+        end = len(data) if final else data.rfind(b"\n") + 1
+        rest = data[end:]
+        self._parts = [rest] if rest else []
+        self._buffered = len(rest)
+        if end:
+            self._parse(data[:end])
+
+    @staticmethod
+    def _unescape(value):
+        return COPY_ESCAPE_RE.sub(lambda m: COPY_ESCAPES.get(m.group(1), m.group(1)), value)
+
+    def _parse(self, data):
+        # Замены делаются до декодирования: на байтах они быстрее, чем на не-ASCII str.
+        # Значение не может начинаться с \N, кроме NULL: обратная косая черта в данных удваивается
+        flat = (b"\t" + data[:-1].replace(b"\n", b"\t")).replace(b"\t\\N", b"\t")
+        escaped = b"\\" in flat
+        cells = flat[1:].decode(self.encoding).split("\t")
+        k = len(self.fields)
+        if len(cells) % k:
+            raise ValueError(f"COPY: {len(cells)} значений не делится на {k} колонок")
+        for j, field in enumerate(self.fields):
+            column = cells[j::k]
+            if escaped:
+                column = [self._unescape(v) if "\\" in v else v for v in column]
+            self.columns[field].extend(column)
+
 
 class Database:
     def __init__(self, dsn):
         self.dsn = dsn
         self.conn = None
+        self.diagnostics = get_diagnostics(dsn)
 
     def connect(self):
         try:
@@ -20,6 +158,19 @@ class Database:
     def is_connected(self):
         return self.conn and self.conn.closed == 0
 
+    def execute(self, cur, query, params=None, table=None):
+        """
+        Выполняет запрос на курсоре; в режиме диагностики замеряет время
+        и передает медленные запросы в QueryDiagnostics.
+        """
+        if self.diagnostics is None:
+            cur.execute(query, params)
+            return
+        start = time.perf_counter()
+        cur.execute(query, params)
+        duration_ms = (time.perf_counter() - start) * 1000
+        self.diagnostics.observe(self.conn, query, params, table, round(duration_ms, 2))
+
     def insert_support_data(self, table, data):
         if table in ['support_data_ton', 'support_data_usdt_(ton)']:
             columns = ENG_FIELDS_MEMO
@@ -35,37 +186,524 @@ class Database:
             sql.SQL(', ').join(placeholders)
         )
         try:
+            with log_operation(logger, "insert", table=table):
+                with self.conn.cursor() as cur:
+                    self.execute(cur, query, list(data.values()), table)
+                self.conn.commit()
+            logger.info(f"Данные успешно добавлены {table}", extra={"table": table})
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    def insert_support_batch(self, items):
+        """
+        Вставляет пачку заявок одной транзакцией.
+        Повторная вставка заявки с тем же request_key игнорируется.
+
+        Args:
+            items (list): Кортежи (таблица, ключ идемпотентности, данные формы).
+        """
+        by_table = {}
+        for table, request_key, data in items:
+            by_table.setdefault(table, []).append(list(data.values()) + [request_key])
+        try:
+            with log_operation(logger, "insert_batch", level=logging.INFO, rows=len(items)):
+                with self.conn.cursor() as cur:
+                    for table, rows in by_table.items():
+                        columns = ENG_FIELDS_MEMO if table in ['support_data_ton', 'support_data_usdt_(ton)'] else ENG_FIELDS
+                        query = sql.SQL("INSERT INTO {} ({}) VALUES %s ON CONFLICT (request_key) DO NOTHING").format(
+                            sql.Identifier(table),
+                            sql.SQL(', ').join(sql.Identifier(col) for col in list(columns) + ["request_key"])
+                        )
+                        execute_values(cur, query, rows, page_size=len(rows))
+                self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    def select_rows(self, table, fields, where=None, order_by="id", descending=False, after=None, limit=None,
+                    include_archive=False):
+        """
+        Выбирает строки таблицы с сортировкой и keyset-пагинацией.
+
+        Args:
+            table (str): Имя таблицы.
+            fields (list): Выбираемые поля.
+            where (dict): Поле -> значение для условий равенства.
+            order_by (str): Поле сортировки.
+            descending (bool): Сортировка по убыванию.
+            after (tuple): Курсор (ключ сортировки, id) последней строки предыдущей страницы.
+            limit (int): Размер страницы.
+            include_archive (bool): Искать также в архивной таблице.
+
+        Returns:
+            tuple: (список строк, курсор для следующей страницы или None)
+        """
+        order_expr = sort_expression(order_by)
+        # NULL (неразобранные суммы и даты) — в конце при ASC и в начале при DESC,
+        # как при прямом и обратном просмотре индекса (выражение, id)
+        direction = sql.SQL("DESC NULLS FIRST") if descending else sql.SQL("ASC NULLS LAST")
+        conditions = [sql.SQL("{} = %s").format(sql.Identifier(k)) for k in (where or {})]
+        params = list((where or {}).values())
+        if after is not None:
+            condition, after_params = keyset_condition(order_expr, descending, *after)
+            conditions.append(condition)
+            params.extend(after_params)
+        source_fields = list(dict.fromkeys(list(fields) + list(where or {}) + [order_by, "id"]))
+        source = select_source(table, source_fields, include_archive)
+        query = sql.SQL("SELECT {}, {} FROM {}").format(
+            sql.SQL(', ').join(map(sql.Identifier, fields)),
+            order_expr,
+            source
+        )
+        if conditions:
+            query += sql.SQL(" WHERE ") + sql.SQL(" AND ").join(conditions)
+        query += sql.SQL(" ORDER BY {} {}, id {}").format(
+            order_expr, direction, sql.SQL("DESC") if descending else sql.SQL("ASC")
+        )
+        if limit is not None:
+            query += sql.SQL(" LIMIT %s")
+            params.append(limit)
+
+        with log_operation(logger, "select", table=table) as context:
+            with self.conn.cursor() as cur:
+                self.execute(cur, query, params, table)
+                rows = cur.fetchall()
+            self.conn.commit()
+            context["rows"] = len(rows)
+        cursor = None
+        if rows and limit is not None and len(rows) == limit:
+            last = rows[-1]
+            cursor = (last[-1], last[fields.index("id")]) if "id" in fields else None
+        return [row[:-1] for row in rows], cursor
+
+    def iter_rows(self, table, fields, where=None, itersize=ITER_SIZE):
+        """
+        Построчно перебирает строки таблицы в порядке id через серверный
+        (именованный) курсор: в памяти клиента одновременно не больше itersize
+        строк, в отличие от select_rows с fetchall. Транзакция завершается,
+        когда перебор закончен или прерван.
+
+        Args:
+            table (str): Имя таблицы.
+            fields (list): Выбираемые поля.
+            where (dict): Поле -> значение для условий равенства.
+            itersize (int): Строк за один запрос к серверу.
+
+        Yields:
+            tuple: Строка в порядке fields.
+        """
+        query = sql.SQL("SELECT {} FROM {}").format(
+            sql.SQL(', ').join(map(sql.Identifier, fields)), sql.Identifier(table)
+        )
+        if where:
+            query += sql.SQL(" WHERE ") + sql.SQL(" AND ").join(
+                sql.SQL("{} = %s").format(sql.Identifier(k)) for k in where
+            )
+        query += sql.SQL(" ORDER BY id")
+        try:
+            with log_operation(logger, "iter_rows", table=table) as context:
+                with self.conn.cursor(name=f"iter_{table}") as cur:
+                    cur.itersize = itersize
+                    self.execute(cur, query, list((where or {}).values()), table)
+                    count = 0
+                    for row in cur:
+                        count += 1
+                        yield row
+                context["rows"] = count
+            self.conn.commit()
+        except BaseException:
+            if not self.conn.closed:
+                self.conn.rollback()
+            raise
+
+    def copy_columns(self, table, fields, where=None, include_archive=False, chunk_size=COPY_CHUNK_SIZE):
+        """
+        Читает таблицу целиком через COPY (SELECT ...) TO STDOUT и разбирает
+        поток сразу в колонки (CopyColumnSink), минуя построчные кортежи
+        fetchall. Путь для полной загрузки листа: кэш, поиск в памяти, выгрузка.
+
+        Args:
+            table (str): Имя таблицы.
+            fields (list): Выбираемые поля.
+            where (dict): Поле -> значение для условий равенства.
+            include_archive (bool): Включать архивную таблицу.
+            chunk_size (int): Размер пачки разбора, байт.
+
+        Returns:
+            dict: Поле -> список строк в порядке id (NULL -> пустая строка).
+        """
+        source_fields = list(dict.fromkeys(list(fields) + list(where or {}) + ["id"]))
+        query = sql.SQL("SELECT {} FROM {}").format(
+            sql.SQL(', ').join(map(sql.Identifier, fields)),
+            select_source(table, source_fields, include_archive)
+        )
+        if where:
+            query += sql.SQL(" WHERE ") + sql.SQL(" AND ").join(
+                sql.SQL("{} = %s").format(sql.Identifier(k)) for k in where
+            )
+        query += sql.SQL(" ORDER BY id")
+
+        encoding = encodings.get(self.conn.encoding, "utf-8")
+        sink = CopyColumnSink(fields, encoding, chunk_size)
+        with log_operation(logger, "copy", table=table) as context:
+            with self.conn.cursor() as cur:
+                # COPY не принимает параметры, поэтому значения подставляются mogrify
+                params = list((where or {}).values())
+                select = cur.mogrify(query, params).decode(encoding)
+                copy = sql.SQL("COPY ({}) TO STDOUT").format(sql.SQL(select))
+                start = time.perf_counter()
+                cur.copy_expert(copy, sink, size=1024 * 1024)
+                if self.diagnostics is not None:
+                    # В диагностику — исходный запрос с параметрами: в подставленных
+                    # значениях может быть %, который сломал бы повторное форматирование
+                    duration_ms = round((time.perf_counter() - start) * 1000, 2)
+                    self.diagnostics.observe(self.conn, query, params, table, duration_ms)
+            self.conn.commit()
+            columns = sink.finish()
+            context["rows"] = len(columns[fields[0]]) if fields else 0
+        return columns
+
+    def search_rows(self, table, fields, text, limit=1000, include_archive=False):
+        """
+        Ищет строки, в которых любое из полей содержит text (без учета регистра).
+
+        Returns:
+            list: Найденные строки (не более limit), новые первыми.
+        """
+        columns = sql.SQL(', ').join(map(sql.Identifier, fields))
+        source = sql.Identifier(table)
+        if include_archive:
+            source = sql.SQL("(SELECT {0} FROM {1} UNION ALL SELECT {0} FROM {2}) AS {1}").format(
+                columns, sql.Identifier(table), sql.Identifier(archive_table_name(table))
+            )
+        query = sql.SQL("SELECT {} FROM {} WHERE concat_ws(' ', {}) ILIKE %s ORDER BY id DESC LIMIT %s").format(
+            columns, source, sql.SQL(', ').join(sql.SQL("{}::text").format(sql.Identifier(f)) for f in fields)
+        )
+        pattern = "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        with log_operation(logger, "search", table=table) as context:
             with self.conn.cursor() as cur:
-                cur.execute(query, list(data.values()))
+                self.execute(cur, query, (pattern, limit), table)
+                rows = cur.fetchall()
             self.conn.commit()
-            logger.info(f"Данные успешно добавлены {table}")
+            context["rows"] = len(rows)
+        return rows
+
+    def customer_history(self, fields, user_id=None, addresses=(), include_archive=False, limit=HISTORY_LIMIT):
+        """
+        Заявки клиента по всем листам одним запросом (UNION ALL по таблицам):
+        совпадение по user_id или по адресу отправителя/возврата.
+        Каждая ветка использует индексы по user_id, sender_address и return_address.
+
+        Args:
+            fields (list): Колонки.
+            user_id (str): ID клиента.
+            addresses (iterable): Адреса, которые ищутся в обеих колонках адресов.
+            include_archive (bool): Искать и в архивных таблицах.
+            limit (int): Максимум строк.
+
+        Returns:
+            list: Строки (лист, *fields), новые первыми.
+        """
+        addresses = sorted({a for a in addresses if a})
+        conditions, params = [], []
+        if user_id:
+            conditions.append(sql.SQL("user_id = %s"))
+            params.append(user_id)
+        if addresses:
+            conditions.append(sql.SQL("sender_address = ANY(%s) OR return_address = ANY(%s)"))
+            params.extend([addresses, addresses])
+        if not conditions:
+            return []
+        where = sql.SQL(" OR ").join(conditions)
+        columns = sql.SQL(', ').join(map(sql.Identifier, fields))
+
+        branches, branch_params = [], []
+        for sheet, table in SHEET_TO_TABLE.items():
+            tables = [table, archive_table_name(table)] if include_archive else [table]
+            for name in tables:
+                branches.append(sql.SQL("SELECT {}, {}, refund_date(date) AS created FROM {} WHERE {}").format(
+                    sql.Literal(sheet), columns, sql.Identifier(name), where
+                ))
+                branch_params.extend(params)
+        query = sql.SQL("{} ORDER BY created DESC NULLS LAST, id DESC LIMIT %s").format(
+            sql.SQL(" UNION ALL ").join(branches)
+        )
+        with log_operation(logger, "customer_history") as context:
+            with self.conn.cursor() as cur:
+                self.execute(cur, query, branch_params + [limit])
+                rows = cur.fetchall()
+            self.conn.commit()
+            context["rows"] = len(rows)
+        return [row[:-1] for row in rows]
+
+    def apply_refunds(self, updates, operator=None):
+        """
+        Отмечает возвраты сделанными одной транзакцией: записывает хэш возврата,
+        "+" и статус и снимает закрепление за трейдером. Уже закрытые записи
+        не трогает.
+
+        Args:
+            updates (list): Кортежи (таблица, id, хэш возврата).
+            operator (str): Если задан, не трогает записи, закрепленные
+                за другим трейдером (действующая аренда).
+
+        Returns:
+            int: Количество обновленных записей.
+        """
+        by_table = {}
+        for table, record_id, return_hash in updates:
+            by_table.setdefault(table, []).append((int(record_id), return_hash))
+        updated = 0
+        try:
+            with log_operation(logger, "apply_refunds", level=logging.INFO, rows=len(updates)):
+                with self.conn.cursor() as cur:
+                    for table, rows in by_table.items():
+                        query = sql.SQL(
+                            "UPDATE {} AS t SET return_hash = v.return_hash, return_done = '+', status = {}, "
+                            "claimed_by = NULL, claimed_until = NULL "
+                            "FROM (VALUES %s) AS v(id, return_hash) WHERE t.id = v.id AND t.status = {}"
+                        ).format(sql.Identifier(table), sql.Literal(STATUS_DONE), sql.Literal(STATUS_PENDING))
+                        if operator is not None:
+                            query += sql.SQL(
+                                " AND (t.claimed_until IS NULL OR t.claimed_until <= now() OR t.claimed_by = {})"
+                            ).format(sql.Literal(operator))
+                        execute_values(cur, query, rows, page_size=len(rows))
+                        updated += cur.rowcount
+                self.conn.commit()
         except Exception:
             self.conn.rollback()
-            logger.exception("Failed to insert data")
             raise
+        return updated
+
+    def table_signature(self, tables):
+        """
+        Дешевая «версия» закоммиченных данных таблиц: число видимых строк
+        журнала table_changes по каждой таблице и их max(id). Журнал пополняется
+        триггером на каждую изменяющую команду, поэтому число строк растет при
+        коммите любой вставки, изменения или удаления, в каком бы порядке ни
+        коммитились транзакции. Читается по индексу (table_name, id).
+        Используется для проверки кэша.
 
-    def update_record(self, table_name, record_id, updated_data):
-        """Обновляет запись по id."""
+        Returns:
+            tuple | None: Значения по таблицам или None, если запрос не удался.
+        """
+        query = ("SELECT table_name, count(*), max(id) FROM table_changes "
+                 "WHERE table_name = ANY(%s) GROUP BY table_name ORDER BY table_name")
+        try:
+            with self.conn.cursor() as cur:
+                cur.execute(query, (sorted(tables),))
+                rows = cur.fetchall()
+            self.conn.commit()
+        except psycopg2.Error:
+            self.conn.rollback()
+            logger.exception("Не удалось получить версию таблиц")
+            return None
+        return tuple(rows)
+
+    def update_record(self, table_name, record_id, updated_data, claimed_by=None, raise_errors=False,
+                      include_archive=False, operator=None):
+        """
+        Обновляет запись по id.
+
+        Args:
+            claimed_by (str): Если задан, запись обновляется только пока она
+                закреплена за этим трейдером (действующая аренда).
+            operator (str): Если задан, запись, закрепленная за другим трейдером
+                (действующая аренда), не обновляется.
+            raise_errors (bool): Пробрасывать ошибки БД вместо возврата False.
+            include_archive (bool): Если записи нет в таблице листа, обновить ее в архивной.
+
+        Returns:
+            bool: True, если запись обновлена.
+        """
         if not table_name:
             return False
         set_clauses = [sql.SQL("{} = %s").format(sql.Identifier(k)) for k in updated_data.keys()]
-        query = sql.SQL("UPDATE {} SET {} WHERE id=%s").format(
-            sql.Identifier(table_name),
-            sql.SQL(', ').join(set_clauses)
-        )
         values = list(updated_data.values()) + [record_id]
-        with self.conn.cursor() as conn:
-            if not conn:
-                return False
-            try:
-                with conn.cursor() as cur:
-                    cur.execute(query, values)
-                    conn.commit()
-                    logger.info(f"Запись id={record_id} обновлена.")
-                    return True
-            except psycopg2.Error as e:
-                logger.error(f"Ошибка при обновлении записи {record_id}: {e}")
+        condition = sql.SQL("id=%s")
+        lease_condition, lease_values = sql.SQL(""), []
+        if claimed_by is not None:
+            lease_condition += sql.SQL(" AND claimed_by = %s AND claimed_until > now()")
+            lease_values.append(claimed_by)
+        if operator is not None:
+            lease_condition += sql.SQL(" AND (claimed_until IS NULL OR claimed_until <= now() OR claimed_by = %s)")
+            lease_values.append(operator)
+        if not self.conn:
+            return False
+        # Аренда действует только в таблице листа: в архиве лежат сделанные
+        # возвраты, и колонок аренды там может не быть
+        targets = [(table_name, condition + lease_condition, values + lease_values)]
+        if include_archive:
+            targets.append((archive_table_name(table_name), condition, values))
+        try:
+            with log_operation(logger, "update", table=table_name, record_id=record_id):
+                with self.conn.cursor() as cur:
+                    # id не повторяются между таблицей листа и архивом: строки переносятся с id
+                    for target, target_condition, target_values in targets:
+                        query = sql.SQL("UPDATE {} SET {} WHERE {}").format(
+                            sql.Identifier(target), sql.SQL(', ').join(set_clauses), target_condition
+                        )
+                        self.execute(cur, query, target_values, target)
+                        updated = cur.rowcount
+                        if updated:
+                            break
+                self.conn.commit()
+            if not updated:
+                logger.warning(f"Запись id={record_id} не обновлена: нет записи или аренды",
+                               extra={"table": table_name, "record_id": record_id})
                 return False
+            logger.info(f"Запись id={record_id} обновлена.", extra={"table": target, "record_id": record_id})
+            return True
+        except psycopg2.Error as e:
+            self.conn.rollback()
+            logger.error(f"Ошибка при обновлении записи {record_id}: {e}")
+            if raise_errors:
+                raise
+            return False
+
+    def delete_record(self, table_name, record_id, include_archive=False):
+        """
+        Удаляет запись по id (при include_archive — также из архивной таблицы).
+
+        Returns:
+            bool: True, если запись удалена.
+        """
+        targets = [table_name, archive_table_name(table_name)] if include_archive else [table_name]
+        try:
+            with log_operation(logger, "delete", level=logging.INFO, table=table_name, record_id=record_id):
+                with self.conn.cursor() as cur:
+                    for target in targets:
+                        query = sql.SQL("DELETE FROM {} WHERE id=%s").format(sql.Identifier(target))
+                        self.execute(cur, query, (record_id,), target)
+                        if cur.rowcount:
+                            break
+                    deleted = cur.rowcount
+                self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return bool(deleted)
+
+    def priority_pending(self, table, fields, limit, after=None, ids=None):
+        """
+        Первые limit невыполненных возвратов по убыванию приоритета.
+
+        Ключ refund_priority(date, receipt_amount) не зависит от текущей даты,
+        поэтому по нему построен частичный индекс (WHERE status = невыполнен)
+        и выборка первых строк — это просмотр индекса без сортировки всей очереди.
+
+        Args:
+            after (tuple): Курсор (ключ, id) последней уже загруженной заявки —
+                выбираются следующие за ней (догрузка очереди).
+            ids (list): Выбрать только эти заявки (новый ключ измененной строки).
+
+        Returns:
+            tuple: (список строк, список ключей приоритета)
+        """
+        priority = sql.SQL("refund_priority(date, receipt_amount)")
+        conditions = [sql.SQL("status = %s")]
+        params = [STATUS_PENDING]
+        if after is not None:
+            key, last_id = after
+            # Порядок: ключ DESC NULLS LAST, id ASC
+            if key is None:
+                conditions.append(sql.SQL("({0} IS NULL AND id > %s)").format(priority))
+                params.append(last_id)
+            else:
+                conditions.append(sql.SQL("({0} < %s OR ({0} = %s AND id > %s) OR {0} IS NULL)").format(priority))
+                params.extend([key, key, last_id])
+        if ids is not None:
+            conditions.append(sql.SQL("id = ANY(%s)"))
+            params.append(list(ids))
+        query = sql.SQL(
+            "SELECT {}, {} FROM {} WHERE {} ORDER BY {} DESC NULLS LAST, id LIMIT %s"
+        ).format(
+            sql.SQL(', ').join(map(sql.Identifier, fields)), priority, sql.Identifier(table),
+            sql.SQL(" AND ").join(conditions), priority
+        )
+        params.append(limit)
+        with log_operation(logger, "priority", table=table) as context:
+            with self.conn.cursor() as cur:
+                self.execute(cur, query, params, table)
+                rows = cur.fetchall()
+            self.conn.commit()
+            context["rows"] = len(rows)
+        return [row[:-1] for row in rows], [row[-1] for row in rows]
+
+    def claim_pending(self, table, fields, operator, count, lease_minutes):
+        """
+        Атомарно закрепляет за трейдером следующие count невыполненных возвратов.
+
+        Строки, заблокированные другими трейдерами в этот момент, пропускаются
+        (FOR UPDATE SKIP LOCKED), поэтому одновременные запросы получают разные
+        строки. Просроченная аренда считается свободной.
+
+        Returns:
+            list: Закрепленные строки (поля fields).
+        """
+        query = sql.SQL("""
+            WITH picked AS (
+                SELECT id FROM {table}
+                WHERE status = %s AND (claimed_until IS NULL OR claimed_until < now())
+                ORDER BY id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            UPDATE {table} AS t
+            SET claimed_by = %s, claimed_until = now() + make_interval(mins => %s)
+            FROM picked WHERE t.id = picked.id
+            RETURNING {fields}
+        """).format(
+            table=sql.Identifier(table),
+            fields=sql.SQL(', ').join(sql.Identifier("t", f) for f in fields)
+        )
+        try:
+            with log_operation(logger, "claim", level=logging.INFO, table=table) as context:
+                with self.conn.cursor() as cur:
+                    self.execute(cur, query, (STATUS_PENDING, count, operator, lease_minutes), table)
+                    rows = cur.fetchall()
+                self.conn.commit()
+                context["rows"] = len(rows)
+        except Exception:
+            self.conn.rollback()
+            raise
+        return sorted(rows, key=lambda row: row[fields.index("id")]) if "id" in fields else rows
+
+    def claimed_rows(self, table, fields, operator):
+        """Невыполненные возвраты с действующей арендой трейдера."""
+        query = sql.SQL(
+            "SELECT {} FROM {} WHERE status = %s AND claimed_by = %s AND claimed_until > now() ORDER BY id"
+        ).format(sql.SQL(', ').join(map(sql.Identifier, fields)), sql.Identifier(table))
+        with self.conn.cursor() as cur:
+            self.execute(cur, query, (STATUS_PENDING, operator), table)
+            rows = cur.fetchall()
+        self.conn.commit()
+        return rows
+
+    def release_claims(self, table, operator=None):
+        """
+        Снимает аренду: трейдера (если задан operator) или все просроченные.
+
+        Returns:
+            int: Количество освобожденных строк.
+        """
+        if operator is not None:
+            condition, params = sql.SQL("claimed_by = %s"), (operator,)
+        else:
+            condition, params = sql.SQL("claimed_until < now()"), ()
+        query = sql.SQL("UPDATE {} SET claimed_by = NULL, claimed_until = NULL WHERE {}").format(
+            sql.Identifier(table), condition
+        )
+        try:
+            with self.conn.cursor() as cur:
+                self.execute(cur, query, params, table)
+                released = cur.rowcount
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return released
 
     def close(self):
         if self.conn:
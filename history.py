@@ -0,0 +1,178 @@
+# history.py
+import threading
+import time
+import tkinter as tk
+from decimal import Decimal
+from tkinter import ttk, messagebox
+
+from config import FIELDS_TS_ENG, FIELDS_TS_RU, HISTORY_CACHE_TTL, STATUS_PENDING, TOKEN_MAPPING
+from logger import get_logger
+from reconcile import parse_amount
+
+logger = get_logger(__name__)
+
+HISTORY_FIELDS = ["id", "date", "user_id", "token", "receipt_amount", "sender_address",
+                  "return_address", "return_hash", "return_reason", "status"]
+FIELD_TITLES = dict(zip(FIELDS_TS_ENG, FIELDS_TS_RU))
+
+
+def history_keys(record):
+    """
+    Ключи поиска истории по записи (словарю полей таблицы).
+
+    Returns:
+        tuple: (user_id, кортеж адресов)
+    """
+    addresses = tuple(a for a in ((record.get(f) or "").strip() for f in ("sender_address", "return_address")) if a)
+    return (record.get("user_id") or "").strip(), addresses
+
+
+def summarize_history(rows):
+    """
+    Сводка по листам: число заявок, невыполненных, сумма поступлений
+    и последний статус (строки упорядочены от новых к старым).
+
+    Returns:
+        list: Словари sheet/count/pending/total/last_status/last_date; последняя строка — итог.
+            Суммы листов в разных токенах, поэтому в итоге total = None.
+    """
+    status_pos = HISTORY_FIELDS.index("status") + 1
+    amount_pos = HISTORY_FIELDS.index("receipt_amount") + 1
+    date_pos = HISTORY_FIELDS.index("date") + 1
+    summary = {}
+    for row in rows:
+        sheet = row[0]
+        if sheet not in summary:
+            summary[sheet] = {"sheet": sheet, "count": 0, "pending": 0, "total": Decimal(0),
+                              "last_status": row[status_pos], "last_date": row[date_pos]}
+        item = summary[sheet]
+        item["count"] += 1
+        item["pending"] += row[status_pos] == STATUS_PENDING
+        item["total"] += parse_amount(row[amount_pos]) or 0
+    result = list(summary.values())
+    result.append({
+        "sheet": "Всего",
+        "count": sum(i["count"] for i in result),
+        "pending": sum(i["pending"] for i in result),
+        "total": None,
+        "last_status": rows[0][status_pos] if rows else "",
+        "last_date": rows[0][date_pos] if rows else "",
+    })
+    return result
+
+
+class HistoryCache:
+    """
+    Кэш результатов истории с коротким временем жизни: повторное открытие
+    панели для того же клиента, пока оператор заполняет форму, не идет в БД.
+    """
+    def __init__(self, ttl=HISTORY_CACHE_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, db, user_id, addresses, include_archive=False, force=False):
+        key = (user_id, tuple(sorted(addresses)), include_archive)
+        now = time.monotonic()
+        with self._lock:
+            # Попутно выбрасываем устаревшие записи, чтобы кэш не рос
+            for stale in [k for k, (expires, _) in self._entries.items() if expires <= now]:
+                del self._entries[stale]
+            entry = self._entries.get(key)
+        if entry is not None and not force:
+            return entry[1]
+        rows = db.customer_history(HISTORY_FIELDS, user_id, addresses, include_archive)
+        with self._lock:
+            self._entries[key] = (now + self.ttl, rows)
+        return rows
+
+
+history_cache = HistoryCache()
+
+
+class CustomerHistoryWindow:
+    """
+    Панель истории клиента: все заявки по ID клиента и адресам на всех листах,
+    сводка по листам (количество, суммы, последний статус) и список заявок.
+
+    Атрибуты:
+        db (Database): Объект базы данных.
+        user_id (str): ID клиента.
+        addresses (tuple): Адреса отправителя/возврата.
+        rows (list): Найденные заявки (лист, *HISTORY_FIELDS).
+    """
+    def __init__(self, parent, db, user_id="", addresses=(), cache=None):
+        """
+        Args:
+            parent (tk.Widget): Родительский виджет.
+            db (Database): Объект базы данных.
+            user_id (str): ID клиента.
+            addresses (iterable): Адреса для поиска.
+            cache (HistoryCache): Кэш результатов (по умолчанию общий).
+        """
+        self.db = db
+        self.user_id = user_id
+        self.addresses = tuple(addresses)
+        self.cache = cache or history_cache
+        self.rows = []
+
+        self.window = tk.Toplevel(parent)
+        self.window.title("История клиента")
+        self.window.geometry("1200x600")
+
+        top_frame = ttk.Frame(self.window)
+        top_frame.pack(fill='x', padx=10, pady=5)
+        keys = [f"ID: {user_id}"] if user_id else []
+        keys += [f"адрес: {a}" for a in self.addresses]
+        ttk.Label(top_frame, text="; ".join(keys)).pack(side='left', padx=5)
+        self.include_archive_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(top_frame, text="Включая архив", variable=self.include_archive_var,
+                        command=self.load).pack(side='left', padx=10)
+        ttk.Button(top_frame, text="Обновить", command=lambda: self.load(force=True)).pack(side='left', padx=5)
+
+        summary_columns = ["Лист", "Заявок", "Не сделано", "Сумма поступлений", "Последний статус", "Дата"]
+        self.summary_tree = ttk.Treeview(self.window, columns=summary_columns, show='headings', height=10)
+        for col in summary_columns:
+            self.summary_tree.heading(col, text=col)
+            self.summary_tree.column(col, width=150)
+        self.summary_tree.tag_configure('total', font=('TkDefaultFont', 9, 'bold'))
+        self.summary_tree.pack(fill='x', padx=10, pady=5)
+
+        columns = ["Лист"] + [FIELD_TITLES[f] for f in HISTORY_FIELDS]
+        self.tree = ttk.Treeview(self.window, columns=columns, show='headings')
+        for col in columns:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=110)
+        self.tree.tag_configure('pending', background='#fff3cd')
+        self.tree.pack(fill='both', expand=True, padx=10, pady=5)
+
+        self.load()
+
+    def load(self, force=False):
+        """Загружает историю (из кэша, если она запрашивалась недавно) и заполняет таблицы."""
+        if not self.user_id and not self.addresses:
+            messagebox.showwarning("История клиента", "Нет ID клиента и адресов для поиска", parent=self.window)
+            return
+        try:
+            if not self.db.is_connected():
+                self.db.connect()
+            self.rows = self.cache.get(self.db, self.user_id, self.addresses,
+                                       self.include_archive_var.get(), force=force)
+        except Exception as e:
+            messagebox.showerror("Ошибка", str(e), parent=self.window)
+            logger.exception("Ошибка загрузки истории клиента")
+            return
+
+        self.summary_tree.delete(*self.summary_tree.get_children())
+        for item in summarize_history(self.rows):
+            self.summary_tree.insert('', 'end', values=[
+                item["sheet"], item["count"], item["pending"],
+                "" if item["total"] is None else f"{item['total']:f} {TOKEN_MAPPING.get(item['sheet'], '')}".rstrip(),
+                item["last_status"], item["last_date"]
+            ], tags=('total',) if item["sheet"] == "Всего" else ())
+
+        status_pos = HISTORY_FIELDS.index("status") + 1
+        self.tree.delete(*self.tree.get_children())
+        for row in self.rows:
+            self.tree.insert('', 'end', values=["" if v is None else v for v in row],
+                             tags=('pending',) if row[status_pos] == STATUS_PENDING else ())
@@ -0,0 +1,332 @@
+# loadtest.py
+"""
+Нагрузочный тест: N операторов одновременно работают с одной БД через db.Database.
+
+Каждый оператор — отдельный поток со своим подключением, как отдельный
+клиент приложения. Операции выбираются случайно по весам:
+    insert  — insert_support_data (форма саппорта)
+    pending — загрузка невыполненных возвратов (вкладка трейдеров)
+    search  — загрузка всего листа в кэш, как во вкладке поиска (DatasetCache.get)
+    update  — отметка возврата сделанным (update_record)
+
+Запуск (только против локальной/тестовой БД, схема из create_table.txt):
+    python loadtest.py --dsn "dbname=test user=... host=localhost" \\
+        --operators 30 --duration 60 --mix insert=4,pending=3,search=2,update=1 --seed-rows 10000
+"""
+import argparse
+import getpass
+import ipaddress
+import json
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+
+from psycopg2 import errors
+from psycopg2.extensions import parse_dsn
+
+from batch_entry import build_record, input_columns
+from config import CONN_DB, SHEET_TO_TABLE, STATUS_DONE, STATUS_PENDING
+from dataset_cache import DatasetCache, sheet_fields
+from db import Database
+from logger import logger as app_logger
+
+DEFAULT_MIX = "insert=4,pending=3,search=2,update=1"
+OPERATIONS = ("insert", "pending", "search", "update")
+
+
+def dsn_targets(dsn):
+    """
+    Множество (база, сервер, порт), к которым ведет строка подключения, с
+    умолчаниями libpq (PGHOST/PGPORT/PGDATABASE, порт 5432, база = пользователь).
+    Локальные адреса и каталоги сокетов сводятся к «local», имена серверов —
+    к их IP-адресам.
+    """
+    params = parse_dsn(dsn)
+    user = params.get("user") or os.environ.get("PGUSER") or getpass.getuser()
+    dbname = params.get("dbname") or os.environ.get("PGDATABASE") or user
+    hosts = (params.get("hostaddr") or params.get("host") or os.environ.get("PGHOST") or "").split(",")
+    ports = (params.get("port") or os.environ.get("PGPORT") or "").split(",")
+    targets = set()
+    for i, host in enumerate(hosts):
+        port = (ports[i] if i < len(ports) else ports[0]).strip() or "5432"
+        for address in host_addresses(host.strip()):
+            targets.add((dbname, address, port))
+    return targets
+
+
+def host_addresses(host):
+    """Адреса сервера для сравнения: «local» для локальных, иначе IP (или имя, если не разрешается)."""
+    if not host or host.startswith("/") or host.lower() == "localhost":
+        return {"local"}
+    try:
+        addresses = {info[4][0].split("%")[0] for info in socket.getaddrinfo(host, None)}
+    except OSError:
+        return {host.lower()}
+    return {"local" if ipaddress.ip_address(address).is_loopback else address for address in addresses}
+
+
+def nonproduction_dsn(value):
+    """
+    Тип аргумента --dsn: строка подключения к тестовой БД. Отклоняет рабочую
+    базу из config.CONN_DB (та же база на том же сервере и порту после
+    подстановки умолчаний), так как тест изменяет и добавляет заявки.
+    """
+    try:
+        target = dsn_targets(value)
+    except Exception as e:
+        raise argparse.ArgumentTypeError(f"некорректная строка подключения: {e}")
+    if target & dsn_targets(CONN_DB):
+        raise argparse.ArgumentTypeError("это рабочая БД из config.CONN_DB; укажите тестовую базу")
+    return value
+
+
+def parse_mix(text):
+    """Разбирает строку весов вида 'insert=4,pending=3'."""
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"Неизвестная операция: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def fake_record(sheet, rnd):
+    """Случайная заявка в формате SupportForm.submit_data."""
+    columns = input_columns(sheet)
+    values = {
+        "ФИО": f"Нагрузка {rnd.randrange(10**6)}",
+        "Номер": str(rnd.randrange(10**9)),
+        "Дата": time.strftime("%d.%m.%Y"),
+        "ID Клиента": str(rnd.randrange(10**5)),
+        "Сумма поступления": f"{rnd.uniform(1, 1000):.2f}",
+        "Хэш": uuid.uuid4().hex + uuid.uuid4().hex,
+        "Адрес отправителя": uuid.uuid4().hex,
+        "Адрес возврата": uuid.uuid4().hex,
+        "Причина возврата": "Нагрузочный тест",
+        "Мемо": str(rnd.randrange(10**6)),
+    }
+    return build_record([values.get(col, "") for col in columns], columns, sheet)
+
+
+class Stats:
+    """Потокобезопасный сбор задержек и ошибок по операциям."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {op: [] for op in OPERATIONS}
+        self.errors = {op: 0 for op in OPERATIONS}
+        self.deadlocks = 0
+        self.lock_timeouts = 0
+
+    def record(self, op, seconds):
+        with self._lock:
+            self.latencies[op].append(seconds * 1000)
+
+    def error(self, op, exc):
+        with self._lock:
+            self.errors[op] += 1
+            if isinstance(exc, errors.DeadlockDetected):
+                self.deadlocks += 1
+            elif isinstance(exc, (errors.LockNotAvailable, errors.QueryCanceled)):
+                self.lock_timeouts += 1
+
+
+class LockMonitor(threading.Thread):
+    """Периодически снимает число ожидающих блокировок и счетчик взаимоблокировок."""
+    def __init__(self, dsn, interval=0.5):
+        super().__init__(name="lock-monitor", daemon=True)
+        self.db = Database(dsn)
+        self.db.connect()
+        self.interval = interval
+        self.samples = []
+        self._stop_event = threading.Event()
+        self.deadlocks_start = self.deadlocks()
+
+    def deadlocks(self):
+        with self.db.conn.cursor() as cur:
+            cur.execute("SELECT deadlocks FROM pg_stat_database WHERE datname = current_database()")
+            value = cur.fetchone()[0]
+        self.db.conn.commit()
+        return value
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            with self.db.conn.cursor() as cur:
+                cur.execute("SELECT count(*) FROM pg_stat_activity "
+                            "WHERE datname = current_database() AND wait_event_type = 'Lock'")
+                self.samples.append(cur.fetchone()[0])
+            self.db.conn.commit()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        deadlocks = self.deadlocks() - self.deadlocks_start
+        self.db.close()
+        return deadlocks
+
+
+def operator(index, dsn, sheets, mix, deadline, stats, seed):
+    """Цикл одного оператора до истечения времени теста."""
+    rnd = random.Random(seed + index)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    db = Database(dsn)
+    db.connect()
+    # Нулевой бюджет: в кэше остается только последний загруженный лист
+    cache = DatasetCache(budget_bytes=0)
+    known_ids = {}
+    try:
+        while time.monotonic() < deadline:
+            op = rnd.choices(names, weights)[0]
+            sheet = rnd.choice(sheets)
+            table = SHEET_TO_TABLE[sheet]
+            fields = sheet_fields(sheet)
+            start = time.perf_counter()
+            try:
+                if op == "insert":
+                    db.insert_support_data(table, fake_record(sheet, rnd))
+                elif op == "pending":
+                    rows, _ = db.select_rows(table, fields, where={"status": STATUS_PENDING})
+                    known_ids[table] = [row[0] for row in rows[-1000:]]
+                elif op == "search":
+                    # Путь вкладки поиска: проверка версии таблицы и загрузка листа
+                    # (COPY или select_rows по CACHE_LOAD_VIA_COPY); force — всегда
+                    # перезагрузка, как при изменившихся данных
+                    cache.get(db, table, fields, force=True)
+                elif op == "update":
+                    ids = known_ids.get(table)
+                    if not ids:
+                        rows, _ = db.select_rows(table, ["id"], where={"status": STATUS_PENDING}, limit=100)
+                        ids = known_ids[table] = [row[0] for row in rows]
+                    if ids:
+                        record_id = ids.pop(rnd.randrange(len(ids)))
+                        # Ошибки блокировок пробрасываются и учитываются в Stats.error по типу
+                        updated = db.update_record(table, record_id, {
+                            "return_hash": uuid.uuid4().hex, "return_done": "+", "status": STATUS_DONE
+                        }, raise_errors=True)
+                        if not updated:
+                            raise RuntimeError(f"update_record вернул False для id={record_id}")
+                stats.record(op, time.perf_counter() - start)
+            except Exception as e:
+                stats.error(op, e)
+                if db.is_connected():
+                    db.conn.rollback()
+                else:
+                    db.connect()
+    finally:
+        db.close()
+
+
+def seed_rows(dsn, sheets, count, seed):
+    """Предварительно заполняет таблицы невыполненными заявками пачками."""
+    rnd = random.Random(seed)
+    db = Database(dsn)
+    db.connect()
+    try:
+        for sheet in sheets:
+            table = SHEET_TO_TABLE[sheet]
+            for start in range(0, count, 1000):
+                batch = [(table, uuid.uuid4().hex, fake_record(sheet, rnd)) for _ in range(min(1000, count - start))]
+                db.insert_support_batch(batch)
+    finally:
+        db.close()
+
+
+def run(dsn, operators, duration, mix, sheets, seed=0):
+    """
+    Запускает тест и возвращает отчет.
+
+    Returns:
+        dict: Пропускная способность, перцентили задержек, ожидания блокировок, взаимоблокировки.
+    """
+    stats = Stats()
+    monitor = LockMonitor(dsn)
+    monitor.start()
+    deadline = time.monotonic() + duration
+    threads = [
+        threading.Thread(target=operator, args=(i, dsn, sheets, mix, deadline, stats, seed), name=f"operator-{i}")
+        for i in range(operators)
+    ]
+    started = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - started
+    server_deadlocks = monitor.stop()
+
+    report = {"operators": operators, "duration_s": round(elapsed, 2), "operations": {}}
+    total = 0
+    for op in OPERATIONS:
+        values = sorted(stats.latencies[op])
+        total += len(values)
+        if not values and not stats.errors[op]:
+            continue
+        report["operations"][op] = {
+            "count": len(values),
+            "errors": stats.errors[op],
+            "ops_per_s": round(len(values) / elapsed, 2),
+            "p50_ms": round(percentile(values, 0.50), 2),
+            "p95_ms": round(percentile(values, 0.95), 2),
+            "p99_ms": round(percentile(values, 0.99), 2),
+            "max_ms": round(values[-1], 2) if values else 0.0,
+        }
+    report["total_ops_per_s"] = round(total / elapsed, 2)
+    report["lock_waiters_max"] = max(monitor.samples, default=0)
+    report["lock_waiters_avg"] = round(sum(monitor.samples) / len(monitor.samples), 2) if monitor.samples else 0.0
+    report["deadlocks_client"] = stats.deadlocks
+    report["deadlocks_server"] = server_deadlocks
+    report["lock_timeouts"] = stats.lock_timeouts
+    return report
+
+
+def print_report(report):
+    print(f"Операторов: {report['operators']}, длительность: {report['duration_s']} с, "
+          f"всего: {report['total_ops_per_s']} оп/с")
+    print(f"{'операция':<10}{'кол-во':>8}{'ошибки':>8}{'оп/с':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for op, s in report["operations"].items():
+        print(f"{op:<10}{s['count']:>8}{s['errors']:>8}{s['ops_per_s']:>9}"
+              f"{s['p50_ms']:>9}{s['p95_ms']:>9}{s['p99_ms']:>9}{s['max_ms']:>9}")
+    print(f"Ожидающих блокировку: макс {report['lock_waiters_max']}, в среднем {report['lock_waiters_avg']}")
+    print(f"Взаимоблокировки: клиент {report['deadlocks_client']}, сервер {report['deadlocks_server']}; "
+          f"таймауты блокировок: {report['lock_timeouts']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест нескольких операторов")
+    parser.add_argument("--dsn", required=True, type=nonproduction_dsn, help="строка подключения к тестовой БД (не CONN_DB)")
+    parser.add_argument("--operators", type=int, default=30)
+    parser.add_argument("--duration", type=float, default=60, help="секунд")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="веса операций")
+    parser.add_argument("--sheet", action="append", help="лист (по умолчанию все)")
+    parser.add_argument("--seed-rows", type=int, default=0, help="заполнить каждый лист N заявками перед тестом")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="сохранить отчет в файл")
+    args = parser.parse_args()
+
+    # Запись каждой операции в лог исказила бы результаты
+    app_logger.setLevel("WARNING")
+
+    sheets = args.sheet or list(SHEET_TO_TABLE)
+    if args.seed_rows:
+        seed_rows(args.dsn, sheets, args.seed_rows, args.seed)
+    report = run(args.dsn, args.operators, args.duration, parse_mix(args.mix), sheets, args.seed)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
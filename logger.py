@@ -1,13 +1,125 @@
 # logger.py
+import atexit
+import copy
+import json
 import logging
+import os
+import queue
+import time
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from config import LOG_BACKUP_COUNT, LOG_FILE, LOG_LEVEL, LOG_LEVELS, LOG_MAX_BYTES
+
+# Поля контекста операции, которые попадают в JSON-запись (передаются через extra=)
+CONTEXT_FIELDS = ("operation", "table", "record_id", "rows", "duration_ms")
+
+
+class JsonFormatter(logging.Formatter):
+    """Форматирует запись в одну строку JSON (JSON Lines)."""
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            if hasattr(record, field):
+                entry[field] = getattr(record, field)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+# Форматирует трассировку в очереди до того, как запись уйдет в поток записи
+_exc_formatter = logging.Formatter()
+
+
+class _QueueHandler(QueueHandler):
+    """
+    QueueHandler, который не склеивает трассировку с текстом сообщения.
+
+    Стандартный prepare() дописывает трассировку в record.msg и обнуляет
+    exc_info, из-за чего JsonFormatter не видит исключения. Здесь трассировка
+    форматируется заранее в exc_text: JsonFormatter пишет ее в поле "exc",
+    а обычный Formatter консоли добавляет ее после сообщения.
+    """
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = _exc_formatter.formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+def _build_handlers():
+    handlers = []
+    log_dir = os.path.dirname(LOG_FILE)
+    try:
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+        file_handler = RotatingFileHandler(LOG_FILE, maxBytes=LOG_MAX_BYTES,
+                                           backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+    except OSError:
+        pass  # Нет прав на запись — остаемся только с консолью
+
+    ch = logging.StreamHandler()
+    ch.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(name)s - %(message)s'))
+    handlers.append(ch)
+    return handlers
+
+
+# Все записи уходят в очередь, а файл и консоль пишет отдельный поток,
+# поэтому вызов логгера в потоке интерфейса не ждет ввода-вывода
+_queue = queue.SimpleQueue()
+_listener = QueueListener(_queue, *_build_handlers(), respect_handler_level=True)
+_listener.start()
+atexit.register(_listener.stop)
 
 logger = logging.getLogger('support_app')
-logger.setLevel(logging.DEBUG)
+logger.setLevel(LOG_LEVEL)
+logger.propagate = False
+logger.addHandler(_QueueHandler(_queue))
+
+
+def get_logger(name):
+    """
+    Возвращает дочерний логгер приложения для модуля.
+    Уровень берется из LOG_LEVELS, иначе наследуется от 'support_app'.
+    """
+    child = logger.getChild(name)
+    if name in LOG_LEVELS:
+        child.setLevel(LOG_LEVELS[name])
+    return child
 
-ch = logging.StreamHandler()
-ch.setLevel(logging.DEBUG)
 
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-ch.setFormatter(formatter)
+@contextmanager
+def log_operation(log, operation, level=logging.DEBUG, **context):
+    """
+    Замеряет длительность операции и пишет ее в лог вместе с контекстом
+    (table, record_id и т.п.). Исключение логируется и пробрасывается дальше.
 
-logger.addHandler(ch)
\ No newline at end of file
+    Args:
+        log (logging.Logger): Логгер модуля.
+        operation (str): Название операции.
+        level (int): Уровень записи об успешном завершении.
+        **context: Дополнительные поля записи.
+    """
+    start = time.perf_counter()
+    try:
+        yield context
+    except Exception:
+        duration_ms = round((time.perf_counter() - start) * 1000, 2)
+        log.exception(f"{operation}: ошибка", extra={"operation": operation, "duration_ms": duration_ms, **context})
+        raise
+    duration_ms = round((time.perf_counter() - start) * 1000, 2)
+    log.log(level, f"{operation}: {duration_ms} мс", extra={"operation": operation, "duration_ms": duration_ms, **context})
@@ -3,7 +3,9 @@ import sys
 from config import CONN_DB
 from search_tab import SearchEditTab
 import support_form
-from db import Database
+from api_client import make_database
+from dataset_cache import shared_cache
+from outbox import Outbox, OutboxFlusher
 from error_handler import handle_exception
 import tkinter as tk
 from tkinter import ttk
@@ -52,7 +54,10 @@ def main():
     Исключения внутри функции обрабатываются глобальным обработчиком `handle_exception`.
     """
     dsn = CONN_DB
-    db = Database(dsn)
+    db = make_database(dsn)
+    outbox = Outbox()
+    flusher = OutboxFlusher(outbox, dsn)
+    flusher.start()
     try:
         db.connect()
         root = tk.Tk()
@@ -61,10 +66,20 @@ def main():
 
         bind_copy_paste(root)
 
+        status_var = tk.StringVar()
+        ttk.Label(root, textvariable=status_var, anchor='w').pack(side='bottom', fill='x', padx=10)
+
+        def update_status():
+            dead = outbox.dead_count()
+            status_var.set(f"Заявок в очереди на отправку: {outbox.depth()}"
+                           + (f", отклонено БД (см. {outbox.path}): {dead}" if dead else ""))
+            root.after(1000, update_status)
+        update_status()
+
         notebook = ttk.Notebook(root) 
         notebook.pack(fill='both', expand=True)
 
-        support_form_obj = support_form.SupportForm(notebook, db)
+        support_form_obj = support_form.SupportForm(notebook, db, outbox)
         notebook.add(support_form_obj.frame, text="Саппорт 🤘")
 
         traders_tab = TradersTab(notebook, db)
@@ -73,10 +88,15 @@ def main():
         search_tab = SearchEditTab(notebook, db)
         notebook.add(search_tab.frame, text="Поиск и редактирование")
 
+        # После запуска остальные листы подгружаются в кэш в фоне
+        shared_cache.prefetch(dsn)
+
         root.mainloop()
     except Exception as e:
         print("Ошибка:", e)
     finally:
+        flusher.stop()
+        outbox.close()
         db.close()
 
 if __name__ == "__main__":
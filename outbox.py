@@ -0,0 +1,230 @@
+# outbox.py
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+import psycopg2
+
+from api_client import ApiError, make_database
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+OUTBOX_FILE = 'outbox.db'
+# Сколько заявок отправляется в БД одной транзакцией
+FLUSH_BATCH_SIZE = 200
+# Пауза между проверками очереди, сек
+FLUSH_INTERVAL = 1.0
+# Максимальная пауза после ошибки отправки, сек
+MAX_BACKOFF = 60.0
+# После стольких неудачных попыток заявка откладывается (dead-letter) и больше не отправляется
+MAX_ATTEMPTS = 5
+
+
+# Ответы API с кодом 4xx, в которых виновата не заявка: доступ, таймаут, перегрузка
+RETRYABLE_API_STATUSES = (401, 403, 408, 429)
+
+
+def is_transient(error):
+    """
+    Ошибка связи с БД или сервисом API (повторяется для всей пачки), а не
+    ошибка самих данных заявки. Из ответов API к попыткам заявки
+    засчитываются только 4xx (кроме RETRYABLE_API_STATUSES), ответы 5xx
+    повторяются, как обрыв связи.
+    """
+    if isinstance(error, ApiError):
+        return error.status >= 500 or error.status in RETRYABLE_API_STATUSES
+    return isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError, ConnectionError, OSError))
+
+
+class Outbox:
+    """
+    Локальная очередь заявок (SQLite в режиме WAL).
+
+    Заявка сохраняется на диск сразу при отправке формы и получает ключ
+    идемпотентности. Фоновый OutboxFlusher переносит заявки в PostgreSQL,
+    повторная отправка того же ключа не создает дубликатов. Заявки, которые
+    БД отклонила MAX_ATTEMPTS раз, помечаются dead и остаются в файле для
+    ручного разбора, не задерживая остальные.
+
+    Атрибуты:
+        path (str): Путь к файлу очереди.
+    """
+    def __init__(self, path=OUTBOX_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                request_key TEXT NOT NULL UNIQUE,
+                table_name TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                dead INTEGER NOT NULL DEFAULT 0
+            )"""
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(outbox)")]
+        if "dead" not in columns:
+            # Файл очереди из предыдущей версии
+            self._conn.execute("ALTER TABLE outbox ADD COLUMN dead INTEGER NOT NULL DEFAULT 0")
+
+    def enqueue(self, table, data):
+        """
+        Добавляет заявку в очередь.
+
+        Args:
+            table (str): Таблица назначения.
+            data (dict): Данные формы (порядок ключей соответствует колонкам).
+
+        Returns:
+            str: Ключ идемпотентности заявки.
+        """
+        request_key = uuid.uuid4().hex
+        payload = json.dumps(list(data.items()), ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO outbox (request_key, table_name, payload, created_at) VALUES (?, ?, ?, ?)",
+                (request_key, table, payload, time.time())
+            )
+        logger.info(f"Заявка {request_key} поставлена в очередь для {table}")
+        return request_key
+
+    def depth(self):
+        """Количество заявок, ожидающих отправки."""
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM outbox WHERE dead = 0").fetchone()[0]
+
+    def dead_count(self):
+        """Количество отложенных заявок, которые БД отклонила MAX_ATTEMPTS раз."""
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM outbox WHERE dead = 1").fetchone()[0]
+
+    def peek(self, limit=FLUSH_BATCH_SIZE):
+        """
+        Возвращает самые старые ожидающие заявки без удаления.
+
+        Returns:
+            list: Кортежи (id, request_key, table, data).
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, request_key, table_name, payload FROM outbox WHERE dead = 0 ORDER BY id LIMIT ?",
+                (limit,)
+            ).fetchall()
+        return [(row_id, key, table, dict(json.loads(payload))) for row_id, key, table, payload in rows]
+
+    def remove(self, ids):
+        """Удаляет отправленные заявки."""
+        with self._lock:
+            self._conn.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in ids])
+
+    def mark_failed(self, ids, error, max_attempts=MAX_ATTEMPTS):
+        """
+        Отмечает неудачную попытку отправки; после max_attempts попыток
+        заявка откладывается (dead = 1).
+
+        Returns:
+            int: Сколько заявок отложено этим вызовом.
+        """
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE outbox SET attempts = attempts + 1, last_error = ?, "
+                "dead = CASE WHEN attempts + 1 >= ? THEN 1 ELSE 0 END WHERE id = ?",
+                [(str(error), max_attempts, i) for i in ids]
+            )
+            marks = ",".join("?" * len(ids))
+            return self._conn.execute(
+                f"SELECT count(*) FROM outbox WHERE dead = 1 AND id IN ({marks})", list(ids)
+            ).fetchone()[0] if ids else 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class OutboxFlusher(threading.Thread):
+    """
+    Фоновый поток, переносящий заявки из Outbox в PostgreSQL пачками.
+
+    Использует собственное подключение к БД, чтобы не конкурировать
+    с интерфейсом за соединение. Если пачка отклонена из-за данных, заявки
+    отправляются по одной: ошибочная получает попытку (и после MAX_ATTEMPTS
+    откладывается), остальные проходят.
+    """
+    def __init__(self, outbox, dsn, batch_size=FLUSH_BATCH_SIZE, interval=FLUSH_INTERVAL):
+        super().__init__(name="outbox-flusher", daemon=True)
+        self.outbox = outbox
+        self.db = make_database(dsn)
+        self.batch_size = batch_size
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        """
+        Останавливает поток и ждет его завершения без таймаута: после
+        возврата поток больше не обращается к Outbox, и его можно закрыть.
+        Подключение к БД поток закрывает сам.
+        """
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+
+    def run(self):
+        try:
+            self._run()
+        finally:
+            self.db.close()
+
+    def _run(self):
+        backoff = self.interval
+        while not self._stop_event.is_set():
+            batch = self.outbox.peek(self.batch_size)
+            if not batch:
+                self._stop_event.wait(self.interval)
+                continue
+            try:
+                if not self.db.is_connected():
+                    self.db.connect()
+                self.db.insert_support_batch([(table, key, data) for _, key, table, data in batch])
+                self.outbox.remove([row_id for row_id, *_ in batch])
+                backoff = self.interval
+                continue
+            except Exception as e:
+                logger.warning(f"Не удалось отправить очередь заявок ({len(batch)} шт.): {e}")
+                transient = is_transient(e)
+            # При ошибке в данных корректные заявки пачки уходят по одной,
+            # а ошибочные повторяются после паузы
+            if transient or not self.flush_each(batch):
+                self.db.close()
+            self._stop_event.wait(backoff)
+            backoff = min(backoff * 2, MAX_BACKOFF)
+
+    def flush_each(self, batch):
+        """
+        Отправляет заявки пачки по одной после ошибки в данных.
+
+        Returns:
+            bool: False, если отправка прервана ошибкой связи.
+        """
+        for row_id, key, table, data in batch:
+            if self._stop_event.is_set():
+                return True
+            try:
+                self.db.insert_support_batch([(table, key, data)])
+            except Exception as e:
+                if is_transient(e):
+                    return False
+                if self.outbox.mark_failed([row_id], e):
+                    logger.error(f"Заявка {key} для {table} отложена после {MAX_ATTEMPTS} попыток: {e}")
+                else:
+                    logger.warning(f"Заявка {key} для {table} не отправлена: {e}")
+                continue
+            self.outbox.remove([row_id])
+        return True
@@ -0,0 +1,138 @@
+# priority.py
+import datetime
+import heapq
+import math
+from functools import lru_cache
+
+from config import SLA_DAYS, SLA_WARNING_DAYS
+
+
+@lru_cache(maxsize=4096)
+def refund_date(value):
+    """Дата заявки из текста ДД.ММ.ГГГГ (None, если не разбирается) — как refund_date() в БД."""
+    try:
+        return datetime.datetime.strptime(str(value).strip(), "%d.%m.%Y").date()
+    except ValueError:
+        return None
+
+
+def sla_state(date_value, today=None):
+    """
+    Состояние срока выполнения: 'sla_breach' (просрочено), 'sla_warning'
+    (срок подходит) или None.
+    """
+    day = refund_date(date_value)
+    if day is None:
+        return None
+    age = ((today or datetime.date.today()) - day).days
+    if age >= SLA_DAYS:
+        return 'sla_breach'
+    if age >= SLA_DAYS - SLA_WARNING_DAYS:
+        return 'sla_warning'
+    return None
+
+
+class PriorityQueue:
+    """
+    Очередь невыполненных возвратов по убыванию приоритета на heapq.
+
+    Ключи приходят из БД (refund_priority(), Database.priority_pending) —
+    веса приоритета задаются только там.
+
+    Изменения применяются точечно: update кладет в кучу новую запись только
+    при изменении ключа, remove лишь убирает заявку из словаря, а устаревшие
+    записи кучи пропускаются при чтении (ленивое удаление). Пересчета всей
+    очереди при изменении отдельных строк нет.
+
+    Атрибуты:
+        entries (dict): id -> (ключ, строка).
+    """
+    def __init__(self):
+        self.entries = {}
+        self._heap = []
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def _heap_item(record_id, key):
+        # Заявки без даты — в конце очереди; порядок как в БД: ключ DESC NULLS LAST, id
+        return (float('inf') if key is None else -key, record_id, key)
+
+    def precedes(self, record_id, key, other_id, other_key):
+        """True, если заявка (record_id, key) идет в очереди раньше (other_id, other_key)."""
+        return self._heap_item(record_id, key)[:2] < self._heap_item(other_id, other_key)[:2]
+
+    def last(self):
+        """
+        Последняя по приоритету заявка — курсор (ключ, id) для догрузки
+        следующих из БД — или None для пустой очереди.
+        """
+        if not self.entries:
+            return None
+        record_id = max(self.entries, key=lambda i: self._heap_item(i, self.entries[i][0])[:2])
+        return self.entries[record_id][0], record_id
+
+    def update(self, record_id, key, row):
+        """Добавляет или обновляет заявку. Возвращает True, если изменился ключ."""
+        # Ключ хранится как пришел из БД (Decimal): он же служит курсором догрузки.
+        # NaN нарушил бы порядок кучи
+        if key is not None and not math.isfinite(key):
+            key = None
+        current = self.entries.get(record_id)
+        self.entries[record_id] = (key, row)
+        if current is not None and current[0] == key:
+            return False
+        heapq.heappush(self._heap, self._heap_item(record_id, key))
+        return True
+
+    def remove(self, record_id):
+        self.entries.pop(record_id, None)
+
+    def sync(self, items):
+        """
+        Согласует очередь с новой выборкой: (id, ключ, строка). Заявки, которых
+        в выборке нет, удаляются; в кучу попадают только строки с новым ключом.
+
+        Returns:
+            int: Количество заявок с изменившимся ключом.
+        """
+        seen = set()
+        changed = 0
+        for record_id, key, row in items:
+            seen.add(record_id)
+            changed += self.update(record_id, key, row)
+        for record_id in [i for i in self.entries if i not in seen]:
+            self.remove(record_id)
+        self._compact()
+        return changed
+
+    def _is_current(self, item):
+        entry = self.entries.get(item[1])
+        return entry is not None and entry[0] == item[2]
+
+    def _compact(self):
+        """Пересобирает кучу, когда устаревших записей становится больше актуальных."""
+        if len(self._heap) > 2 * len(self.entries) + 64:
+            self._heap = [item for item in self._heap if self._is_current(item)]
+            heapq.heapify(self._heap)
+
+    def top(self, n):
+        """
+        Первые n заявок по приоритету (O(n log N), куча не разрушается).
+
+        Returns:
+            list: Кортежи (id, ключ, строка).
+        """
+        taken, result, seen = [], [], set()
+        while self._heap and len(result) < n:
+            item = heapq.heappop(self._heap)
+            # Повторная запись того же ключа (ключ менялся туда и обратно) отбрасывается
+            if not self._is_current(item) or item[1] in seen:
+                continue
+            seen.add(item[1])
+            taken.append(item)
+            result.append((item[1], item[2], self.entries[item[1]][1]))
+        for item in taken:
+            heapq.heappush(self._heap, item)
+        return result
@@ -0,0 +1,160 @@
+# query_diagnostics.py
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+
+import psycopg2
+
+from config import (DIAG_ENABLED, DIAG_LOG_FILE, DIAG_SAMPLE_RATE, DIAG_SLOW_MS,
+                    DIAG_WATCH_COLUMNS)
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+# Для этих запросов допустим EXPLAIN ANALYZE (повторное выполнение без побочных эффектов)
+READ_ONLY_RE = re.compile(r"^\s*(SELECT|WITH\s+(?!.*\b(INSERT|UPDATE|DELETE)\b))", re.IGNORECASE | re.DOTALL)
+# SELECT ... FOR UPDATE/SHARE берет блокировки строк (выборка заявок трейдеру):
+# под ANALYZE он бы захватывал или пропускал чужие строки, поэтому только EXPLAIN
+LOCKING_RE = re.compile(r"\bFOR\s+(NO\s+KEY\s+UPDATE|UPDATE|KEY\s+SHARE|SHARE)\b", re.IGNORECASE)
+
+
+def can_analyze(sql_text):
+    """Можно ли повторить запрос под EXPLAIN ANALYZE: только чтение без блокировок строк."""
+    return bool(READ_ONLY_RE.match(sql_text)) and not LOCKING_RE.search(sql_text)
+
+
+def params_shape(params):
+    """Описание параметров без значений: тип и длина строк."""
+    shape = []
+    for value in params or ():
+        if isinstance(value, str):
+            shape.append(f"str[{len(value)}]")
+        elif isinstance(value, (list, tuple)):
+            shape.append(f"{type(value).__name__}[{len(value)}]")
+        else:
+            shape.append(type(value).__name__)
+    return shape
+
+
+def find_seq_scans(plan, watch_columns=DIAG_WATCH_COLUMNS):
+    """
+    Ищет в плане (FORMAT JSON) последовательные сканирования с фильтром
+    по отслеживаемым колонкам — признак отсутствующего индекса.
+
+    Returns:
+        list: Словари relation/filter/columns для каждого найденного узла.
+    """
+    found = []
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        if node.get("Node Type") == "Seq Scan":
+            filter_text = node.get("Filter", "")
+            columns = [col for col in watch_columns if re.search(rf"\b{re.escape(col)}\b", filter_text)]
+            if columns:
+                found.append({
+                    "relation": node.get("Relation Name"),
+                    "filter": filter_text,
+                    "columns": columns,
+                    "rows_removed": node.get("Rows Removed by Filter"),
+                })
+        stack.extend(node.get("Plans", []))
+    return found
+
+
+class QueryDiagnostics:
+    """
+    Журнал медленных запросов с автоматическим EXPLAIN.
+
+    Запросы дольше порога с вероятностью sample_rate передаются фоновому
+    потоку, который на отдельном подключении выполняет
+    EXPLAIN (ANALYZE, BUFFERS) (для изменяющих и блокирующих строки
+    запросов — без ANALYZE) в откатываемой транзакции и пишет план в JSON Lines вместе с текстом
+    запроса, таблицей и формой параметров. Seq Scan с фильтром по
+    отслеживаемым колонкам отмечается в записи и в логе приложения.
+    """
+    def __init__(self, dsn, slow_ms=DIAG_SLOW_MS, sample_rate=DIAG_SAMPLE_RATE, log_file=DIAG_LOG_FILE):
+        self.dsn = dsn
+        self.slow_ms = slow_ms
+        self.sample_rate = sample_rate
+        self.log_file = log_file
+        self._queue = queue.Queue(maxsize=100)
+        self._thread = threading.Thread(target=self._worker, name="query-diagnostics", daemon=True)
+        self._thread.start()
+
+    def observe(self, conn, query, params, table, duration_ms):
+        """Регистрирует выполненный запрос; медленные попадают в выборку для EXPLAIN."""
+        if duration_ms < self.slow_ms or random.random() >= self.sample_rate:
+            return
+        sql_text = query.as_string(conn) if hasattr(query, "as_string") else str(query)
+        try:
+            self._queue.put_nowait((sql_text, list(params or ()), table, duration_ms, time.time()))
+        except queue.Full:
+            pass  # Диагностика не должна тормозить приложение
+
+    def _worker(self):
+        conn = None
+        while True:
+            sql_text, params, table, duration_ms, ts = self._queue.get()
+            try:
+                if conn is None or conn.closed:
+                    conn = psycopg2.connect(self.dsn)
+                self._write(self._explain(conn, sql_text, params, table, duration_ms, ts))
+            except Exception:
+                logger.exception("Не удалось получить план запроса", extra={"table": table})
+                if conn is not None and not conn.closed:
+                    conn.rollback()
+
+    def _explain(self, conn, sql_text, params, table, duration_ms, ts):
+        analyze = can_analyze(sql_text)
+        options = "ANALYZE, BUFFERS, FORMAT JSON" if analyze else "FORMAT JSON"
+        try:
+            with conn.cursor() as cur:
+                # Без параметров запрос не форматируется: % в тексте остается как есть
+                cur.execute(f"EXPLAIN ({options}) {sql_text}", params or None)
+                plan = cur.fetchone()[0][0]
+        finally:
+            conn.rollback()
+        seq_scans = find_seq_scans(plan["Plan"])
+        if seq_scans:
+            relations = ", ".join(sorted({s["relation"] or "?" for s in seq_scans}))
+            logger.warning(f"Seq Scan по фильтрам {', '.join(c for s in seq_scans for c in s['columns'])} в {relations}",
+                           extra={"table": table, "duration_ms": duration_ms})
+        return {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(ts)),
+            "table": table,
+            "duration_ms": duration_ms,
+            "sql": sql_text,
+            "params_shape": params_shape(params),
+            "analyzed": analyze,
+            "seq_scans": seq_scans,
+            "plan": plan,
+        }
+
+    def _write(self, entry):
+        directory = os.path.dirname(self.log_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.log_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def get_diagnostics(dsn):
+    """
+    Возвращает общий экземпляр диагностики для строки подключения или None,
+    если режим выключен (DIAG_ENABLED или переменная окружения SUPPORT_APP_DIAG=1).
+    """
+    if not (DIAG_ENABLED or os.environ.get("SUPPORT_APP_DIAG") == "1"):
+        return None
+    with _instances_lock:
+        if dsn not in _instances:
+            _instances[dsn] = QueryDiagnostics(dsn)
+        return _instances[dsn]
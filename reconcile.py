@@ -0,0 +1,320 @@
+# reconcile.py
+import csv
+import datetime
+import os
+import tkinter as tk
+from decimal import Decimal, InvalidOperation
+from tkinter import ttk, messagebox, filedialog
+
+from config import OPERATOR_NAME, SHEET_TO_TABLE, STATUS_PENDING, TOKEN_MAPPING
+from dataset_cache import shared_cache
+from logger import get_logger, log_operation
+
+logger = get_logger(__name__)
+
+# Варианты заголовков колонок в выгрузках кошельков (сравнение без регистра)
+HEADER_ALIASES = {
+    "hash": ["tx hash", "txhash", "tx_hash", "txid", "tx id", "transaction hash", "transaction id", "hash", "хэш", "хеш"],
+    "address": ["destination", "destination address", "to", "to address", "recipient", "address", "адрес", "адрес получателя"],
+    "amount": ["amount", "value", "quantity", "sum", "сумма"],
+}
+# Необязательная колонка токена/валюты выплаты
+TOKEN_ALIASES = ["token", "currency", "asset", "coin", "symbol", "токен", "валюта"]
+# Суммы заявки, с которыми сравнивается сумма выплаты
+AMOUNT_FIELDS = ["receipt_amount", "application_amount"]
+PENDING_FIELDS = ["id", "fio", "user_id", "return_address"] + AMOUNT_FIELDS + ["claimed_by", "claimed_until"]
+ALL_SHEETS = "Все листы"
+
+
+def parse_amount(value):
+    """Приводит сумму к Decimal без лишних нулей (None, если это не конечное число)."""
+    if value is None:
+        return None
+    text = str(value).replace(' ', '').replace(' ', '').replace(',', '.')
+    try:
+        amount = Decimal(text)
+    except InvalidOperation:
+        return None
+    # Decimal принимает "NaN" и "Infinity"
+    return amount.normalize() if amount.is_finite() else None
+
+
+def normalize_address(value):
+    """Адреса EVM и bech32 нечувствительны к регистру, base58 — чувствительны."""
+    address = str(value or '').strip()
+    if address.lower().startswith(("0x", "bc1", "tb1")):
+        return address.lower()
+    return address
+
+
+def detect_columns(header):
+    """
+    Определяет номера колонок hash/address/amount (и token, если есть)
+    по строке заголовков.
+
+    Raises:
+        ValueError: Если какую-то обязательную колонку найти не удалось.
+    """
+    names = [str(h or '').strip().lower() for h in header]
+    positions = {}
+    for role, aliases in list(HEADER_ALIASES.items()) + [("token", TOKEN_ALIASES)]:
+        for alias in aliases:
+            if alias in names:
+                positions[role] = names.index(alias)
+                break
+    missing = [role for role in HEADER_ALIASES if role not in positions]
+    if missing:
+        raise ValueError(f"Не найдены колонки: {', '.join(missing)}")
+    return positions
+
+
+def token_sheets(token):
+    """
+    Листы, к которым может относиться токен из выписки: по названию листа,
+    токену листа ("USDT (TRX)") или его символу ("USDT").
+
+    Returns:
+        set | None: Листы или None, если токен не указан.
+    """
+    token = str(token or '').strip().upper()
+    if not token:
+        return None
+    return {
+        sheet for sheet, sheet_token in TOKEN_MAPPING.items()
+        if token in (sheet.upper(), sheet_token.upper(), sheet_token.split()[0].upper())
+    }
+
+
+def leased_by_other(record, operator, now):
+    """Заявка закреплена за другим трейдером и аренда еще действует."""
+    until = record.get("claimed_until")
+    if not until or record.get("claimed_by") == operator:
+        return False
+    if isinstance(until, str):
+        until = datetime.datetime.fromisoformat(until)
+    return until > now
+
+
+def iter_rows(path):
+    """Построчно читает CSV или XLSX, не загружая файл целиком."""
+    if os.path.splitext(path)[1].lower() in ('.xlsx', '.xlsm'):
+        from openpyxl import load_workbook
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            yield from workbook.active.iter_rows(values_only=True)
+        finally:
+            workbook.close()
+    else:
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            sample = f.read(4096)
+            f.seek(0)
+            try:
+                dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+            except csv.Error:
+                dialect = csv.excel
+            yield from csv.reader(f, dialect)
+
+
+def read_statement(path):
+    """
+    Генератор выплат из выписки: словари hash/address/amount/token.
+    Строки без хэша, адреса или с нечисловой суммой пропускаются.
+    """
+    rows = iter_rows(path)
+    positions = detect_columns(next(rows, []))
+    for row in rows:
+        if not row:
+            continue
+        try:
+            tx_hash = str(row[positions["hash"]] or '').strip()
+            address = normalize_address(row[positions["address"]])
+            amount = parse_amount(row[positions["amount"]])
+            token = str(row[positions["token"]] or '').strip() if "token" in positions else ''
+        except IndexError:
+            continue
+        if tx_hash and address and amount is not None:
+            yield {"hash": tx_hash, "address": address, "amount": amount, "token": token}
+
+
+def build_pending_index(db, sheets=None, operator=OPERATOR_NAME):
+    """
+    Хэш-таблица невыполненных возвратов листов (по умолчанию всех):
+    (адрес возврата, сумма) -> список кандидатов. Заявки, закрепленные
+    за другим трейдером, не включаются.
+    """
+    index = {}
+    now = datetime.datetime.now(datetime.timezone.utc)
+    for sheet, table in SHEET_TO_TABLE.items():
+        if sheets and sheet not in sheets:
+            continue
+        # Строки перебираются серверным курсором, а не fetchall всей таблицы
+        for row in db.iter_rows(table, PENDING_FIELDS, where={"status": STATUS_PENDING}):
+            record = dict(zip(PENDING_FIELDS, row))
+            address = normalize_address(record["return_address"])
+            if not address or leased_by_other(record, operator, now):
+                continue
+            candidate = {"sheet": sheet, "table": table, **record}
+            amounts = {parse_amount(record[field]) for field in AMOUNT_FIELDS} - {None}
+            for amount in amounts:
+                index.setdefault((address, amount), []).append(candidate)
+    return index
+
+
+def match_payouts(payouts, index):
+    """
+    Сопоставляет выплаты с заявками. Кандидаты сужаются по токену выплаты,
+    если он есть в выписке. Однозначная пара (один свободный кандидат)
+    предлагается к применению; если кандидатов несколько (общие адреса
+    EVM/TRON у разных листов, повторные заявки), все они выводятся как
+    неоднозначные — для ручного выбора, без автоматического применения.
+    Каждая заявка и каждая выплата используются не более одного раза.
+
+    Returns:
+        tuple: (список предложений, список несопоставленных выплат).
+            У неоднозначных предложений ambiguous=True и общий номер выплаты payout.
+    """
+    proposals, unmatched = [], []
+    used = set()
+    for number, payout in enumerate(payouts):
+        sheets = token_sheets(payout.get("token"))
+        candidates = [
+            c for c in index.get((payout["address"], payout["amount"]), [])
+            if (c["table"], c["id"]) not in used and (sheets is None or c["sheet"] in sheets)
+        ]
+        if not candidates:
+            unmatched.append(payout)
+            continue
+        ambiguous = len(candidates) > 1
+        if not ambiguous:
+            used.add((candidates[0]["table"], candidates[0]["id"]))
+        for candidate in candidates:
+            proposals.append({**candidate, "return_hash": payout["hash"], "amount": payout["amount"],
+                              "payout": number, "ambiguous": ambiguous})
+    return proposals, unmatched
+
+
+class ReconcileWindow:
+    """
+    Окно сверки невыполненных возвратов с выпиской выплат кошелька.
+
+    После выбора файла показывает предложенные изменения (хэш возврата и статус),
+    оператор снимает отметки с ненужных и применяет остальные одной транзакцией.
+    Неоднозначные пары не отмечены: оператор выбирает одну заявку на выплату.
+
+    Атрибуты:
+        db (Database): Объект базы данных.
+        proposals (list): Предложенные изменения.
+        accepted (set): Номера принятых предложений.
+    """
+    def __init__(self, parent, db, on_applied=None):
+        """
+        Args:
+            parent (tk.Widget): Родительский виджет.
+            db (Database): Объект базы данных.
+            on_applied (callable): Вызывается после применения изменений.
+        """
+        self.db = db
+        self.on_applied = on_applied
+        self.proposals = []
+        self.accepted = set()
+
+        self.window = tk.Toplevel(parent)
+        self.window.title("Сверка с выпиской выплат")
+        self.window.geometry("1100x550")
+
+        top_frame = ttk.Frame(self.window)
+        top_frame.pack(fill='x', padx=10, pady=5)
+        ttk.Label(top_frame, text="Лист выписки:").pack(side='left', padx=5)
+        self.sheet_combo = ttk.Combobox(top_frame, values=[ALL_SHEETS] + list(SHEET_TO_TABLE), state='readonly', width=18)
+        self.sheet_combo.set(ALL_SHEETS)
+        self.sheet_combo.pack(side='left', padx=5)
+        ttk.Button(top_frame, text="Выбрать файл выписки", command=self.choose_file).pack(side='left', padx=5)
+        self.btn_apply = ttk.Button(top_frame, text="Применить отмеченные", command=self.apply, state='disabled')
+        self.btn_apply.pack(side='left', padx=5)
+        self.summary_var = tk.StringVar(value="CSV или XLSX с колонками хэша, адреса получателя и суммы")
+        ttk.Label(top_frame, textvariable=self.summary_var).pack(side='left', padx=15)
+
+        columns = ["✓", "Лист", "id", "ФИО", "ID", "Адрес возврата", "Сумма", "ХЭШ ВОЗВРАТА"]
+        self.tree = ttk.Treeview(self.window, columns=columns, show='headings')
+        for col in columns:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=30 if col == "✓" else 130)
+        self.tree.tag_configure('ambiguous', background='#fff3cd')
+        self.tree.pack(fill='both', expand=True, padx=10, pady=5)
+        self.tree.bind('<Double-1>', self.toggle_selected)
+        self.tree.bind('<space>', self.toggle_selected)
+
+    def choose_file(self):
+        path = filedialog.askopenfilename(
+            parent=self.window,
+            filetypes=[("Выписка", "*.csv *.xlsx"), ("Все файлы", "*.*")]
+        )
+        if path:
+            self.load(path)
+
+    def load(self, path):
+        """Читает выписку и строит предложения."""
+        try:
+            if not self.db.is_connected():
+                self.db.connect()
+            sheet = self.sheet_combo.get()
+            with log_operation(logger, "reconcile_match") as context:
+                index = build_pending_index(self.db, sheets=None if sheet == ALL_SHEETS else [sheet])
+                self.proposals, unmatched = match_payouts(read_statement(path), index)
+                context["rows"] = len(self.proposals)
+        except Exception as e:
+            messagebox.showerror("Ошибка", str(e), parent=self.window)
+            logger.exception("Ошибка сверки с выпиской")
+            return
+
+        self.accepted = {i for i, p in enumerate(self.proposals) if not p["ambiguous"]}
+        self.tree.delete(*self.tree.get_children())
+        for i, p in enumerate(self.proposals):
+            self.tree.insert('', 'end', iid=str(i), values=[
+                "✓" if i in self.accepted else "?", p["sheet"], p["id"], p["fio"], p["user_id"],
+                p["return_address"], str(p["amount"]), p["return_hash"]
+            ], tags=('ambiguous',) if p["ambiguous"] else ())
+        ambiguous = len({p["payout"] for p in self.proposals if p["ambiguous"]})
+        self.summary_var.set(f"Сопоставлено: {len(self.accepted)}, неоднозначных выплат (выберите вручную): "
+                             f"{ambiguous}, без пары в заявках: {len(unmatched)}")
+        self.btn_apply.configure(state='normal' if self.proposals else 'disabled')
+
+    def toggle_selected(self, event=None):
+        for item in self.tree.selection():
+            i = int(item)
+            if i in self.accepted:
+                self.accepted.discard(i)
+                self.tree.set(item, "✓", "")
+                continue
+            # Одна выплата закрывает одну заявку, одна заявка — одной выплатой
+            proposal = self.proposals[i]
+            for j in list(self.accepted):
+                other = self.proposals[j]
+                if other["payout"] == proposal["payout"] or (other["table"], other["id"]) == (proposal["table"], proposal["id"]):
+                    self.accepted.discard(j)
+                    self.tree.set(str(j), "✓", "")
+            self.accepted.add(i)
+            self.tree.set(item, "✓", "✓")
+
+    def apply(self):
+        """Применяет отмеченные предложения одной транзакцией."""
+        updates = [(self.proposals[i]["table"], self.proposals[i]["id"], self.proposals[i]["return_hash"])
+                   for i in sorted(self.accepted)]
+        if not updates:
+            return
+        if not messagebox.askyesno("Подтверждение", f"Отметить сделанными {len(updates)} возвратов?", parent=self.window):
+            return
+        try:
+            if not self.db.is_connected():
+                self.db.connect()
+            updated = self.db.apply_refunds(updates, operator=OPERATOR_NAME)
+        except Exception as e:
+            messagebox.showerror("Ошибка", str(e), parent=self.window)
+            logger.exception("Ошибка применения сверки")
+            return
+        for table in {table for table, _, _ in updates}:
+            shared_cache.invalidate(table)
+        messagebox.showinfo("Успех", f"Обновлено записей: {updated}", parent=self.window)
+        if self.on_applied:
+            self.on_applied()
+        self.window.destroy()
@@ -0,0 +1,356 @@
+# row_store.py
+import os
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from config import NUMERIC_FIELDS
+
+# Колонки с малым числом уникальных значений храним как коды + словарь
+CATEGORICAL_FIELDS = ("token", "status", "return_reason")
+# Колонки, для которых дополнительно строится числовое представление:
+# суммы (config.NUMERIC_FIELDS) и id
+NUMBER_FIELDS = ("id", *NUMERIC_FIELDS)
+# Начиная с этого размера фильтрация разбивается на части по ядрам
+PARALLEL_THRESHOLD = 200_000
+# Поиск подстроки переходит на векторный, когда совпадений больше 1/N строк
+BROAD_MATCH_RATIO = 8
+
+STRING_DTYPE = np.dtypes.StringDType()
+
+
+def to_strings(values):
+    """
+    Переводит значения колонки в массив object без None (NULL -> пустая строка).
+    Не строковые значения (id, числа) приводятся к str при переходе в StringDType.
+    """
+    array = np.array(values, dtype=object)
+    array[np.equal(array, None)] = ""
+    return array
+
+
+def parse_numbers(values):
+    """
+    Векторно переводит строки с суммами в float64 (NaN для нечисловых значений).
+    Поддерживает запятую как десятичный разделитель, пробелы между разрядами
+    и знак минус; экспоненциальная запись и NaN/Infinity суммами не считаются.
+    """
+    strings = np.asarray(values, dtype=STRING_DTYPE)
+    try:
+        # Быстрый путь для колонок без разделителей и мусора (id)
+        result = strings.astype(np.float64)
+    except ValueError:
+        pass
+    else:
+        result[~np.isfinite(result)] = np.nan
+        return result
+    for separator in (" ", "\u00a0", "\t"):
+        # Разделители разрядов редки: проверка дешевле безусловной замены
+        if (np.strings.find(strings, separator) >= 0).any():
+            strings = np.strings.replace(strings, separator, "")
+    strings = np.strings.replace(strings, ",", ".")
+    # Допустимы цифры с не более чем одной точкой и минусом только в начале
+    digits = np.strings.replace(np.strings.replace(strings, "-", "", 1), ".", "", 1)
+    valid = (np.strings.isdecimal(digits) & (np.strings.str_len(digits) > 0)
+             & (np.strings.rfind(strings, "-") <= 0))
+    result = np.full(len(strings), np.nan)
+    try:
+        result[valid] = strings[valid].astype(np.float64)
+    except ValueError:
+        # Цифры не из ASCII (isdecimal их пропускает) — разбираем медленным путем
+        result[valid] = pd.to_numeric(strings[valid].astype(object), errors="coerce")
+    return result
+
+
+class CategoricalColumn:
+    """
+    Колонка в виде кодов int32 и массива уникальных значений.
+
+    Атрибуты:
+        codes (np.ndarray): Код значения для каждой строки.
+        categories (np.ndarray): Уникальные значения (StringDType).
+    """
+    def __init__(self, values):
+        # factorize по хэшу быстрее np.unique, сортирующего всю колонку;
+        # sort=True сохраняет порядок категорий, на который опирается sort_order
+        codes, categories = pd.factorize(np.asarray(values, dtype=object), sort=True)
+        self.categories = np.asarray(categories, dtype=STRING_DTYPE)
+        self.codes = codes.astype(np.int32)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        return self.categories[self.codes[i]]
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + sum(len(c) for c in self.categories.tolist())
+
+    def match_codes(self, category_mask):
+        """Разворачивает маску по словарю категорий в маску по строкам."""
+        return category_mask[self.codes]
+
+
+class RowStore:
+    """
+    Колоночное хранилище загруженного листа.
+
+    Каждое поле хранится отдельным массивом numpy: строковые — в StringDType,
+    token/status/return_reason — в виде категорий, для сумм и id дополнительно
+    строится float64. Фильтры возвращают массив индексов строк, который
+    передается в VirtualTreeview.
+
+    Атрибуты:
+        fields (list): Имена полей в порядке колонок таблицы.
+        columns (dict): Поле -> np.ndarray или CategoricalColumn.
+        numeric (dict): Поле -> float64 массив для числовых полей.
+    """
+    def __init__(self, fields, columns, normalized=False):
+        """
+        Args:
+            fields (list): Имена полей.
+            columns (dict): Поле -> последовательность значений одинаковой длины.
+            normalized (bool): Значения уже строки без None — замена NULL пропускается.
+        """
+        self.fields = list(fields)
+        self.columns = {}
+        self.numeric = {}
+        self._lower = {}
+        self._sort_cache = {}
+        for field in self.fields:
+            values = columns[field] if normalized else to_strings(columns[field])
+            if field in CATEGORICAL_FIELDS:
+                column = self.columns[field] = CategoricalColumn(values)
+            else:
+                column = self.columns[field] = np.asarray(values, dtype=STRING_DTYPE)
+            if field in NUMBER_FIELDS:
+                self.numeric[field] = parse_numbers(values if isinstance(column, CategoricalColumn) else column)
+        self._length = len(self.columns[self.fields[0]]) if self.fields else 0
+
+    @classmethod
+    def from_rows(cls, fields, rows):
+        """Строит хранилище из списка кортежей (результат fetchall)."""
+        columns = {field: [] for field in fields}
+        if rows:
+            for field, values in zip(fields, zip(*rows)):
+                columns[field] = values
+        return cls(fields, columns)
+
+    @classmethod
+    def from_columns(cls, fields, columns):
+        """
+        Строит хранилище из готовых колонок строк (результат Database.copy_columns):
+        значения уже str, NULL заменен пустой строкой.
+        """
+        return cls(fields, columns, normalized=True)
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, i):
+        """Возвращает строку как кортеж строк — для отрисовки окна таблицы."""
+        return tuple(self.columns[field][i] for field in self.fields)
+
+    @property
+    def nbytes(self):
+        """Приблизительный объем памяти, занимаемый данными."""
+        total = 0
+        for column in self.columns.values():
+            if isinstance(column, CategoricalColumn):
+                total += column.nbytes
+            else:
+                # StringDType хранит короткие строки внутри 16-байтового элемента
+                total += column.nbytes + int(np.strings.str_len(column).sum())
+        return total + sum(arr.nbytes for arr in self.numeric.values())
+
+    def _lowered(self, field):
+        """Категории колонки в нижнем регистре (для поиска подстроки)."""
+        if field not in self._lower:
+            self._lower[field] = np.strings.lower(self.columns[field].categories)
+        return self._lower[field]
+
+    def _search_text(self, field):
+        """
+        Текст колонки для поиска подстроки: значения в нижнем регистре одной
+        строкой через NUL (в тексте PostgreSQL его не бывает, поэтому совпадение
+        не захватывает соседние значения) и позиции начала каждого значения.
+
+        Returns:
+            tuple: (str, список позиций длиной len(self) + 1)
+        """
+        if field not in self._lower:
+            column = self.columns[field]
+            values = column.tolist()
+            text = "\0".join(values).lower()
+            lengths = np.strings.str_len(column).astype(np.int64)
+            if len(text) != int(lengths.sum()) + max(len(values) - 1, 0):
+                # lower() изменил длину некоторых значений (например, «İ»)
+                values = [value.lower() for value in values]
+                text = "\0".join(values)
+                lengths = np.fromiter(map(len, values), dtype=np.int64, count=len(values))
+            starts = np.zeros(len(values) + 1, dtype=np.int64)
+            np.cumsum(lengths + 1, out=starts[1:])
+            self._lower[field] = (text, starts.tolist())
+        return self._lower[field]
+
+    def _find_rows(self, field, text, pending):
+        """
+        Добавляет в маску pending-строк совпадения text (уже в нижнем регистре)
+        в значении поля. Редкие совпадения находятся str.find по тексту колонки;
+        если совпадений много, обход в Python медленнее векторного поиска по
+        строкам, еще не попавшим в результат.
+
+        Args:
+            field (str): Поле.
+            text (str): Искомая подстрока.
+            pending (np.ndarray): Маска строк без совпадения; обновляется на месте.
+        """
+        rows = np.flatnonzero(pending)
+        if len(rows) < len(self) // 2:
+            # Без совпадения осталась меньшая часть строк — проверяем только их
+            found = np.strings.find(np.strings.lower(self.columns[field][rows]), text) >= 0
+            pending[rows[found]] = False
+            return
+        haystack, starts = self._search_text(field)
+        find = haystack.find
+        position = find(text)
+        budget = len(self) // BROAD_MATCH_RATIO
+        while position >= 0:
+            if budget == 0:
+                column = self.columns[field]
+                pending &= self._chunked(
+                    lambda start, stop: np.strings.find(np.strings.lower(column[start:stop]), text) < 0
+                )
+                return
+            budget -= 1
+            row = bisect_right(starts, position) - 1
+            pending[row] = False
+            # Следующее совпадение ищем уже со следующей строки
+            position = find(text, starts[row + 1])
+
+    def _chunked(self, func):
+        """
+        Применяет func(start, stop) -> bool-маска к частям массива в пуле потоков
+        и склеивает результат. Строковые ufunc numpy отпускают GIL.
+        """
+        n = len(self)
+        workers = os.cpu_count() or 1
+        if n < PARALLEL_THRESHOLD or workers == 1:
+            return func(0, n)
+        bounds = np.linspace(0, n, workers + 1, dtype=np.int64)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            parts = pool.map(lambda b: func(b[0], b[1]), zip(bounds[:-1], bounds[1:]))
+            return np.concatenate(list(parts))
+
+    def contains_mask(self, text, fields=None):
+        """
+        Маска строк, в которых хотя бы одно из полей содержит text (без учета регистра).
+        """
+        text = text.lower()
+        fields = fields or self.fields
+        mask = np.zeros(len(self), dtype=bool)
+        if "\0" in text:
+            return mask
+        plain = []
+        for field in fields:
+            column = self.columns[field]
+            if isinstance(column, CategoricalColumn):
+                mask |= column.match_codes(np.strings.find(self._lowered(field), text) >= 0)
+            else:
+                plain.append(field)
+        pending = ~mask
+        for field in plain:
+            if not pending.any():
+                break
+            self._find_rows(field, text, pending)
+        return ~pending
+
+    def equals_mask(self, field, value):
+        """Маска строк, где поле равно value."""
+        column = self.columns[field]
+        if isinstance(column, CategoricalColumn):
+            return column.match_codes(column.categories == value)
+        return self._chunked(lambda start, stop: column[start:stop] == value)
+
+    def range_mask(self, field, low=None, high=None):
+        """Маска строк, где числовое значение поля лежит в [low, high]."""
+        values = self.numeric[field]
+        mask = ~np.isnan(values)
+        if low is not None:
+            mask &= values >= low
+        if high is not None:
+            mask &= values <= high
+        return mask
+
+    def sort_order(self, field, descending=False):
+        """
+        Перестановка строк, упорядочивающая их по полю (кэшируется по полю и направлению).
+        Для числовых полей сортировка по значению, пустые и нечисловые — в конце.
+
+        Returns:
+            np.ndarray: Индексы всех строк в порядке сортировки.
+        """
+        key = (field, descending)
+        if key not in self._sort_cache:
+            if field in self.numeric:
+                values = self.numeric[field]
+                order = np.argsort(-values if descending else values, kind='stable')
+            else:
+                column = self.columns[field]
+                if isinstance(column, CategoricalColumn):
+                    # Категории отсортированы np.unique, поэтому код равен рангу
+                    values = column.codes
+                else:
+                    values = column
+                order = np.argsort(values, kind='stable')
+                if descending:
+                    order = order[::-1]
+            self._sort_cache[key] = order
+        return self._sort_cache[key]
+
+    def order(self, index, field, descending=False):
+        """
+        Упорядочивает отфильтрованные индексы по полю, используя кэш перестановок.
+
+        Args:
+            index (np.ndarray): Индексы строк (результат filter).
+            field (str): Поле сортировки.
+            descending (bool): По убыванию.
+
+        Returns:
+            np.ndarray: Те же индексы в порядке сортировки.
+        """
+        permutation = self.sort_order(field, descending)
+        if len(index) == len(self):
+            return permutation
+        selected = np.zeros(len(self), dtype=bool)
+        selected[index] = True
+        return permutation[selected[permutation]]
+
+    def filter(self, search=None, equals=None, ranges=None):
+        """
+        Применяет фильтры и возвращает индексы подходящих строк.
+
+        Args:
+            search (str): Подстрока для поиска по всем полям.
+            equals (dict): Поле -> точное значение.
+            ranges (dict): Поле -> (min, max) для числовых полей.
+
+        Returns:
+            np.ndarray: Индексы строк (int64) в исходном порядке.
+        """
+        mask = None
+        if search:
+            mask = self.contains_mask(search)
+        for field, value in (equals or {}).items():
+            part = self.equals_mask(field, value)
+            mask = part if mask is None else mask & part
+        for field, (low, high) in (ranges or {}).items():
+            part = self.range_mask(field, low, high)
+            mask = part if mask is None else mask & part
+        if mask is None:
+            return np.arange(len(self), dtype=np.int64)
+        return np.flatnonzero(mask)
@@ -1,13 +1,15 @@
 import tkinter as tk
-import tkinter.font as tkFont
 from tkinter import ttk, messagebox
 import datetime
-from config import FIELDS_TS_ENG, FIELDS_TS_RU, LIST_TOKEN, SHEET_TO_TABLE
+from config import FIELDS_TS_ENG, FIELDS_TS_RU, LIST_TOKEN, OPERATOR_NAME, SHEET_TO_TABLE
 import db
-import logging
-from psycopg2 import sql
+from dataset_cache import shared_cache
+from history import CustomerHistoryWindow, history_keys
+from row_store import RowStore
+from virtual_tree import VirtualTreeview
+from logger import get_logger
 
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
 class SearchEditTab:
     """
@@ -16,30 +18,38 @@ class SearchEditTab:
     Атрибуты:
         parent (tk.Widget): Родительский виджет.
         db (db.Database): Объект базы данных.
+        cache (DatasetCache): Общий кэш загруженных листов.
         selected_sheet (tk.StringVar): Переменная для выбранного листа.
         search_var (tk.StringVar): Переменная для строки поиска.
+        include_archive_var (tk.BooleanVar): Загружать также архивные записи.
         base_field_names (list): Исходные имена полей на английском.
         base_field_titles (list): Заголовки колонок на русском.
         title_to_field (dict): Соответствие заголовка и внутреннего имени поля.
         columns (list): Названия колонок текущей таблицы.
-        all_data (list): Полные данные, загруженные из базы.
+        all_data (RowStore): Полные данные, загруженные из базы (колоночное хранилище).
+        sort_field (str): Поле сортировки.
+        sort_desc (bool): Сортировка по убыванию.
         frame (ttk.Frame): Основной контейнер вкладки.
         sheet_combo (ttk.Combobox): Выпадающий список листов.
-        tree (ttk.Treeview): Таблица для отображения данных.
+        view (VirtualTreeview): Виртуальная таблица, хранящая строки в памяти.
+        tree (ttk.Treeview): Таблица для отображения видимого окна данных.
     """
-    def __init__(self, parent, db: db.Database):
+    def __init__(self, parent, db: db.Database, cache=None):
         """
         Инициализация вкладки поиска и редактирования.
         
         Args:
             parent (tk.Widget): Родительский виджет.
             db (db.Database): Объект базы данных.
+            cache (DatasetCache): Кэш листов (по умолчанию общий).
         """
         self.parent = parent
         self.db = db
+        self.cache = cache or shared_cache
 
         self.selected_sheet = tk.StringVar()
         self.search_var = tk.StringVar()
+        self.include_archive_var = tk.BooleanVar(value=False)
 
         self.base_field_names = FIELDS_TS_ENG
         self.base_field_titles = FIELDS_TS_RU  
@@ -47,22 +57,14 @@ class SearchEditTab:
         self.title_to_field = dict(zip(self.base_field_titles, self.base_field_names))
 
         self.columns = []
-        self.all_data = []
+        self.all_data = RowStore.from_rows(self.base_field_names, [])
+        self.sort_field = "id"
+        self.sort_desc = True
 
         self.setup_ui()
 
     def auto_adjust_column_widths(self):
-        font = tkFont.Font()  # Можно указать шрифт, если есть
-        for col in self.tree['columns']:
-            max_width = 0
-            # Проходим по всем строкам в колонке
-            for item in self.tree.get_children():
-                cell_value = self.tree.set(item, col)
-                width = font.measure(str(cell_value))
-                if width > max_width:
-                    max_width = width
-            # добавляем небольшой запас
-            self.tree.column(col, width=max_width + 10, minwidth=max_width+10)
+        self.view.auto_adjust_column_widths()
 
     def setup_ui(self):
         """
@@ -88,26 +90,28 @@ class SearchEditTab:
         #btn_frame = ttk.Frame(self.frame)
         #btn_frame.pack(fill='x', padx=10, pady=5)
 
-        ttk.Button(top_frame, text="Обновить данные", command=self.load_data).pack(side='left', padx=15)
+        ttk.Checkbutton(top_frame, text="Включая архив", variable=self.include_archive_var,
+                        command=self.load_data).pack(side='left', padx=5)
+
+        ttk.Button(top_frame, text="Обновить данные", command=lambda: self.load_data(force=True)).pack(side='left', padx=15)
 
-        self.tree = ttk.Treeview(self.frame, columns=self.columns, show='headings')
+        # Виртуальная таблица со своими скроллами
+        self.view = VirtualTreeview(self.frame, columns=self.columns)
+        self.tree = self.view.tree
         for col in self.columns:
             self.tree.heading(col, text=col)
             self.tree.column(col, width=150, anchor='w')
-        self.tree.pack(fill='both', expand=True, padx=10, pady=5)
-
-        # Скроллы
-        h_scrollbar = ttk.Scrollbar(self.frame, orient="horizontal", command=self.tree.xview)
-        self.tree.configure(xscrollcommand=h_scrollbar.set)
-        h_scrollbar.pack(fill='x')
+        self.view.pack(fill='both', expand=True, padx=10, pady=5)
 
         self.tree.bind('<Double-1>', self.on_double_click)
 
         # Добавляем кнопку удаления
-        delete_button = ttk.Button(self.frame, text="Удалить выбранную строку", command=self.delete_selected_row)
-        delete_button.pack(pady=5)
+        bottom_frame = ttk.Frame(self.frame)
+        bottom_frame.pack(pady=5)
+        delete_button = ttk.Button(bottom_frame, text="Удалить выбранную строку", command=self.delete_selected_row)
+        delete_button.pack(side='left', padx=5)
+        ttk.Button(bottom_frame, text="История клиента", command=self.open_history).pack(side='left', padx=5)
 
-        self.all_data = []
         self.load_data_and_update_fields()
 
     def get_current_fields(self):
@@ -139,11 +143,34 @@ class SearchEditTab:
             self.tree.column(col, width=width, stretch=True)
 
         self.title_to_field = dict(zip(titles, fields))
+        self.view.bind_sort(self.sort_by)
+        self.update_sort_headings()
         self.load_data()
 
-    def load_data(self, event=None):
+    def update_sort_headings(self):
+        field_to_title = {field: title for title, field in self.title_to_field.items()}
+        self.view.show_sort(field_to_title.get(self.sort_field), self.sort_desc)
+
+    def sort_by(self, title):
         """
-        Загружает данные из базы данных и отображает их в таблице.
+        Сортирует таблицу по колонке; повторный клик меняет направление.
+        Сортировка выполняется в памяти по кэшированной перестановке.
+        """
+        field = self.title_to_field[title]
+        if field == self.sort_field:
+            self.sort_desc = not self.sort_desc
+        else:
+            self.sort_field = field
+            self.sort_desc = False
+        self.update_sort_headings()
+        self.filter_data()
+
+    def load_data(self, event=None, force=False):
+        """
+        Загружает данные листа (из кэша, если таблица не менялась) и отображает их в таблице.
+
+        Args:
+            force (bool): Перечитать данные из базы без проверки кэша.
         """
         sheet_name = self.sheet_combo.get()
         table_name = SHEET_TO_TABLE.get(sheet_name)
@@ -154,48 +181,41 @@ class SearchEditTab:
             if not self.db.is_connected():
                 logger.info("Выбрал лист и не было подключения")
                 self.db.connect()
-            with self.db.conn.cursor() as cur:
-                fields, _ = self.get_current_fields()
-                query = sql.SQL("SELECT {} FROM {} ORDER BY id DESC").format(
-                    sql.SQL(', ').join(map(sql.Identifier, fields)),
-                    sql.Identifier(table_name)
-                )
-                cur.execute(query)
-                rows = cur.fetchall()
-                self.all_data = rows
-                self.tree.delete(*self.tree.get_children())
-                for row in rows:
-                    self.tree.insert('', 'end', values=row)
-                self.auto_adjust_column_widths()
+            fields, _ = self.get_current_fields()
+            if self.sort_field not in fields:
+                self.sort_field = "id"
+            # Сортировка выполняется в памяти по кэшированной перестановке
+            self.all_data = self.cache.get(
+                self.db, table_name, fields,
+                include_archive=self.include_archive_var.get(), force=force
+            )
+            self.filter_data()
+            self.auto_adjust_column_widths()
         except Exception as e:
             messagebox.showerror("Ошибка", str(e))
             logger.exception("Ошибка при загрузке данных таблицы")
 
     def filter_data(self):
         """
-        Фильтрует загруженные данные по строке поиска и отображает их.
+        Фильтрует загруженные данные по строке поиска и отображает их
+        в текущем порядке сортировки.
         """
-        search_text = self.search_var.get().lower()
-
-        filtered = []
-
-        for row in self.all_data:
-            match_search = search_text in ' '.join(map(str, row)).lower()
-
-            date_in_range = True  # Можно добавить фильтр по дате, если нужно
-
-            if match_search and date_in_range:
-                filtered.append(row)
-
-        self.populate_table(filtered)
-
-    def populate_table(self, data):
+        search_text = self.search_var.get().strip()
+        # Фильтрация векторная, в таблицу передаются только индексы строк
+        index = self.all_data.filter(search=search_text)
+        if self.sort_field in self.all_data.fields:
+            index = self.all_data.order(index, self.sort_field, self.sort_desc)
+        self.populate_table(self.all_data, index)
+
+    def populate_table(self, data, index=None):
         """
         Обновляет таблицу отображением переданных данных.
+
+        Args:
+            data (Sequence): Строки или RowStore.
+            index (np.ndarray | None): Индексы отображаемых строк.
         """
-        self.tree.delete(*self.tree.get_children())
-        for row in data:
-            self.tree.insert('', 'end', values=row)
+        self.view.set_rows(data, index=index)
 
     def get_entry_value(self, entry_widget):
         """
@@ -264,24 +284,34 @@ class SearchEditTab:
             try:
                 if not self.db.is_connected():
                     self.db.connect()
-                with self.db.conn.cursor() as cur:
-                    set_clauses = [sql.SQL("{} = %s").format(sql.Identifier(k)) for k in updated_data.keys()]
-                    query = sql.SQL("UPDATE {} SET {} WHERE id=%s").format(
-                        sql.Identifier(table_name),
-                        sql.SQL(', ').join(set_clauses)
-                    )
-                    cur.execute(query, list(updated_data.values()) + [record_id])
-                self.db.conn.commit()
+                # Архивные строки (при «Включая архив») обновляются в архивной таблице
+                if not self.db.update_record(table_name, record_id, updated_data, raise_errors=True,
+                                             include_archive=self.include_archive_var.get(), operator=OPERATOR_NAME):
+                    messagebox.showerror("Ошибка", f"Запись id={record_id} не найдена или закреплена за другим трейдером")
+                    return
+                self.cache.invalidate(table_name)
                 messagebox.showinfo("Успех", "Данные сохранены")
                 self.load_data()
                 edit_win.destroy()
             except Exception as e:
-                self.db.conn.rollback()
                 messagebox.showerror("Ошибка", str(e))
                 logger.exception("Ошибка при сохранении изменений")
 
         ttk.Button(edit_win, text="Сохранить", command=save).grid(row=len(columns), column=0, columnspan=2, pady=10)
 
+    def open_history(self):
+        """
+        Открывает историю клиента выбранной строки (по ID клиента и адресам на всех листах).
+        """
+        selected_item = self.tree.focus()
+        if not selected_item:
+            messagebox.showwarning("История клиента", "Выберите строку")
+            return
+        values = self.tree.item(selected_item, 'values')
+        record = {self.title_to_field[col]: value for col, value in zip(self.tree["columns"], values)}
+        user_id, addresses = history_keys(record)
+        CustomerHistoryWindow(self.parent, self.db, user_id, addresses)
+
     def delete_selected_row(self):
         """
         Удаляет выбранную строку из базы данных и таблицы.
@@ -305,13 +335,12 @@ class SearchEditTab:
         try:
             if not self.db.is_connected():
                 self.db.connect()
-            with self.db.conn.cursor() as cur:
-                query = sql.SQL("DELETE FROM {} WHERE id=%s").format(sql.Identifier(table_name))
-                cur.execute(query, (record_id,))
-            self.db.conn.commit()
+            if not self.db.delete_record(table_name, record_id, include_archive=self.include_archive_var.get()):
+                messagebox.showerror("Ошибка", f"Запись id={record_id} не найдена")
+                return
+            self.cache.invalidate(table_name)
             messagebox.showinfo("Удалено", "Строка успешно удалена")
             self.load_data()
         except Exception as e:
-            self.db.conn.rollback()
             messagebox.showerror("Ошибка", f"Ошибка при удалении: {e}")
             logger.exception("Ошибка при удалении строки")
\ No newline at end of file
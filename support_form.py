@@ -5,7 +5,7 @@ import sys
 import tkinter as tk
 from tkinter import ttk, messagebox
 from tkinter import simpledialog
-from venv import logger
+from logger import get_logger
 from db import Database
 from config import (DISABLED_FIELDS, 
                     LIST_TOKEN, 
@@ -15,6 +15,11 @@ from config import (DISABLED_FIELDS,
                     FIELDS,
                 )
 from error_handler import handle_exception
+from batch_entry import BatchEntryWindow
+from history import CustomerHistoryWindow
+from validation import FORM_FIELDS, VALIDATED_FIELDS, validate_form
+
+logger = get_logger(__name__)
 
 REASONS_FILE = 'reasons.json'
 
@@ -40,20 +45,24 @@ class SupportForm:
         fields (list): Список названий полей формы.
         entries (dict): Словарь соответствия полей и виджетов ввода.
         current_table (str): Название текущей выбранной таблицы.
+        hints (dict): Подписи с ошибками проверки адресов и хэшей по полям.
+        outbox (Outbox): Локальная очередь заявок; если не задана, запись идет напрямую в БД.
     """
-    def __init__(self, parent, db):
+    def __init__(self, parent, db, outbox=None):
         """
         Инициализирует объект формы поддержки.
         
         Args:
             parent (tk.Widget): Родительский виджет.
             db (Database): Объект базы данных.
+            outbox (Outbox): Локальная очередь заявок.
         """
         super().__init__()
         self.parent = parent
         self.reasons = load_reasons()
         self.sheet_options = []
         self.db = db
+        self.outbox = outbox
 
         # Поля ввода
         self.frame = ttk.Frame(self.parent)
@@ -87,10 +96,22 @@ class SupportForm:
                 entry = tk.Entry(self.frame, width=50)
                 entry.grid(row=i, column=1, padx=10, pady=5)
                 self.entries[text] = entry
+                if text == "ID Клиента":
+                    tk.Button(self.frame, text="История", command=self.open_history).grid(row=i, column=2, padx=5, sticky="w")
+
+        # Адреса и хэши проверяются по сети листа прямо при вводе; подсказка
+        # занимает колонку 2 только у проверяемых полей (у остальных там кнопки)
+        self.hints = {}
+        for text in self.fields:
+            if FORM_FIELDS.get(text) in VALIDATED_FIELDS and text not in DISABLED_FIELDS:
+                self.bind_validation(text)
 
         self.btn_add = tk.Button(self.frame, text="Добавить данные", command=self.submit_data)
         self.btn_add.grid(row=len(self.fields)+2, columnspan=2, padx=10, pady=10)
 
+        self.btn_batch = tk.Button(self.frame, text="Пакетный ввод", command=self.open_batch_entry)
+        self.btn_batch.grid(row=len(self.fields)+2, column=2, padx=5, pady=10)
+
         # Лист выбора
         ttk.Label(self.frame, text="Выберите лист").grid(row=len(self.fields)+1, column=0, padx=10, pady=5, sticky="e")
         self.combo_sheet_name = ttk.Combobox(self.frame, values=LIST_TOKEN)
@@ -119,12 +140,14 @@ class SupportForm:
                 row_idx = self.fields.index("Мемо")
                 self.memo_entry.grid(row=row_idx, column=1, padx=10, pady=5)
                 self.entries["Мемо"] = self.memo_entry
+                self.bind_validation("Мемо")
         else:
             if hasattr(self, 'memo_label'):
                 self.memo_label.destroy()
                 del self.memo_label
             if hasattr(self, 'memo_entry'):
                 self.memo_entry.destroy()
+                self.hints.pop("Мемо").destroy()
                 del self.entries["Мемо"]
                 self.fields.remove("Мемо")
                 del self.memo_entry
@@ -156,6 +179,36 @@ class SupportForm:
             token_entry.insert(0, token_value)
             token_entry.configure(state='readonly')
         self.update_fields_for_sheet()
+        for name in self.hints:
+            self.validate_field(name)
+
+    def bind_validation(self, name):
+        """
+        Подключает мгновенную проверку поля: ошибка подсвечивает поле
+        и выводится справа от него.
+
+        Args:
+            name (str): Название поля формы.
+        """
+        entry = self.entries[name]
+        hint = ttk.Label(self.frame, foreground='#b02a37')
+        hint.grid(row=self.fields.index(name), column=2, padx=5, sticky="w")
+        self.hints[name] = hint
+        entry.bind('<KeyRelease>', lambda e, n=name: self.validate_field(n), add='+')
+        entry.bind('<FocusOut>', lambda e, n=name: self.validate_field(n), add='+')
+
+    def validate_field(self, name):
+        """
+        Проверяет значение поля по сети выбранного листа.
+
+        Returns:
+            str: Текст ошибки или None.
+        """
+        entry = self.entries[name]
+        error = validate_form(self.get_selected_sheet(), {name: entry.get().strip()}).get(name)
+        entry.configure(background='#f8d7da' if error else 'white')
+        self.hints[name].configure(text=error or "")
+        return error
 
     def submit_data(self):
         """
@@ -187,12 +240,21 @@ class SupportForm:
                     messagebox.showerror("Ошибка", f"Поле '{field}' обязательно для заполнения")
                     return
 
+            errors = validate_form(self.get_selected_sheet(), data)
+            if errors:
+                messagebox.showerror("Ошибка", "Проверьте поля:\n" + "\n".join(f"{k}: {v}" for k, v in errors.items()))
+                return
+
             data["ХЭШ ВОЗВРАТА"] = ""
             data["Возврат сделан (+)"] = ""
             data["Статус"] = "Возврат не сделан"
 
             table_name = SHEET_TO_TABLE.get(self.current_table)
-            if table_name:
+            if table_name and self.outbox is not None:
+                # Заявка сохраняется локально и уходит в БД фоновым потоком
+                self.outbox.enqueue(table_name, data)
+                messagebox.showinfo("Успех", "Заявка принята и будет отправлена в базу.")
+            elif table_name:
                 if not self.db.is_connected():
                     self.db.connect()
                 self.db.insert_support_data(table_name, data)
@@ -203,6 +265,19 @@ class SupportForm:
         except Exception:
             handle_exception(*sys.exc_info())
 
+    def open_history(self):
+        """
+        Открывает историю клиента по введенным ID клиента и адресам.
+        """
+        addresses = [self.entries[name].get().strip() for name in ("Адрес отправителя", "Адрес возврата")]
+        CustomerHistoryWindow(self.frame, self.db, self.entries["ID Клиента"].get().strip(), [a for a in addresses if a])
+
+    def open_batch_entry(self):
+        """
+        Открывает окно пакетного ввода заявок из буфера обмена для выбранного листа.
+        """
+        BatchEntryWindow(self.frame, self.db, self.get_selected_sheet())
+
     def clear_form(self):
         """
         Очищает все поля формы и сбрасывает токен в соответствии с выбранным листом.
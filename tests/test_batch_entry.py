@@ -0,0 +1,59 @@
+from batch_entry import build_record, input_columns, parse_clipboard, validate_row
+from config import FIELDS, STATUS_PENDING, TOKEN_MAPPING
+
+COLUMNS = ["ФИО", "Номер", "Дата"]
+
+
+def test_tab_separated_rows():
+    text = "Иванов\t1\t01.01.2025\r\nПетров\t2\t02.01.2025\r\n"
+    assert parse_clipboard(text, COLUMNS) == [["Иванов", "1", "01.01.2025"], ["Петров", "2", "02.01.2025"]]
+
+
+def test_header_row_is_skipped():
+    text = "фио\tНомер\tДата\nИванов\t1\t01.01.2025"
+    assert parse_clipboard(text, COLUMNS) == [["Иванов", "1", "01.01.2025"]]
+
+
+def test_short_and_long_rows_are_aligned_to_columns():
+    text = "Иванов\t1\nПетров\t2\t02.01.2025\tлишнее"
+    assert parse_clipboard(text, COLUMNS) == [["Иванов", "1", ""], ["Петров", "2", "02.01.2025"]]
+
+
+def test_blank_tab_rows_are_dropped():
+    assert parse_clipboard("Иванов\t1\t01.01.2025\n\t\t\n", COLUMNS) == [["Иванов", "1", "01.01.2025"]]
+
+
+def test_quoted_cell_with_tab_and_newline():
+    text = 'Иванов\t"1\tи\n2"\t01.01.2025'
+    assert parse_clipboard(text, COLUMNS) == [["Иванов", "1\tи\n2", "01.01.2025"]]
+
+
+def test_lines_grouped_by_blank_lines():
+    text = "Иванов\n1\n\nПетров\n2\n02.01.2025\n"
+    assert parse_clipboard(text, COLUMNS) == [["Иванов", "1", ""], ["Петров", "2", "02.01.2025"]]
+
+
+def test_lines_taken_by_column_count():
+    text = "Иванов\n1\n01.01.2025\nПетров\n2"
+    assert parse_clipboard(text, COLUMNS) == [["Иванов", "1", "01.01.2025"], ["Петров", "2", ""]]
+
+
+def test_empty_text():
+    assert parse_clipboard("", COLUMNS) == []
+    assert parse_clipboard(" \n\r\n", COLUMNS) == []
+
+
+def test_memo_column_only_for_ton_sheets():
+    assert input_columns("TON")[-1] == "Мемо"
+    assert "Мемо" not in input_columns("BTC - Bitcoin")
+    assert "Токен" not in input_columns("TON")
+
+
+def test_required_fields_and_record_shape():
+    columns = input_columns("BTC - Bitcoin")
+    values = [""] * len(columns)
+    assert validate_row(values, columns)
+    data = build_record(values, columns, "BTC - Bitcoin")
+    assert list(data) == [f for f in FIELDS if f != "Мемо"]
+    assert data["Токен"] == TOKEN_MAPPING["BTC - Bitcoin"]
+    assert data["Статус"] == STATUS_PENDING
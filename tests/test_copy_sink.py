@@ -0,0 +1,45 @@
+import pytest
+
+from db import CopyColumnSink
+
+FIELDS = ["id", "fio", "memo"]
+
+# Строки в текстовом формате COPY: NULL — \N, спецсимволы экранированы
+COPY_DATA = (
+    b"1\t\xd0\x98\xd0\xb2\xd0\xb0\xd0\xbd\t\\N\n"
+    b"2\ta\\tb\\nc\tback\\\\slash\n"
+    b"3\t\\\\N\t\\N\n"
+    b"4\t\\N\t\n"
+)
+EXPECTED = {
+    "id": ["1", "2", "3", "4"],
+    "fio": ["Иван", "a\tb\nc", "\\N", ""],
+    "memo": ["", "back\\slash", "", ""],
+}
+
+
+def feed(data, step, chunk_size):
+    sink = CopyColumnSink(FIELDS, chunk_size=chunk_size)
+    for start in range(0, len(data), step):
+        sink.write(data[start:start + step])
+    return sink.finish()
+
+
+def test_parses_nulls_and_escapes():
+    assert feed(COPY_DATA, len(COPY_DATA), 1 << 20) == EXPECTED
+
+
+@pytest.mark.parametrize("step", [1, 2, 3, 7, 16])
+@pytest.mark.parametrize("chunk_size", [1, 5, 32])
+def test_chunks_split_anywhere(step, chunk_size):
+    # Границы write и пачек разбора попадают внутрь строк, escape-пар и UTF-8 символов
+    assert feed(COPY_DATA, step, chunk_size) == EXPECTED
+
+
+def test_empty_stream():
+    assert feed(b"", 1, 1) == {field: [] for field in FIELDS}
+
+
+def test_wrong_column_count():
+    with pytest.raises(ValueError):
+        feed(b"1\tx\n", 4, 1 << 20)
@@ -0,0 +1,74 @@
+import os
+from decimal import Decimal
+
+import psycopg2
+import pytest
+from psycopg2 import sql
+
+from db import keyset_condition
+
+AMOUNTS = [None, Decimal("1.5"), Decimal("NaN"), Decimal("Infinity"), Decimal("-Infinity"), Decimal("1.5"),
+           None, Decimal("0"), Decimal("NaN"), Decimal("-2"), Decimal("Infinity"), None]
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_null_cursor_has_only_id_param(descending):
+    _, params = keyset_condition(sql.Identifier("amount"), descending, None, 7)
+    assert params == [7]
+
+
+@pytest.mark.parametrize("key", [Decimal("NaN"), Decimal("Infinity"), Decimal("-Infinity"), Decimal("sNaN")])
+def test_non_finite_cursor_passed_as_text(key):
+    _, params = keyset_condition(sql.Identifier("amount"), False, key, 7)
+    assert params == [str(key), 7]
+    assert isinstance(params[0], str)
+
+
+def test_finite_cursor_kept():
+    _, params = keyset_condition(sql.Identifier("amount"), True, Decimal("1.50"), 7)
+    assert params == [Decimal("1.50"), 7]
+
+
+@pytest.fixture
+def conn():
+    """Подключение к тестовой БД из SUPPORT_APP_TEST_DSN (без него тесты с БД пропускаются)."""
+    dsn = os.environ.get("SUPPORT_APP_TEST_DSN")
+    if not dsn:
+        pytest.skip("SUPPORT_APP_TEST_DSN не задан")
+    try:
+        connection = psycopg2.connect(dsn)
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"БД недоступна: {e}")
+    with connection.cursor() as cur:
+        cur.execute("CREATE TEMP TABLE keyset_rows (id integer PRIMARY KEY, amount numeric)")
+        cur.executemany("INSERT INTO keyset_rows VALUES (%s, %s)",
+                        [(i, None if a is None else str(a)) for i, a in enumerate(AMOUNTS, start=1)])
+    yield connection
+    connection.rollback()
+    connection.close()
+
+
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize("page_size", [1, 2, 5])
+def test_pages_match_full_order(conn, descending, page_size):
+    amount = sql.Identifier("amount")
+    order = sql.SQL(" ORDER BY amount {}, id {}").format(
+        sql.SQL("DESC NULLS FIRST" if descending else "ASC NULLS LAST"), sql.SQL("DESC" if descending else "ASC")
+    )
+    with conn.cursor() as cur:
+        cur.execute(sql.SQL("SELECT id, amount FROM keyset_rows") + order)
+        expected = cur.fetchall()
+        pages, after = [], None
+        # Неверный курсор может возвращать ту же страницу бесконечно
+        for _ in range(len(expected) + 1):
+            query, params = sql.SQL("SELECT id, amount FROM keyset_rows"), []
+            if after is not None:
+                condition, params = keyset_condition(amount, descending, after[1], after[0])
+                query += sql.SQL(" WHERE ") + condition
+            cur.execute(query + order + sql.SQL(" LIMIT %s"), params + [page_size])
+            rows = cur.fetchall()
+            pages.extend(rows)
+            if len(rows) < page_size:
+                break
+            after = rows[-1]
+    assert [row[0] for row in pages] == [row[0] for row in expected]
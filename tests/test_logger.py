@@ -0,0 +1,40 @@
+import json
+import logging
+import queue
+import sys
+
+from logger import JsonFormatter, _QueueHandler
+
+
+def _queued_record(exc_info):
+    q = queue.SimpleQueue()
+    handler = _QueueHandler(q)
+    record = logging.LogRecord("support_app.test", logging.ERROR, __file__, 1, "ошибка %s", ("x",), exc_info)
+    handler.handle(record)
+    return q.get_nowait()
+
+
+def test_exception_goes_to_separate_field():
+    try:
+        1 / 0
+    except ZeroDivisionError:
+        record = _queued_record(sys.exc_info())
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["message"] == "ошибка x"
+    assert "ZeroDivisionError" in entry["exc"]
+    assert "Traceback" not in entry["message"]
+
+
+def test_console_format_keeps_traceback():
+    try:
+        1 / 0
+    except ZeroDivisionError:
+        record = _queued_record(sys.exc_info())
+    text = logging.Formatter("%(message)s").format(record)
+    assert text.startswith("ошибка x\nTraceback")
+
+
+def test_record_without_exception():
+    entry = json.loads(JsonFormatter().format(_queued_record(None)))
+    assert entry["message"] == "ошибка x"
+    assert "exc" not in entry
@@ -0,0 +1,85 @@
+import psycopg2
+import pytest
+
+from api_client import ApiError
+from outbox import MAX_ATTEMPTS, Outbox, OutboxFlusher, is_transient
+
+
+class FakeDatabase:
+    """Отклоняет заявки из rejected ошибкой error, остальные принимает."""
+    def __init__(self, error, rejected):
+        self.error = error
+        self.rejected = rejected
+        self.inserted = []
+        self.closed = 0
+
+    def is_connected(self):
+        return True
+
+    def connect(self):
+        pass
+
+    def close(self):
+        self.closed += 1
+
+    def insert_support_batch(self, rows):
+        if any(data.get("fio") in self.rejected for _, _, data in rows):
+            raise self.error
+        self.inserted.extend(key for _, key, _ in rows)
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    box = Outbox(str(tmp_path / "outbox.db"))
+    yield box
+    box.close()
+
+
+def make_flusher(outbox, error, rejected=("bad",)):
+    flusher = OutboxFlusher(outbox, "dbname=unused", interval=0.01)
+    flusher.db = FakeDatabase(error, set(rejected))
+    return flusher
+
+
+@pytest.mark.parametrize("error, transient", [
+    (ApiError(400, "bad"), False),
+    (ApiError(404, "table"), False),
+    (ApiError(422, "data"), False),
+    (ApiError(401, "token"), True),
+    (ApiError(429, "busy"), True),
+    (ApiError(500, "server"), True),
+    (ApiError(503, "db down"), True),
+    (psycopg2.OperationalError("down"), True),
+    (ConnectionError("refused"), True),
+    (psycopg2.DataError("bad value"), False),
+])
+def test_is_transient(error, transient):
+    assert is_transient(error) is transient
+
+
+def test_client_error_dead_letters_only_bad_request(outbox):
+    outbox.enqueue("t", {"fio": "ok"})
+    outbox.enqueue("t", {"fio": "bad"})
+    flusher = make_flusher(outbox, ApiError(422, "bad"))
+    for _ in range(MAX_ATTEMPTS):
+        assert flusher.flush_each(outbox.peek())
+    assert len(flusher.db.inserted) == 1
+    assert outbox.depth() == 0
+    assert outbox.dead_count() == 1
+
+
+def test_server_error_does_not_count_attempts(outbox):
+    outbox.enqueue("t", {"fio": "bad"})
+    flusher = make_flusher(outbox, ApiError(500, "server"))
+    for _ in range(MAX_ATTEMPTS + 1):
+        assert not flusher.flush_each(outbox.peek())
+    assert outbox.depth() == 1
+    assert outbox.dead_count() == 0
+
+
+def test_stop_waits_for_thread_and_closes_connection(outbox):
+    flusher = make_flusher(outbox, ApiError(500, "server"))
+    flusher.start()
+    flusher.stop()
+    assert not flusher.is_alive()
+    assert flusher.db.closed >= 1
@@ -0,0 +1,84 @@
+import datetime
+from decimal import Decimal
+
+from priority import PriorityQueue, sla_state
+
+
+def ids(queue, n=100):
+    return [record_id for record_id, _, _ in queue.top(n)]
+
+
+def test_order_matches_database():
+    # ключ DESC NULLS LAST, затем id
+    queue = PriorityQueue()
+    for record_id, key in [(1, Decimal("-5")), (2, None), (3, Decimal("-1")), (4, Decimal("-5")), (5, None)]:
+        queue.update(record_id, key, (record_id,))
+    assert ids(queue) == [3, 1, 4, 2, 5]
+    assert queue.last() == (None, 5)
+
+
+def test_remove_is_lazy():
+    queue = PriorityQueue()
+    for record_id in range(10):
+        queue.update(record_id, Decimal(record_id), (record_id,))
+    heap_size = len(queue._heap)
+    queue.remove(9)
+    queue.remove(5)
+    # Удаление не трогает кучу, устаревшие записи пропускаются при чтении
+    assert len(queue._heap) == heap_size
+    assert ids(queue, 3) == [8, 7, 6]
+    assert len(queue) == 8
+
+
+def test_update_pushes_only_changed_keys():
+    queue = PriorityQueue()
+    assert queue.update(1, Decimal("1"), ("a",))
+    assert not queue.update(1, Decimal("1"), ("b",))
+    assert len(queue._heap) == 1
+    assert queue.top(1) == [(1, Decimal("1"), ("b",))]
+    # Ключ менялся туда и обратно: в куче две записи, в выдаче одна
+    queue.update(1, Decimal("2"), ("c",))
+    queue.update(1, Decimal("1"), ("d",))
+    assert queue.top(5) == [(1, Decimal("1"), ("d",))]
+
+
+def test_top_keeps_heap():
+    queue = PriorityQueue()
+    for record_id in range(5):
+        queue.update(record_id, Decimal(record_id), ())
+    assert ids(queue, 2) == [4, 3]
+    assert ids(queue, 2) == [4, 3]
+
+
+def test_non_finite_key_goes_last():
+    queue = PriorityQueue()
+    queue.update(1, Decimal("NaN"), ())
+    queue.update(2, float("inf"), ())
+    queue.update(3, Decimal("-1"), ())
+    assert ids(queue) == [3, 1, 2]
+
+
+def test_sync_removes_missing_and_compacts():
+    queue = PriorityQueue()
+    queue.sync((i, Decimal(i), ()) for i in range(100))
+    changed = queue.sync((i, Decimal(i + 1), ()) for i in range(0, 100, 2))
+    assert changed == 50
+    assert len(queue) == 50
+    assert ids(queue, 2) == [98, 96]
+    assert len(queue._heap) <= 2 * len(queue) + 64
+
+
+def test_precedes():
+    queue = PriorityQueue()
+    assert queue.precedes(5, Decimal("2"), 1, Decimal("1"))
+    assert queue.precedes(1, Decimal("1"), 2, Decimal("1"))
+    assert queue.precedes(9, Decimal("-100"), 1, None)
+    assert not queue.precedes(2, None, 1, None)
+
+
+def test_sla_state():
+    today = datetime.date(2024, 1, 10)
+    assert sla_state("10.01.2024", today) is None
+    assert sla_state("08.01.2024", today) == "sla_warning"
+    assert sla_state("01.01.2024", today) == "sla_breach"
+    assert sla_state("bad", today) is None
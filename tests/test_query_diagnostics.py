@@ -0,0 +1,33 @@
+import pytest
+
+from query_diagnostics import can_analyze, find_seq_scans
+
+
+@pytest.mark.parametrize("sql_text", [
+    "SELECT id FROM t WHERE status = %s",
+    "  with x AS (SELECT 1) SELECT * FROM x",
+])
+def test_read_only_is_analyzed(sql_text):
+    assert can_analyze(sql_text)
+
+
+@pytest.mark.parametrize("sql_text", [
+    "SELECT id FROM t WHERE status = %s ORDER BY id LIMIT 5 FOR UPDATE SKIP LOCKED",
+    "select id from t for no key update",
+    "SELECT id FROM t FOR SHARE",
+    "SELECT id FROM t FOR KEY SHARE NOWAIT",
+    "WITH picked AS (SELECT id FROM t FOR UPDATE SKIP LOCKED) UPDATE t SET a = 1 FROM picked",
+    "UPDATE t SET a = 1",
+    "DELETE FROM t",
+])
+def test_writes_and_row_locks_are_not_analyzed(sql_text):
+    assert not can_analyze(sql_text)
+
+
+def test_find_seq_scans_on_watched_columns():
+    plan = {"Node Type": "Limit", "Plans": [
+        {"Node Type": "Seq Scan", "Relation Name": "t", "Filter": "(status = 'x'::text)"},
+        {"Node Type": "Seq Scan", "Relation Name": "u", "Filter": "(fio = 'y'::text)"},
+    ]}
+    found = find_seq_scans(plan, watch_columns=["status"])
+    assert [(s["relation"], s["columns"]) for s in found] == [("t", ["status"])]
@@ -0,0 +1,88 @@
+import datetime
+from decimal import Decimal
+
+from config import STATUS_PENDING
+from reconcile import build_pending_index, match_payouts, parse_amount
+
+EVM_ADDRESS = "0xabc0000000000000000000000000000000000001"
+
+
+class FakeDatabase:
+    """Отдает строки листов через iter_rows, как Database."""
+    def __init__(self, tables):
+        self.tables = tables
+
+    def iter_rows(self, table, fields, where=None, itersize=None):
+        assert where == {"status": STATUS_PENDING}
+        for record in self.tables.get(table, []):
+            yield tuple(record.get(field) for field in fields)
+
+
+def record(record_id, address, amount, **extra):
+    return {"id": record_id, "fio": f"Клиент {record_id}", "user_id": str(record_id), "return_address": address,
+            "receipt_amount": amount, "application_amount": amount, **extra}
+
+
+def candidate(sheet, table, record_id, address=EVM_ADDRESS, amount="10"):
+    return {"sheet": sheet, "table": table, "id": record_id, "return_address": address,
+            "receipt_amount": amount, "application_amount": amount}
+
+
+def payout(tx_hash, amount, address=EVM_ADDRESS, token=""):
+    return {"hash": tx_hash, "address": address, "amount": parse_amount(amount), "token": token}
+
+
+def index_of(*candidates):
+    index = {}
+    for c in candidates:
+        index.setdefault((c["return_address"], parse_amount(c["receipt_amount"])), []).append(c)
+    return index
+
+
+def test_unique_candidate_is_proposed():
+    index = index_of(candidate("ETH - Ethereum", "eth", 1))
+    proposals, unmatched = match_payouts([payout("0x1", "10.00")], index)
+    assert unmatched == []
+    assert [(p["table"], p["id"], p["return_hash"], p["ambiguous"]) for p in proposals] == [("eth", 1, "0x1", False)]
+
+
+def test_unmatched_amount_and_address():
+    index = index_of(candidate("ETH - Ethereum", "eth", 1))
+    payouts = [payout("0x1", "11"), payout("0x2", "10", address="0xother")]
+    proposals, unmatched = match_payouts(payouts, index)
+    assert proposals == []
+    assert [p["hash"] for p in unmatched] == ["0x1", "0x2"]
+
+
+def test_shared_address_is_ambiguous_and_not_consumed():
+    index = index_of(candidate("ETH - Ethereum", "eth", 1), candidate("USDT (ERC-20)", "usdt", 2))
+    proposals, unmatched = match_payouts([payout("0x1", "10"), payout("0x2", "10")], index)
+    assert unmatched == []
+    assert all(p["ambiguous"] for p in proposals)
+    assert [(p["payout"], p["id"]) for p in proposals] == [(0, 1), (0, 2), (1, 1), (1, 2)]
+
+
+def test_token_narrows_candidates():
+    index = index_of(candidate("ETH - Ethereum", "eth", 1), candidate("USDT (ERC-20)", "usdt", 2))
+    proposals, _ = match_payouts([payout("0x1", "10", token="USDT")], index)
+    assert [(p["table"], p["ambiguous"]) for p in proposals] == [("usdt", False)]
+
+
+def test_each_record_used_once():
+    index = index_of(candidate("ETH - Ethereum", "eth", 1))
+    proposals, unmatched = match_payouts([payout("0x1", "10"), payout("0x2", "10")], index)
+    assert [p["return_hash"] for p in proposals] == ["0x1"]
+    assert [p["hash"] for p in unmatched] == ["0x2"]
+
+
+def test_build_pending_index_skips_foreign_leases():
+    future = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(minutes=5)
+    db = FakeDatabase({"support_data_eth_-_ethereum": [
+        record(1, EVM_ADDRESS.upper().replace("0X", "0x"), "10,0"),
+        record(2, EVM_ADDRESS, "20", claimed_by="other", claimed_until=future),
+        record(3, EVM_ADDRESS, "30", claimed_by="me", claimed_until=future),
+        record(4, "", "40"),
+    ]})
+    index = build_pending_index(db, sheets=["ETH - Ethereum"], operator="me")
+    assert sorted(index) == [(EVM_ADDRESS, Decimal("1E+1")), (EVM_ADDRESS, Decimal("3E+1"))]
+    assert [c["id"] for c in index[(EVM_ADDRESS, parse_amount("10"))]] == [1]
@@ -0,0 +1,47 @@
+from api_server import ResponseCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_cache(monkeypatch, ttl=2.0, max_entries=3):
+    clock = Clock()
+    monkeypatch.setattr("api_server.time.monotonic", clock)
+    return ResponseCache(ttl, max_entries=max_entries), clock
+
+
+def test_size_is_capped_lru(monkeypatch):
+    cache, _ = make_cache(monkeypatch)
+    for key in "abc":
+        cache.put(key, "t", key)
+    assert cache.get("a") == "a"
+    cache.put("d", "t", "d")
+    assert len(cache) == 3
+    assert cache.get("b") is None
+    assert [cache.get(key) for key in "acd"] == ["a", "c", "d"]
+
+
+def test_expired_entries_purged_on_put(monkeypatch):
+    cache, clock = make_cache(monkeypatch, max_entries=100)
+    for key in range(50):
+        cache.put(key, "t", key)
+    clock.now += 1.0
+    cache.get(0)
+    clock.now += 1.5
+    cache.put("new", "t", 1)
+    assert len(cache) == 1
+    assert cache.get("new") == 1
+
+
+def test_invalidate_by_table(monkeypatch):
+    cache, _ = make_cache(monkeypatch)
+    cache.put("a", "t1", 1)
+    cache.put("b", "t2", 2)
+    cache.invalidate("t1")
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
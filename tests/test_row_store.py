@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from row_store import RowStore, parse_numbers
+
+FIELDS = ["id", "fio", "receipt_amount", "token", "status", "hash"]
+
+
+def make_rows(n=3000):
+    rows = []
+    for i in range(n):
+        rows.append((
+            i + 1,
+            f"Клиент {i} İvan" if i % 11 == 0 else f"Клиент {i}",
+            None if i % 7 == 0 else f"{i % 1000},{i % 100}",
+            "USDT (TRX)" if i % 2 else "TON",
+            "Возврат сделан" if i % 3 == 0 else "Возврат не сделан",
+            f"{i:064x}",
+        ))
+    return rows
+
+
+def naive_filter(rows, text):
+    text = text.lower()
+    return [i for i, row in enumerate(rows)
+            if any(text in ("" if value is None else str(value)).lower() for value in row)]
+
+
+@pytest.fixture(scope="module")
+def rows():
+    return make_rows()
+
+
+@pytest.fixture(scope="module")
+def store(rows):
+    return RowStore.from_rows(FIELDS, rows)
+
+
+@pytest.mark.parametrize("text", [
+    "клиент 1", "КЛИЕНТ 29", "1", "0,5", "ton", "сделан", "не сделан", "ivan", "i̇van", "ff", "zzz", "\0",
+])
+def test_filter_matches_naive_scan(store, rows, text):
+    assert store.filter(search=text).tolist() == naive_filter(rows, text)
+
+
+def test_filter_from_columns_matches_from_rows(store, rows):
+    columns = {field: ["" if v is None else str(v) for v in values] for field, values in zip(FIELDS, zip(*rows))}
+    other = RowStore.from_columns(FIELDS, columns)
+    for text in ("клиент 2", "3", "usdt"):
+        assert other.filter(search=text).tolist() == store.filter(search=text).tolist()
+
+
+def test_filter_combines_search_equals_and_ranges(store, rows):
+    index = store.filter(search="клиент 1", equals={"status": "Возврат сделан"},
+                         ranges={"receipt_amount": (100, 500)})
+    expected = [i for i in naive_filter(rows, "клиент 1")
+                if rows[i][4] == "Возврат сделан" and rows[i][2] is not None
+                and 100 <= float(rows[i][2].replace(",", ".")) <= 500]
+    assert index.tolist() == expected
+
+
+def test_parse_numbers():
+    values = ["1", "2,5", "-3.25", "1 000,5", "1 000", "", "x", "1.2.3", "--1", "5-", "NaN", "Infinity"]
+    result = parse_numbers(values)
+    expected = [1, 2.5, -3.25, 1000.5, 1000, np.nan, np.nan, np.nan, np.nan, np.nan, np.nan, np.nan]
+    np.testing.assert_array_equal(result, np.array(expected))
+
+
+def test_sort_order_of_categories(store, rows):
+    order = store.sort_order("status").tolist()
+    assert [rows[i][4] for i in order] == sorted(row[4] for row in rows)
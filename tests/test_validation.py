@@ -0,0 +1,142 @@
+import pytest
+
+from validation import (BECH32_CHARSET, BECH32_CONST, BECH32M_CONST, MEMO_MAX_BYTES, _bech32_polymod,
+                        b58decode_check, btc_address_error, evm_address_error, evm_hash_error, memo_error,
+                        ton_address_error, ton_hash_error, tron_address_error, validate_record)
+
+
+def bech32_encode(hrp, data, const):
+    """Кодирует адрес с заданной константой контрольной суммы (bech32 или bech32m)."""
+    values = [ord(c) >> 5 for c in hrp] + [0] + [ord(c) & 31 for c in hrp] + data
+    polymod = _bech32_polymod(values + [0] * 6) ^ const
+    checksum = [(polymod >> 5 * (5 - i)) & 31 for i in range(6)]
+    return hrp + "1" + "".join(BECH32_CHARSET[d] for d in data + checksum)
+
+
+def bech32_data(address):
+    """Данные адреса без контрольной суммы (версия и программа по 5 бит)."""
+    return [BECH32_CHARSET.index(c) for c in address[address.rfind("1") + 1:-6]]
+
+
+P2WPKH = "bc1qar0srrr7xfkvy5l643lydnw9re59gtzzwf5mdq"
+P2WSH = "bc1qrp33g0q5c5txsp9arysrx4k6zdkfs4nce4xj0gdcccefvpysxf3qccfmv3"
+P2TR = "bc1p0xlxvlhemja6c4dqv22uapctqupfhlxm9h8z3k2e72q4k9hcz7vqzk5jj0"
+
+
+@pytest.mark.parametrize("address", [
+    "1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNa",
+    "1BvBMSEYstWetqTFn5Au4m4GFg7xJaNVN2",
+    "3J98t1WpEZ73CNmQviecrnyiWrnqRhWNLy",
+    P2WPKH,
+    P2WPKH.upper(),
+    P2WSH,
+    P2TR,
+])
+def test_btc_valid(address):
+    assert btc_address_error(address) is None
+
+
+@pytest.mark.parametrize("address", [
+    "1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNb",  # контрольная сумма base58check
+    "1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfN0",  # 0 нет в алфавите base58
+    "TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t",  # верный base58check, но версия TRON
+    "bc1QAR0SRRR7XFKVY5L643LYDNW9RE59GTZZWF5MDQ",  # смешанный регистр
+    P2WPKH[:-1] + "p",
+    "tb1qar0srrr7xfkvy5l643lydnw9re59gtzzwf5mdq",  # тестовая сеть
+    "bc1p0xlxvlhemja6c4dqv22uapctqupfhlxm9h8z3k2e72q4k9hcz7vqh2y7hd",  # v1 с контрольной суммой bech32
+])
+def test_btc_invalid(address):
+    assert btc_address_error(address)
+
+
+def test_bech32_and_bech32m_constants_by_version():
+    v0, v1 = bech32_data(P2WPKH), bech32_data(P2TR)
+    assert bech32_encode("bc", v0, BECH32_CONST) == P2WPKH
+    assert bech32_encode("bc", v1, BECH32M_CONST) == P2TR
+    assert btc_address_error(bech32_encode("bc", v0, BECH32M_CONST)) == "неверная контрольная сумма"
+    assert btc_address_error(bech32_encode("bc", v1, BECH32_CONST)) == "неверная контрольная сумма"
+
+
+def test_segwit_v0_program_length():
+    # 16-байтная программа допустима для v1+, но не для v0
+    data = [0] + [BECH32_CHARSET.index("q")] * 26
+    assert btc_address_error(bech32_encode("bc", data, BECH32_CONST)) == "неверная программа segwit"
+
+
+@pytest.mark.parametrize("address", [
+    # Векторы EIP-55
+    "0x5aAeb6053F3E94C9b9A09f33669435E7Ef1BeAed",
+    "0xfB6916095ca1df60bB79Ce92cE3Ea74c37c5d359",
+    "0xdbF03B407c01E7cD3CBea99509d93f8DDDC8C6FB",
+    "0xD1220A0cf47c7B9Be7A2E6BA89F429762e7b9aDb",
+    # Без контрольной суммы (один регистр)
+    "0x5aaeb6053f3e94c9b9a09f33669435e7ef1beaed",
+    "0x5AAEB6053F3E94C9B9A09F33669435E7EF1BEAED",
+])
+def test_evm_valid(address):
+    assert evm_address_error(address) is None
+
+
+@pytest.mark.parametrize("address", [
+    "0x5aAeb6053F3E94C9b9A09f33669435E7Ef1BeAeD",  # регистр одной буквы
+    "0x5AAeb6053F3E94C9b9A09f33669435E7Ef1BeAed",
+    "0x5aAeb6053F3E94C9b9A09f33669435E7Ef1BeAe",
+    "5aAeb6053F3E94C9b9A09f33669435E7Ef1BeAed",
+    "0x5aAeb6053F3E94C9b9A09f33669435E7Ef1BeAeg",
+])
+def test_evm_invalid(address):
+    assert evm_address_error(address)
+
+
+def test_evm_hash():
+    assert evm_hash_error("0x" + "ab" * 32) is None
+    assert evm_hash_error("ab" * 32)
+
+
+@pytest.mark.parametrize("address, valid", [
+    ("TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t", True),
+    ("TLa2f6VPqDgRE67v1736s7bJ8Ray5wYjU7", True),
+    ("TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6u", False),
+    ("1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNa", False),  # верный base58check, но версия BTC
+    ("0x5aAeb6053F3E94C9b9A09f33669435E7Ef1BeAed", False),
+])
+def test_tron(address, valid):
+    assert (tron_address_error(address) is None) is valid
+
+
+def test_b58decode_check_leading_zeros():
+    payload = b58decode_check("1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNa")
+    assert payload[0] == 0 and len(payload) == 21
+
+
+@pytest.mark.parametrize("address, valid", [
+    ("EQCxE6mUtQJKFnGfaROTKOt1lZbDiiX1kCixRv7Nw2Id_sDs", True),
+    ("UQCxE6mUtQJKFnGfaROTKOt1lZbDiiX1kCixRv7Nw2Id_p0p", True),
+    ("EQD__________________________________________0vo", True),
+    ("EQCxE6mUtQJKFnGfaROTKOt1lZbDiiX1kCixRv7Nw2Id+sDs", False),  # base64 вместо base64url меняет байты
+    ("EQCxE6mUtQJKFnGfaROTKOt1lZbDiiX1kCixRv7Nw2Id_sDt", False),
+    ("EQCxE6mUtQJKFnGfaROTKOt1lZbDiiX1kCixRv7Nw2Id_sD", False),
+    ("0:" + "83dfd552e63729b472fcbcc8c45ebcc6691702558b68ec7527e1ba403a0f31a8", True),
+    ("-1:" + "3" * 64, True),
+    ("1:" + "3" * 64, False),
+    ("0:" + "3" * 63, False),
+])
+def test_ton(address, valid):
+    assert (ton_address_error(address) is None) is valid
+
+
+def test_ton_hash_and_memo():
+    assert ton_hash_error("ab" * 32) is None
+    assert ton_hash_error("A" * 43 + "=") is None
+    assert ton_hash_error("ab" * 31)
+    assert memo_error("123456") is None
+    assert memo_error("a" * (MEMO_MAX_BYTES + 1))
+    assert memo_error("я" * (MEMO_MAX_BYTES // 2 + 1))
+    assert memo_error("a\nb")
+
+
+def test_validate_record_by_sheet():
+    record = {"return_address": "0x5aAeb6053F3E94C9b9A09f33669435E7Ef1BeAeD", "sender_address": "", "hash": None}
+    assert set(validate_record("USDT (ERC-20)", record)) == {"return_address"}
+    assert validate_record("USDT (ERC-20)", {"return_address": "0x5aAeb6053F3E94C9b9A09f33669435E7Ef1BeAed"}) == {}
+    assert set(validate_record("USDT (TRC-20)", record)) == {"return_address"}
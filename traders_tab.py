@@ -1,10 +1,17 @@
 import tkinter as tk
-import tkinter.font as tkFont
 from tkinter import ttk, messagebox
-from psycopg2 import sql
 from db import Database
-from config import FIELDS_TS_ENG, FIELDS_TS_RU, SHEET_TO_TABLE, LIST_TOKEN
-from venv import logger
+from config import (FIELDS_TS_ENG, FIELDS_TS_RU, SHEET_TO_TABLE, LIST_TOKEN, STATUS_DONE, STATUS_PENDING,
+                    OPERATOR_NAME, CLAIM_BATCH_SIZE, CLAIM_LEASE_MINUTES, PRIORITY_TOP_N)
+from dataset_cache import shared_cache
+from history import CustomerHistoryWindow, history_keys
+from priority import PriorityQueue, sla_state
+from reconcile import ReconcileWindow
+from row_store import RowStore
+from virtual_tree import VirtualTreeview
+from logger import get_logger
+
+logger = get_logger(__name__)
 
 class TradersTab:
     """
@@ -13,23 +20,35 @@ class TradersTab:
     Атрибуты:
         parent (tk.Widget): Родительский виджет.
         db (Database): Объект базы данных.
+        cache (DatasetCache): Общий кэш загруженных листов.
         base_field_names (list): Исходные названия полей на английском.
         base_field_titles (list): Заголовки колонок на русском.
         title_to_field (dict): Соответствие заголовка колонки и внутреннего имени поля.
         frame (ttk.Frame): Основной контейнер вкладки.
         sheet_var (tk.StringVar): Переменная для выбранного листа.
         combo_sheet (ttk.Combobox): Выпадающий список листов.
-        tree (ttk.Treeview): Таблица для отображения данных.
+        rows (RowStore): Загруженные строки текущего листа.
+        sort_field (str): Поле сортировки.
+        sort_desc (bool): Сортировка по убыванию.
+        my_claims_var (tk.BooleanVar): Показывать только заявки, закрепленные за трейдером.
+        claim_count_var (tk.IntVar): Сколько заявок брать за раз.
+        priority_var (tk.BooleanVar): Показывать очередь по приоритету (возраст и сумма).
+        queues (dict): Таблица -> PriorityQueue первых PRIORITY_TOP_N заявок.
+        sla_var (tk.StringVar): Сводка по просроченным заявкам.
+        view (VirtualTreeview): Виртуальная таблица, хранящая строки в памяти.
+        tree (ttk.Treeview): Таблица для отображения видимого окна данных.
     """
-    def __init__(self, parent, db: Database):
+    def __init__(self, parent, db: Database, cache=None):
         """
         Инициализация вкладки трейдеров.
         
         Args:
             parent (tk.Widget): Родительский виджет.
             db (Database): Объект базы данных.
+            cache (DatasetCache): Кэш листов (по умолчанию общий).
         """
         self.db = db
+        self.cache = cache or shared_cache
         self.parent = parent
 
         self.base_field_names = FIELDS_TS_ENG
@@ -37,6 +56,11 @@ class TradersTab:
 
         self.title_to_field = dict(zip(self.base_field_titles, self.base_field_names))
 
+        self.rows = RowStore.from_rows(self.base_field_names, [])
+        self.sort_field = "id"
+        self.sort_desc = False
+        self.queues = {}
+
         self.frame = ttk.Frame(self.parent)
 
         ttk.Label(self.frame, text="Выберите лист:").pack(padx=5, pady=5)
@@ -51,34 +75,44 @@ class TradersTab:
         btn_frame.pack(padx=5, pady=15)
 
         # Внутри этого фрейма размещаем кнопку
-        ttk.Button(btn_frame, text="Обновить данные", command=self.load_data).pack(padx=5, pady=15)
+        ttk.Button(btn_frame, text="Обновить данные", command=lambda: self.load_data(force=True)).pack(side='left', padx=5, pady=15)
+        ttk.Button(btn_frame, text="Сверка с выпиской", command=self.open_reconcile).pack(side='left', padx=5, pady=15)
+        ttk.Button(btn_frame, text="История клиента", command=self.open_history).pack(side='left', padx=5, pady=15)
+
+        # Работа с закрепленными заявками: каждый трейдер видит только свои
+        claim_frame = ttk.Frame(self.frame)
+        claim_frame.pack(padx=5, pady=5)
+        self.my_claims_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(claim_frame, text="Только мои заявки", variable=self.my_claims_var,
+                        command=self.load_data).pack(side='left', padx=5)
+        self.claim_count_var = tk.IntVar(value=CLAIM_BATCH_SIZE)
+        ttk.Spinbox(claim_frame, from_=1, to=500, width=5, textvariable=self.claim_count_var).pack(side='left', padx=5)
+        ttk.Button(claim_frame, text="Взять следующие", command=self.take_next).pack(side='left', padx=5)
+        ttk.Button(claim_frame, text="Вернуть мои заявки", command=self.release_mine).pack(side='left', padx=5)
+        self.priority_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(claim_frame, text="По приоритету", variable=self.priority_var,
+                        command=self.load_data).pack(side='left', padx=15)
+        self.sla_var = tk.StringVar()
+        ttk.Label(claim_frame, textvariable=self.sla_var).pack(side='left', padx=5)
 
-        self.tree = ttk.Treeview(self.frame, columns=self.base_field_titles, show='headings')
+        self.view = VirtualTreeview(self.frame, columns=self.base_field_titles)
+        self.tree = self.view.tree
         for col in self.base_field_titles:
             self.tree.heading(col, text=col)
             self.tree.column(col, width=1)
-        self.tree.pack(fill='both', expand=True)
-
-        h_scrollbar = ttk.Scrollbar(self.frame, orient="horizontal", command=self.tree.xview)
-        self.tree.configure(xscrollcommand=h_scrollbar.set)
-        h_scrollbar.pack(fill='x')
+        self.view.pack(fill='both', expand=True)
+        # Подсветка заявок, у которых истек или подходит срок выполнения
+        self.tree.tag_configure('sla_breach', background='#f8d7da')
+        self.tree.tag_configure('sla_warning', background='#fff3cd')
+        self.view.row_tags = self.sla_tags
 
         self.tree.bind("<Double-1>", self.on_double_click)
 
         self.load_data_and_update_fields()
+        self.frame.after(60000, self.release_expired_claims)
 
     def auto_adjust_column_widths(self):
-        font = tkFont.Font()  # Можно указать шрифт, если есть
-        for col in self.tree['columns']:
-            max_width = 0
-            # Проходим по всем строкам в колонке
-            for item in self.tree.get_children():
-                cell_value = self.tree.set(item, col)
-                width = font.measure(str(cell_value))
-                if width > max_width:
-                    max_width = width
-            # добавляем небольшой запас
-            self.tree.column(col, width=max_width + 10, minwidth=max_width+10)
+        self.view.auto_adjust_column_widths()
 
     def get_current_fields(self):
         """
@@ -107,11 +141,104 @@ class TradersTab:
             self.tree.heading(col, text=col)
 
         self.title_to_field = dict(zip(titles, fields))
+        self.view.bind_sort(self.sort_by)
+        self.update_sort_headings()
         self.load_data()
 
-    def load_data(self, event=None):
+    def update_sort_headings(self):
+        field_to_title = {field: title for title, field in self.title_to_field.items()}
+        self.view.show_sort(field_to_title.get(self.sort_field), self.sort_desc)
+
+    def sort_by(self, title):
         """
-        Загружает данные из выбранной таблицы базы данных и отображает их в таблице.
+        Сортирует таблицу по колонке; повторный клик меняет направление.
+        """
+        field = self.title_to_field[title]
+        if field == self.sort_field:
+            self.sort_desc = not self.sort_desc
+        else:
+            self.sort_field = field
+            self.sort_desc = False
+        self.update_sort_headings()
+        if self.priority_var.get():
+            # Сортировка по колонке возвращает обычный список заявок
+            self.priority_var.set(False)
+            self.load_data()
+            return
+        self.show_rows()
+
+    def sla_tags(self, row):
+        """Теги подсветки строки по сроку выполнения возврата."""
+        fields, _ = self.get_current_fields()
+        if row[fields.index("status")] != STATUS_PENDING:
+            return ()
+        state = sla_state(row[fields.index("date")])
+        return (state,) if state else ()
+
+    def update_sla_summary(self, rows):
+        """Сводка по срокам для очереди по приоритету (пустая в обычном режиме)."""
+        date_pos = self.get_current_fields()[0].index("date")
+        states = [sla_state(row[date_pos]) for row in rows]
+        self.sla_var.set(f"Просрочено: {states.count('sla_breach')}, срок подходит: {states.count('sla_warning')}"
+                         if rows else "")
+
+    def show_priority(self, table_name):
+        """Отображает очередь листа по убыванию приоритета."""
+        queue = self.queues.setdefault(table_name, PriorityQueue())
+        rows = [tuple("" if v is None else str(v) for v in row) for _, _, row in queue.top(PRIORITY_TOP_N)]
+        self.view.show_sort(None, False)
+        self.view.set_rows(rows, keep_position=True)
+        self.update_sla_summary(rows)
+
+    def load_priority(self, table_name, fields):
+        """
+        Загружает первые PRIORITY_TOP_N заявок по приоритету (просмотр индекса
+        refund_priority) и согласует с ними очередь: меняются только записи,
+        у которых изменился ключ.
+        """
+        rows, keys = self.db.priority_pending(table_name, fields, PRIORITY_TOP_N)
+        queue = self.queues.setdefault(table_name, PriorityQueue())
+        id_pos = fields.index("id")
+        queue.sync((row[id_pos], key, row) for row, key in zip(rows, keys))
+        self.show_priority(table_name)
+
+    def refresh_priority(self, table_name, fields, record_id):
+        """
+        Точечно обновляет очередь после сохранения заявки, не перечитывая первые
+        PRIORITY_TOP_N: заявка получает новый ключ из БД или покидает очередь,
+        а освободившиеся места заполняются заявками, следующими в индексе
+        refund_priority за последней в очереди.
+        """
+        queue = self.queues.setdefault(table_name, PriorityQueue())
+        id_pos = fields.index("id")
+        queue.remove(record_id)
+        rows, keys = self.db.priority_pending(table_name, fields, 1, ids=[record_id])
+        tail = queue.last()
+        # Заявка, ушедшая за конец очереди, вернется при догрузке, если входит в первые
+        if rows and (tail is None or queue.precedes(record_id, keys[0], tail[1], tail[0])):
+            queue.update(record_id, keys[0], rows[0])
+        missing = PRIORITY_TOP_N - len(queue)
+        if missing > 0:
+            rows, keys = self.db.priority_pending(table_name, fields, missing, after=tail)
+            for row, key in zip(rows, keys):
+                queue.update(row[id_pos], key, row)
+        self.show_priority(table_name)
+
+    def show_rows(self):
+        """Отображает загруженные строки в текущем порядке сортировки."""
+        index = self.rows.filter()
+        if self.sort_field in self.rows.fields:
+            index = self.rows.order(index, self.sort_field, self.sort_desc)
+        self.view.set_rows(self.rows, index=index)
+        self.update_sla_summary([])
+
+    def load_data(self, event=None, force=False):
+        """
+        Загружает невыполненные возвраты выбранного листа (из кэша, если таблица
+        не менялась) и отображает их в таблице.
+
+        Args:
+            force (bool): Перечитать данные из базы без проверки кэша.
         """
         sheet_name = self.sheet_var.get()
         table_name = SHEET_TO_TABLE.get(sheet_name)
@@ -122,22 +249,96 @@ class TradersTab:
             if not self.db.is_connected():
                 logger.info("Выбрал лист и не было подключения")
                 self.db.connect()
-            with self.db.conn.cursor() as cur:
-                fields, _ = self.get_current_fields()
-                query = sql.SQL("SELECT {} FROM {} WHERE status = %s").format(
-                    sql.SQL(', ').join(map(sql.Identifier, fields)),
-                    sql.Identifier(table_name)
-                )
-                cur.execute(query, ("Возврат не сделан",))
-                rows = cur.fetchall()
-                self.tree.delete(*self.tree.get_children())
-                for row in rows:
-                    self.tree.insert('', 'end', values=row)
+            fields, _ = self.get_current_fields()
+            if self.sort_field not in fields:
+                self.sort_field = "id"
+            if self.my_claims_var.get():
+                # Закрепленные заявки меняются постоянно, кэш для них не используется
+                self.rows = RowStore.from_rows(fields, self.db.claimed_rows(table_name, fields, OPERATOR_NAME))
+            elif self.priority_var.get():
+                self.load_priority(table_name, fields)
                 self.auto_adjust_column_widths()
+                return
+            else:
+                self.rows = self.cache.get(
+                    self.db, table_name, fields,
+                    where={"status": STATUS_PENDING}, force=force
+                )
+            self.show_rows()
+            self.auto_adjust_column_widths()
         except Exception as e:
             messagebox.showerror("Ошибка", str(e))
             logger.exception("Ошибка при загрузке данных трейдеров")
 
+    def take_next(self):
+        """
+        Закрепляет за трейдером следующие N свободных заявок листа
+        и переключает таблицу на режим «Только мои заявки».
+        """
+        table_name = SHEET_TO_TABLE.get(self.sheet_var.get())
+        if not table_name:
+            messagebox.showerror("Ошибка", f"Таблица для листа '{self.sheet_var.get()}' не найдена")
+            return
+        try:
+            count = max(1, int(self.claim_count_var.get()))
+            if not self.db.is_connected():
+                self.db.connect()
+            fields, _ = self.get_current_fields()
+            claimed = self.db.claim_pending(table_name, fields, OPERATOR_NAME, count, CLAIM_LEASE_MINUTES)
+        except Exception as e:
+            messagebox.showerror("Ошибка", str(e))
+            logger.exception("Ошибка при закреплении заявок")
+            return
+        if not claimed:
+            messagebox.showinfo("Заявки", "Свободных заявок нет")
+        self.my_claims_var.set(True)
+        self.load_data()
+
+    def release_mine(self):
+        """Снимает закрепление со всех заявок трейдера на текущем листе."""
+        table_name = SHEET_TO_TABLE.get(self.sheet_var.get())
+        if not table_name:
+            return
+        try:
+            if not self.db.is_connected():
+                self.db.connect()
+            self.db.release_claims(table_name, OPERATOR_NAME)
+        except Exception as e:
+            messagebox.showerror("Ошибка", str(e))
+            logger.exception("Ошибка при снятии закрепления")
+            return
+        self.load_data()
+
+    def release_expired_claims(self):
+        """Периодически освобождает просроченные аренды текущего листа."""
+        table_name = SHEET_TO_TABLE.get(self.sheet_var.get())
+        try:
+            if table_name and self.db.is_connected():
+                if self.db.release_claims(table_name) and self.my_claims_var.get():
+                    self.load_data()
+        except Exception:
+            logger.exception("Ошибка при освобождении просроченных заявок")
+        self.frame.after(60000, self.release_expired_claims)
+
+    def open_reconcile(self):
+        """
+        Открывает окно сверки невыполненных возвратов с выпиской выплат кошелька.
+        """
+        ReconcileWindow(self.parent, self.db, on_applied=self.load_data)
+
+    def open_history(self):
+        """
+        Открывает историю клиента выбранной заявки (по ID клиента и адресам на всех листах).
+        """
+        selected_item = self.tree.focus()
+        if not selected_item:
+            messagebox.showwarning("История клиента", "Выберите строку")
+            return
+        values = self.tree.item(selected_item, 'values')
+        record = {self.title_to_field[col]: value for col, value in zip(self.tree["columns"], values)}
+        user_id, addresses = history_keys(record)
+        CustomerHistoryWindow(self.parent, self.db, user_id, addresses)
+
     def get_entry_value(self, entry_widget):
         """
         Получает значение из виджета ввода.
@@ -208,23 +409,45 @@ class TradersTab:
             if not table_name:
                 messagebox.showerror("Ошибка", f"Таблица для листа '{self.sheet_var.get()}' не найдена")
                 return
+            if self.my_claims_var.get():
+                self.save_claimed(table_name, record_id, updated_data, edit_win)
+                return
             try:
                 if not self.db.is_connected():
                     self.db.connect()
-                with self.db.conn.cursor() as cur:
-                    set_clauses = [sql.SQL("{} = %s").format(sql.Identifier(k)) for k in updated_data.keys()]
-                    query = sql.SQL("UPDATE {} SET {} WHERE id=%s").format(
-                        sql.Identifier(table_name),
-                        sql.SQL(', ').join(set_clauses)
-                    )
-                    cur.execute(query, list(updated_data.values()) + [record_id])
-                self.db.conn.commit()
+                # Заявку, закрепленную за другим трейдером, изменить нельзя
+                if not self.db.update_record(table_name, record_id, updated_data, raise_errors=True,
+                                             operator=OPERATOR_NAME):
+                    messagebox.showerror("Ошибка", f"Запись id={record_id} не найдена или закреплена за другим трейдером")
+                    return
+                self.cache.invalidate(table_name)
                 messagebox.showinfo("Успех", "Данные сохранены")
-                self.load_data()
+                if self.priority_var.get():
+                    self.refresh_priority(table_name, self.get_current_fields()[0], int(record_id))
+                else:
+                    self.load_data()
                 edit_win.destroy()
             except Exception as e:
-                self.db.conn.rollback()
                 messagebox.showerror("Ошибка", str(e))
                 logger.exception("Ошибка при сохранении изменений")
 
-        ttk.Button(edit_win, text="Сохранить", command=save).grid(row=len(columns), column=0, columnspan=2, pady=10)
\ No newline at end of file
+        ttk.Button(edit_win, text="Сохранить", command=save).grid(row=len(columns), column=0, columnspan=2, pady=10)
+
+    def save_claimed(self, table_name, record_id, updated_data, edit_win):
+        """
+        Сохраняет заявку в режиме закрепления: запись обновляется, только пока
+        аренда трейдера действует; сделанный возврат освобождается.
+        """
+        if updated_data.get("status") == STATUS_DONE:
+            updated_data["claimed_by"] = None
+            updated_data["claimed_until"] = None
+        if not self.db.is_connected():
+            self.db.connect()
+        if not self.db.update_record(table_name, record_id, updated_data, claimed_by=OPERATOR_NAME):
+            messagebox.showerror("Ошибка", "Не удалось сохранить: срок закрепления истек или заявка "
+                                           "взята другим трейдером. Подробности в логе.")
+            return
+        self.cache.invalidate(table_name)
+        messagebox.showinfo("Успех", "Данные сохранены")
+        self.load_data()
+        edit_win.destroy()
@@ -0,0 +1,408 @@
+# validation.py
+"""
+Проверка адресов и хэшей транзакций по сети листа (TOKEN_MAPPING).
+
+Сети:
+    btc  — base58check (P2PKH/P2SH) и bech32/bech32m (bc1...)
+    evm  — 0x + 40 hex, смешанный регистр проверяется по EIP-55
+    tron — base58check с байтом версии 0x41 (T...)
+    ton  — raw (0:hex) и user-friendly (48 символов base64 с crc16), мемо
+
+Одна запись проверяется мгновенно (форма), пачки строк — validate_rows
+(пакетный ввод), таблицы целиком — audit_table/audit_all в пуле процессов.
+
+Аудит существующих таблиц:
+    python validation.py [--sheet "TON"] [--report invalid.csv] [--processes 4]
+"""
+import argparse
+import base64
+import binascii
+import csv
+import hashlib
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from config import CONN_DB, ENG_FIELDS, FIELDS, SHEET_TO_TABLE, TOKEN_MAPPING
+
+# Сеть по значению токена из TOKEN_MAPPING
+TOKEN_CHAINS = {
+    "BTC": "btc",
+    "ETH": "evm",
+    "USDT (ETH)": "evm",
+    "USDC (ETH)": "evm",
+    "TRX": "tron",
+    "USDT (TRX)": "tron",
+    "TON": "ton",
+    "USDT (TON)": "ton",
+}
+SHEET_CHAINS = {sheet: TOKEN_CHAINS.get(token) for sheet, token in TOKEN_MAPPING.items()}
+
+# Проверяемые поля таблиц и вид проверки
+VALIDATED_FIELDS = {
+    "hash": "hash",
+    "sender_address": "address",
+    "return_address": "address",
+    "return_hash": "hash",
+    "memo": "memo",
+}
+FIELD_NAMES = {**dict(zip(ENG_FIELDS, FIELDS)), "memo": "Мемо"}
+FORM_FIELDS = {ru: eng for eng, ru in FIELD_NAMES.items()}
+
+AUDIT_CHUNK_SIZE = 20000
+
+HEX64_RE = re.compile(r"^[0-9a-fA-F]{64}$")
+EVM_ADDRESS_RE = re.compile(r"^0x[0-9a-fA-F]{40}$")
+EVM_HASH_RE = re.compile(r"^0x[0-9a-fA-F]{64}$")
+TON_RAW_RE = re.compile(r"^(0|-1):[0-9a-fA-F]{64}$")
+TON_FRIENDLY_RE = re.compile(r"^[A-Za-z0-9+/_-]{48}$")
+TON_HASH_B64_RE = re.compile(r"^[A-Za-z0-9+/_-]{43}=?$")
+MEMO_MAX_BYTES = 123  # текстовый комментарий TON в одной ячейке
+
+B58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+B58_INDEX = {c: i for i, c in enumerate(B58_ALPHABET)}
+BECH32_CHARSET = "qpzry9x8gf2tvdw0s3jn54khce6mua7l"
+BECH32_INDEX = {c: i for i, c in enumerate(BECH32_CHARSET)}
+BECH32_CONST, BECH32M_CONST = 1, 0x2bc830a3
+
+
+# --- примитивы ---
+
+def b58decode_check(value):
+    """Декодирует base58check; None, если символы или контрольная сумма неверны."""
+    number = 0
+    for char in value:
+        digit = B58_INDEX.get(char)
+        if digit is None:
+            return None
+        number = number * 58 + digit
+    raw = number.to_bytes((number.bit_length() + 7) // 8, "big")
+    raw = b"\0" * (len(value) - len(value.lstrip("1"))) + raw
+    payload, checksum = raw[:-4], raw[-4:]
+    if len(raw) < 5 or hashlib.sha256(hashlib.sha256(payload).digest()).digest()[:4] != checksum:
+        return None
+    return payload
+
+
+def _bech32_polymod(values):
+    generators = (0x3b6a57b2, 0x26508e6d, 0x1ea119fa, 0x3d4233dd, 0x2a1462b3)
+    chk = 1
+    for value in values:
+        top = chk >> 25
+        chk = (chk & 0x1ffffff) << 5 ^ value
+        for i, generator in enumerate(generators):
+            if (top >> i) & 1:
+                chk ^= generator
+    return chk
+
+
+def _convert_bits(data, from_bits, to_bits):
+    acc, bits, result = 0, 0, []
+    max_value = (1 << to_bits) - 1
+    for value in data:
+        acc = (acc << from_bits) | value
+        bits += from_bits
+        while bits >= to_bits:
+            bits -= to_bits
+            result.append((acc >> bits) & max_value)
+    if bits >= from_bits or (acc << (to_bits - bits)) & max_value:
+        return None
+    return result
+
+
+def segwit_error(value, hrp="bc"):
+    """Проверяет segwit-адрес (BIP-173/BIP-350); возвращает текст ошибки или None."""
+    if value.lower() != value and value.upper() != value:
+        return "смешанный регистр в bech32"
+    value = value.lower()
+    pos = value.rfind("1")
+    if value[:pos] != hrp or len(value) > 90 or len(value) - pos < 7:
+        return "неверный формат bech32"
+    data = [BECH32_INDEX.get(c) for c in value[pos + 1:]]
+    if None in data:
+        return "недопустимые символы bech32"
+    const = _bech32_polymod([ord(c) >> 5 for c in hrp] + [0] + [ord(c) & 31 for c in hrp] + data)
+    version = data[0]
+    if const != (BECH32_CONST if version == 0 else BECH32M_CONST):
+        return "неверная контрольная сумма"
+    program = _convert_bits(data[1:-6], 5, 8)
+    if version > 16 or program is None or not 2 <= len(program) <= 40 or (version == 0 and len(program) not in (20, 32)):
+        return "неверная программа segwit"
+    return None
+
+
+def _keccak_round_constants():
+    constants, r = [], 1
+    for _ in range(24):
+        constant = 0
+        for j in range(7):
+            r = ((r << 1) ^ ((r >> 7) * 0x71)) % 256
+            if r & 2:
+                constant ^= 1 << ((1 << j) - 1)
+        constants.append(constant)
+    return constants
+
+
+KECCAK_RC = _keccak_round_constants()
+KECCAK_ROT = ((0, 36, 3, 41, 18), (1, 44, 10, 45, 2), (62, 6, 43, 15, 61), (28, 55, 25, 21, 56), (27, 20, 39, 8, 14))
+MASK64 = (1 << 64) - 1
+
+
+def _rol(value, shift):
+    return ((value << shift) | (value >> (64 - shift))) & MASK64 if shift else value
+
+
+def _keccak_f(a):
+    for rc in KECCAK_RC:
+        c = [a[x] ^ a[x + 5] ^ a[x + 10] ^ a[x + 15] ^ a[x + 20] for x in range(5)]
+        d = [c[(x - 1) % 5] ^ _rol(c[(x + 1) % 5], 1) for x in range(5)]
+        a = [a[i] ^ d[i % 5] for i in range(25)]
+        b = [0] * 25
+        for x in range(5):
+            for y in range(5):
+                b[y + 5 * ((2 * x + 3 * y) % 5)] = _rol(a[x + 5 * y], KECCAK_ROT[x][y])
+        a = [b[i] ^ (~b[(i + 1) % 5 + i // 5 * 5] & b[(i + 2) % 5 + i // 5 * 5]) for i in range(25)]
+        a[0] ^= rc
+    return a
+
+
+def keccak256(data):
+    """Keccak-256 (как в Ethereum; hashlib.sha3_256 отличается паддингом)."""
+    rate = 136
+    padded = bytearray(data) + b"\x01" + b"\0" * (-(len(data) + 1) % rate)
+    padded[-1] |= 0x80
+    state = [0] * 25
+    for offset in range(0, len(padded), rate):
+        block = padded[offset:offset + rate]
+        for i in range(rate // 8):
+            state[i] ^= int.from_bytes(block[i * 8:i * 8 + 8], "little")
+        state = _keccak_f(state)
+    return b"".join(lane.to_bytes(8, "little") for lane in state[:4])
+
+
+def crc16_xmodem(data):
+    crc = 0
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021 if crc & 0x8000 else crc << 1) & 0xffff
+    return crc
+
+
+# --- проверки по сетям ---
+
+def btc_address_error(value):
+    if value.lower().startswith("bc1"):
+        return segwit_error(value)
+    payload = b58decode_check(value)
+    if payload is None:
+        return "неверный адрес BTC (base58check)"
+    if len(payload) != 21 or payload[0] not in (0x00, 0x05):
+        return "неверная версия адреса BTC"
+    return None
+
+
+def evm_address_error(value):
+    if not EVM_ADDRESS_RE.match(value):
+        return "ожидается 0x и 40 hex-символов"
+    body = value[2:]
+    if body.islower() or body.isupper() or body.isdigit():
+        return None
+    digest = keccak256(body.lower().encode("ascii")).hex()
+    for char, nibble in zip(body, digest):
+        if char.isalpha() and char.isupper() != (int(nibble, 16) >= 8):
+            return "неверная контрольная сумма EIP-55"
+    return None
+
+
+def tron_address_error(value):
+    payload = b58decode_check(value)
+    if payload is None:
+        return "неверный адрес TRON (base58check)"
+    if len(payload) != 21 or payload[0] != 0x41:
+        return "неверная версия адреса TRON"
+    return None
+
+
+def ton_address_error(value):
+    if TON_RAW_RE.match(value):
+        return None
+    if not TON_FRIENDLY_RE.match(value):
+        return "ожидается адрес 0:hex или 48 символов base64"
+    try:
+        raw = base64.urlsafe_b64decode(value.replace("+", "-").replace("/", "_"))
+    except (binascii.Error, ValueError):
+        return "неверная кодировка base64"
+    if raw[0] & 0x7f not in (0x11, 0x51) or raw[1] not in (0x00, 0xff):
+        return "неверный флаг или workchain адреса TON"
+    if crc16_xmodem(raw[:34]) != int.from_bytes(raw[34:], "big"):
+        return "неверная контрольная сумма"
+    return None
+
+
+def hex_hash_error(value):
+    return None if HEX64_RE.match(value) else "ожидается 64 hex-символа"
+
+
+def evm_hash_error(value):
+    return None if EVM_HASH_RE.match(value) else "ожидается 0x и 64 hex-символа"
+
+
+def ton_hash_error(value):
+    if HEX64_RE.match(value) or TON_HASH_B64_RE.match(value):
+        return None
+    return "ожидается 64 hex-символа или 44 символа base64"
+
+
+def memo_error(value):
+    if len(value.encode("utf-8")) > MEMO_MAX_BYTES:
+        return f"длиннее {MEMO_MAX_BYTES} байт"
+    if any(ord(c) < 32 for c in value):
+        return "управляющие символы"
+    return None
+
+
+CHECKERS = {
+    "btc": {"address": btc_address_error, "hash": hex_hash_error},
+    "evm": {"address": evm_address_error, "hash": evm_hash_error},
+    "tron": {"address": tron_address_error, "hash": hex_hash_error},
+    "ton": {"address": ton_address_error, "hash": ton_hash_error, "memo": memo_error},
+}
+
+
+def sheet_checkers(sheet):
+    """
+    Проверки полей таблицы для листа: поле -> функция(значение) -> текст ошибки или None.
+    Пустой словарь, если сеть листа неизвестна.
+    """
+    checkers = CHECKERS.get(SHEET_CHAINS.get(sheet), {})
+    return {field: checkers[kind] for field, kind in VALIDATED_FIELDS.items() if kind in checkers}
+
+
+def validate_record(sheet, record, checkers=None):
+    """
+    Проверяет заявку, заданную полями таблицы (hash, return_address, ...).
+    Пустые значения не проверяются — за обязательность отвечает форма.
+
+    Returns:
+        dict: Поле -> текст ошибки (пустой, если все корректно).
+    """
+    checkers = sheet_checkers(sheet) if checkers is None else checkers
+    errors = {}
+    for field, check in checkers.items():
+        value = (record.get(field) or "").strip()
+        if value:
+            error = check(value)
+            if error:
+                errors[field] = error
+    return errors
+
+
+def validate_form(sheet, data):
+    """Как validate_record, но для данных формы с русскими названиями полей."""
+    record = {FORM_FIELDS[name]: value for name, value in data.items() if name in FORM_FIELDS}
+    return {FIELD_NAMES[field]: error for field, error in validate_record(sheet, record).items()}
+
+
+def validate_rows(sheet, fields, rows):
+    """
+    Проверяет пачку строк (кортежей в порядке fields).
+
+    Returns:
+        list: (номер строки, словарь поле -> ошибка) только для строк с ошибками.
+    """
+    checkers = {f: c for f, c in sheet_checkers(sheet).items() if f in fields}
+    positions = [(fields.index(f), f, c) for f, c in checkers.items()]
+    invalid = []
+    for i, row in enumerate(rows):
+        errors = {}
+        for position, field, check in positions:
+            value = (row[position] or "").strip()
+            if value:
+                error = check(value)
+                if error:
+                    errors[field] = error
+        if errors:
+            invalid.append((i, errors))
+    return invalid
+
+
+def audit_fields(sheet):
+    """Колонки, загружаемые для аудита листа."""
+    return ["id"] + list(sheet_checkers(sheet))
+
+
+def _audit_chunk(sheet, fields, rows):
+    """Выполняется в процессе пула: возвращает записи отчета по пачке строк."""
+    report = []
+    for i, errors in validate_rows(sheet, fields, rows):
+        row = rows[i]
+        for field, error in errors.items():
+            report.append({"sheet": sheet, "id": row[0], "field": field,
+                           "value": row[fields.index(field)], "error": error})
+    return report
+
+
+def audit_table(db, sheet, executor, chunk_size=AUDIT_CHUNK_SIZE):
+    """
+    Проверяет всю таблицу листа: строки читаются страницами по id,
+    каждая страница проверяется в пуле процессов, пока читается следующая.
+
+    Returns:
+        list: Записи отчета (лист, id, поле, значение, ошибка).
+    """
+    table = SHEET_TO_TABLE[sheet]
+    fields = audit_fields(sheet)
+    futures = []
+    after = None
+    while True:
+        rows, after = db.select_rows(table, fields, after=after, limit=chunk_size)
+        if rows:
+            futures.append(executor.submit(_audit_chunk, sheet, fields, rows))
+        if len(rows) < chunk_size:
+            break
+    return [entry for future in futures for entry in future.result()]
+
+
+def audit_all(db, sheets=None, processes=None, chunk_size=AUDIT_CHUNK_SIZE):
+    """Аудит нескольких листов (по умолчанию всех) в общем пуле процессов."""
+    report = []
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        for sheet in sheets or list(SHEET_TO_TABLE):
+            report.extend(audit_table(db, sheet, executor, chunk_size))
+    return report
+
+
+def write_report(report, path):
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.DictWriter(f, fieldnames=["sheet", "id", "field", "value", "error"], delimiter=";")
+        writer.writeheader()
+        writer.writerows(report)
+
+
+def main():
+    from db import Database
+
+    parser = argparse.ArgumentParser(description="Проверка адресов и хэшей в таблицах листов")
+    parser.add_argument("--sheet", action="append", help="лист (можно указать несколько раз)")
+    parser.add_argument("--report", default="invalid_records.csv", help="CSV-отчет")
+    parser.add_argument("--processes", type=int, default=None, help="число процессов")
+    parser.add_argument("--chunk", type=int, default=AUDIT_CHUNK_SIZE, help="строк в пачке")
+    args = parser.parse_args()
+
+    db = Database(CONN_DB)
+    db.connect()
+    try:
+        report = audit_all(db, args.sheet, args.processes, args.chunk)
+    finally:
+        db.close()
+    write_report(report, args.report)
+    counts = {}
+    for entry in report:
+        counts[entry["sheet"]] = counts.get(entry["sheet"], 0) + 1
+    for sheet, count in counts.items():
+        print(f"{sheet}: {count}")
+    print(f"Всего ошибок: {len(report)}, отчет: {args.report}")
+
+
+if __name__ == "__main__":
+    main()
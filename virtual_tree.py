@@ -0,0 +1,227 @@
+# virtual_tree.py
+import tkinter.font as tkFont
+from tkinter import ttk
+
+# Сколько строк сверх видимых материализуется в Treeview
+OVERSCAN = 2
+# Сколько строк просматривается при подборе ширины колонок
+WIDTH_SAMPLE = 500
+
+
+class VirtualTreeview:
+    """
+    Виртуальная таблица поверх ttk.Treeview.
+
+    Данные хранятся в Python, а в Treeview существует только окно видимых
+    строк (плюс небольшой запас OVERSCAN). При прокрутке элементы не
+    создаются заново — в них подставляются значения следующих строк.
+
+    Атрибуты:
+        frame (ttk.Frame): Контейнер таблицы и полос прокрутки.
+        tree (ttk.Treeview): Treeview с окном видимых строк.
+        rows (Sequence): Источник строк (список кортежей или хранилище с __getitem__).
+        index (Sequence | None): Порядок/подмножество индексов строк для отображения.
+        first (int): Позиция первой видимой строки.
+        row_tags (callable | None): Функция строка -> кортеж тегов Treeview (подсветка).
+    """
+    def __init__(self, parent, columns=(), overscan=OVERSCAN):
+        """
+        Args:
+            parent (tk.Widget): Родительский виджет.
+            columns (list): Заголовки колонок.
+            overscan (int): Количество дополнительных строк в окне.
+        """
+        self.frame = ttk.Frame(parent)
+        self.overscan = overscan
+
+        self.rows = []
+        self.index = None
+        self.first = 0
+        self.focus_pos = None
+        self.visible = 1
+        self.row_tags = None
+        self._items = []
+
+        self.tree = ttk.Treeview(self.frame, columns=list(columns), show='headings', selectmode='browse')
+        self.v_scrollbar = ttk.Scrollbar(self.frame, orient="vertical", command=self.yview)
+        self.h_scrollbar = ttk.Scrollbar(self.frame, orient="horizontal", command=self.tree.xview)
+        self.tree.configure(xscrollcommand=self.h_scrollbar.set)
+
+        self.tree.grid(row=0, column=0, sticky='nsew')
+        self.v_scrollbar.grid(row=0, column=1, sticky='ns')
+        self.h_scrollbar.grid(row=1, column=0, sticky='ew')
+        self.frame.rowconfigure(0, weight=1)
+        self.frame.columnconfigure(0, weight=1)
+
+        self.tree.bind('<Configure>', self._on_configure)
+        self.tree.bind('<MouseWheel>', self._on_mousewheel)
+        self.tree.bind('<Button-4>', lambda e: self._scroll_by(-3))
+        self.tree.bind('<Button-5>', lambda e: self._scroll_by(3))
+        self.tree.bind('<Up>', lambda e: self._move_focus(-1))
+        self.tree.bind('<Down>', lambda e: self._move_focus(1))
+        self.tree.bind('<Prior>', lambda e: self._move_focus(-self.visible))
+        self.tree.bind('<Next>', lambda e: self._move_focus(self.visible))
+        self.tree.bind('<Home>', lambda e: self._move_focus(-self.total()))
+        self.tree.bind('<End>', lambda e: self._move_focus(self.total()))
+        self.tree.bind('<<TreeviewSelect>>', self._on_select)
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def total(self):
+        """Количество строк, доступных для отображения."""
+        return len(self.index) if self.index is not None else len(self.rows)
+
+    def row_at(self, pos):
+        """Возвращает строку по позиции в текущем представлении."""
+        if self.index is not None:
+            return self.rows[int(self.index[pos])]
+        return self.rows[pos]
+
+    def set_rows(self, rows, index=None, keep_position=False):
+        """
+        Заменяет отображаемые данные.
+
+        Args:
+            rows (Sequence): Источник строк.
+            index (Sequence | None): Индексы строк из rows для отображения.
+            keep_position (bool): Сохранить текущую позицию прокрутки.
+        """
+        self.rows = rows
+        self.index = index
+        self.focus_pos = None
+        if not keep_position:
+            self.first = 0
+        self.render()
+
+    def focused_row(self):
+        """Возвращает строку под фокусом или None."""
+        if self.focus_pos is None or self.focus_pos >= self.total():
+            return None
+        return self.row_at(self.focus_pos)
+
+    def render(self):
+        """Подставляет значения строк окна в элементы Treeview."""
+        total = self.total()
+        self.first = max(0, min(self.first, total - self.visible))
+        count = max(0, min(self.visible + self.overscan, total - self.first))
+
+        while len(self._items) < count:
+            self._items.append(self.tree.insert('', 'end'))
+        if len(self._items) > count:
+            self.tree.delete(*self._items[count:])
+            del self._items[count:]
+
+        for offset, item in enumerate(self._items):
+            row = self.row_at(self.first + offset)
+            self.tree.item(item, values=row, tags=self.row_tags(row) if self.row_tags else ())
+
+        focus_offset = None if self.focus_pos is None else self.focus_pos - self.first
+        if focus_offset is not None and 0 <= focus_offset < count:
+            item = self._items[focus_offset]
+            self.tree.focus(item)
+            self.tree.selection_set(item)
+        else:
+            self.tree.selection_set(())
+            self.tree.focus('')
+        self.tree.yview_moveto(0)
+        self._update_scrollbar(total)
+
+    def _update_scrollbar(self, total):
+        if total <= 0:
+            self.v_scrollbar.set(0, 1)
+            return
+        self.v_scrollbar.set(self.first / total, min(1.0, (self.first + self.visible) / total))
+
+    def yview(self, *args):
+        """Команда вертикальной полосы прокрутки ('moveto'/'scroll')."""
+        total = self.total()
+        if not args or total <= 0:
+            return
+        if args[0] == 'moveto':
+            self.first = int(float(args[1]) * total)
+        elif args[0] == 'scroll':
+            step = int(args[1])
+            if args[2] == 'pages':
+                step *= max(1, self.visible - 1)
+            self.first += step
+        self.render()
+
+    def _scroll_by(self, step):
+        self.first += step
+        self.render()
+        return 'break'
+
+    def _on_mousewheel(self, event):
+        step = -1 if event.delta > 0 else 1
+        # На Windows delta кратна 120, на macOS приходят малые значения
+        if abs(event.delta) >= 120:
+            step *= 3 * (abs(event.delta) // 120)
+        return self._scroll_by(step)
+
+    def _move_focus(self, step):
+        total = self.total()
+        if total <= 0:
+            return 'break'
+        current = self.focus_pos if self.focus_pos is not None else self.first
+        self.focus_pos = max(0, min(total - 1, current + step))
+        if self.focus_pos < self.first:
+            self.first = self.focus_pos
+        elif self.focus_pos >= self.first + self.visible:
+            self.first = self.focus_pos - self.visible + 1
+        self.render()
+        return 'break'
+
+    def _on_select(self, event=None):
+        item = self.tree.focus()
+        if item not in self._items:
+            return
+        offset = self._items.index(item)
+        self.focus_pos = self.first + offset
+        if offset >= self.visible:
+            # Клик по частично видимой строке запаса — сдвигаем окно
+            self.first = self.focus_pos - self.visible + 1
+            self.render()
+
+    def _on_configure(self, event=None):
+        row_height = self._row_height()
+        visible = max(1, self.tree.winfo_height() // row_height - 1)
+        if visible != self.visible:
+            self.visible = visible
+            self.render()
+
+    def _row_height(self):
+        style = ttk.Style()
+        height = style.lookup('Treeview', 'rowheight')
+        try:
+            return max(1, int(height))
+        except (TypeError, ValueError):
+            return tkFont.nametofont('TkDefaultFont').metrics('linespace') + 4
+
+    def bind_sort(self, callback):
+        """Назначает callback(колонка) на клик по заголовкам текущих колонок."""
+        for col in self.tree['columns']:
+            self.tree.heading(col, command=lambda c=col: callback(c))
+
+    def show_sort(self, column, descending):
+        """Отмечает стрелкой колонку и направление сортировки."""
+        for col in self.tree['columns']:
+            arrow = (' ▼' if descending else ' ▲') if col == column else ''
+            self.tree.heading(col, text=col + arrow)
+
+    def auto_adjust_column_widths(self, sample=WIDTH_SAMPLE):
+        """
+        Подбирает ширину колонок по первым sample строкам представления.
+        """
+        font = tkFont.Font()
+        columns = self.tree['columns']
+        widths = [font.measure(str(col)) for col in columns]
+        for pos in range(min(sample, self.total())):
+            row = self.row_at(pos)
+            for i, cell_value in enumerate(row[:len(columns)]):
+                width = font.measure(str(cell_value))
+                if width > widths[i]:
+                    widths[i] = width
+        for col, max_width in zip(columns, widths):
+            # добавляем небольшой запас
+            self.tree.column(col, width=max_width + 10, minwidth=max_width + 10)